@@ -1,17 +1,222 @@
 """Run the UPS Manifestor application."""
 
+import argparse
+import datetime as dt
+import sys
+from contextlib import nullcontext
+
+from ups_manifestor.analytics import ExportHistory, report
+from ups_manifestor.api_requests import BULK, scheduler
 from ups_manifestor.application import Application, ErrorWindow
+from ups_manifestor.backfill import Backfill, select_exports
+from ups_manifestor.cassettes import Cassette
+from ups_manifestor.diagnostics import Profiler, summarise
+from ups_manifestor.models import ShipmentExports
+from ups_manifestor.prefetch import ExportFileCache
+from ups_manifestor.service import ServiceClient, SyncService
 from ups_manifestor.settings import Settings
+from ups_manifestor.tracing import Tracer
+from ups_manifestor.tracing import summarise as summarise_traces
+
+
+def parse_args(argv):
+    """Return parsed command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the UPS Manifestor.")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="diagnostics",
+        metavar="DIRECTORY",
+        help="write a CPU and memory profile of every action to DIRECTORY",
+    )
+    parser.add_argument(
+        "--profile-summary",
+        metavar="DIRECTORY",
+        help="print the top hotspots of the profiles in DIRECTORY and exit",
+    )
+    parser.add_argument(
+        "--trace-summary",
+        action="store_true",
+        help="print p50 and p95 times to manifest per day from the trace file and exit",
+    )
+    parser.add_argument(
+        "--report",
+        nargs="?",
+        type=int,
+        const=28,
+        metavar="DAYS",
+        help="print daily export, shipment and package totals for DAYS and exit",
+    )
+    parser.add_argument(
+        "--backfill",
+        metavar="DIRECTORY",
+        help="download the shipping files of past exports into DIRECTORY and exit, "
+        "skipping exports already there",
+    )
+    parser.add_argument(
+        "--exports",
+        type=lambda value: [int(export_id) for export_id in value.split(",")],
+        metavar="IDS",
+        help="comma separated export IDs to backfill (default: every export)",
+    )
+    parser.add_argument(
+        "--since",
+        type=dt.date.fromisoformat,
+        metavar="DATE",
+        help="backfill exports created on or after DATE (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--until",
+        type=dt.date.fromisoformat,
+        metavar="DATE",
+        help="backfill exports created on or before DATE (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Backfill.WORKERS,
+        help="concurrent backfill downloads (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="run the sync service that the application and --status connect to",
+    )
+    parser.add_argument(
+        "--connect",
+        action="store_true",
+        help="run the application as a client of a running sync service",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="print the state of a running sync service and exit",
+    )
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="record HTTP requests and responses to CASSETTE",
+    )
+    cassette_group.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="answer HTTP requests from CASSETTE instead of the server",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=None,
+        metavar="SPEED",
+        help="replay at SPEED times the recorded rate (default: no delays)",
+    )
+    return parser.parse_args(argv)
+
+
+def use_cassette(args):
+    """Return a context using the cassette selected on the command line."""
+    if args.record is not None:
+        return Cassette(args.record, mode=Cassette.RECORD).use()
+    if args.replay is not None:
+        return Cassette(args.replay, speed=args.replay_speed).use()
+    return nullcontext()
+
+
+def print_status(client):
+    """Print the state of the sync service."""
+    shipments = client.call("current_shipments")
+    print(f"Open shipments: {len(shipments)}")
+    print(f"Comodities File: {client.call('commodities_file_status')}")
+    print(f"Address File: {client.call('address_file_status')}")
+    print(f"Loaded Export: {client.call('loaded_export_status')}")
+
+
+def print_report(days):
+    """Print analytics over the history of shipment exports."""
+    shipment_exports = ShipmentExports()
+    shipment_exports.update()
+    print(report(ExportHistory(shipment_exports.exports), days=days))
+
+
+def run_backfill(args):
+    """Download the shipping files of the exports selected on the command line."""
+    shipment_exports = ShipmentExports()
+    shipment_exports.update()
+    export_ids = select_exports(
+        shipment_exports.exports,
+        export_ids=args.exports,
+        start=args.since,
+        end=args.until,
+    )
+    if args.exports is not None and (args.since or args.until):
+        listed = {export[ShipmentExports.ID] for export in shipment_exports.exports}
+        unlisted = [export_id for export_id in args.exports if export_id not in listed]
+        if unlisted:
+            print(
+                "Skipped exports not listed by the server, their dates are "
+                f"unknown: {', '.join(map(str, unlisted))}"
+            )
+    # Nothing else is requesting in this process, so bulk downloads may use
+    # every worker.
+    scheduler.set_limit(BULK, args.workers)
+    backfill = Backfill(
+        args.backfill,
+        workers=args.workers,
+        cache=ExportFileCache(Settings.CACHE_DIRECTORY),
+    )
+    finished = 0
+
+    def on_progress(export_id, error):
+        nonlocal finished
+        finished += 1
+        outcome = "done" if error is None else f"failed: {error}"
+        print(f"[{finished}/{len(export_ids)}] Export {export_id} {outcome}")
+
+    print(backfill.run(export_ids, on_progress=on_progress).summary())
+
+
+def check_lanes(args):
+    """Exit if shipment lanes are set up for the sync service, which has one."""
+    if (args.serve or args.connect) and len(Settings.LANES) > 1:
+        sys.exit("Shipment lanes cannot be used with --serve or --connect.")
 
 
-def main():
+def main(argv=()):
     """Run the UPS Manifestor application."""
+    args = parse_args(argv)
+    if args.profile_summary is not None:
+        print(summarise(args.profile_summary))
+        return
     Settings.load_settings()
-    try:
-        Application()
-    except Exception as e:
-        ErrorWindow(e)
+    if args.trace_summary:
+        print(summarise_traces(Settings.TRACE_PATH))
+        return
+    check_lanes(args)
+    Tracer.enable(Settings.TRACE_PATH)
+    scheduler.set_rate(Settings.REQUESTS_PER_SECOND)
+    if args.profile is not None:
+        Profiler.enable(args.profile)
+    with use_cassette(args):
+        if args.serve:
+            SyncService().serve_forever()
+            return
+        if args.status:
+            print_status(ServiceClient())
+            return
+        if args.report is not None:
+            print_report(args.report)
+            return
+        if args.backfill is not None:
+            run_backfill(args)
+            return
+        try:
+            if args.connect:
+                Application(client=ServiceClient())
+            else:
+                Application()
+        except Exception as e:
+            ErrorWindow(e)
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
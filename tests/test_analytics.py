@@ -0,0 +1,98 @@
+import datetime as dt
+
+import pytest
+
+from ups_manifestor import analytics
+from ups_manifestor.analytics import ExportHistory
+
+
+def export(created_at, package_count, destinations="UK", **fields):
+    return dict(
+        created_at=created_at,
+        package_count=package_count,
+        shipment_count=1,
+        destinations=destinations,
+        **fields,
+    )
+
+
+@pytest.fixture
+def history():
+    return ExportHistory(
+        [
+            export("2024-03-03T09:00:00", 4, "DE", weight=12.5, value="30.00"),
+            export("2024-03-01T09:00:00", 1, "UK"),
+            export("2024-03-01T16:30:00", 2, "UK, FR"),
+            export("2024-03-05T10:00:00", 8, ["FR"]),
+            export("not a date", 100),
+        ]
+    )
+
+
+def day(number):
+    return dt.date(2024, 3, number)
+
+
+def test_records_are_ordered_by_creation_date(history):
+    assert len(history) == 4
+    assert list(history.columns[analytics.PACKAGE_COUNT]) == [1, 2, 4, 8]
+    assert history.first_day() == day(1)
+    assert history.last_day() == day(5)
+
+
+def test_missing_numbers_are_zero(history):
+    assert list(history.columns[analytics.WEIGHT]) == [0.0, 0.0, 12.5, 0.0]
+    assert history.total(analytics.VALUE, day(1), day(5)) == 30.0
+
+
+def test_total(history):
+    assert history.total(analytics.PACKAGE_COUNT, day(1), day(3)) == 7
+    assert history.total(analytics.PACKAGE_COUNT, day(2), day(2)) == 0
+    assert history.count(day(1), day(5)) == 4
+
+
+def test_daily_includes_days_without_exports(history):
+    assert history.daily(analytics.PACKAGE_COUNT, day(1), day(5)) == [
+        (day(1), 3),
+        (day(2), 0),
+        (day(3), 4),
+        (day(4), 0),
+        (day(5), 8),
+    ]
+
+
+def test_rolling(history):
+    assert history.rolling(analytics.PACKAGE_COUNT, 3, day(1), day(6)) == [
+        (day(1), 3),
+        (day(2), 3),
+        (day(3), 7),
+        (day(4), 4),
+        (day(5), 12),
+        (day(6), 8),
+    ]
+
+
+def test_destinations(history):
+    assert history.destinations(day(1), day(5)) == [("UK", 2), ("FR", 2), ("DE", 1)]
+    assert history.destinations(day(3), day(5)) == [("DE", 1), ("FR", 1)]
+
+
+def test_report(history):
+    text = analytics.report(history, days=3, window=2)
+    lines = text.splitlines()
+    assert lines[0].split()[:6] == [
+        "day",
+        "exports",
+        "shipments",
+        "packages",
+        "weight",
+        "value",
+    ]
+    assert lines[1].split() == ["2024-03-03", "1", "1", "4", "12.5", "30.00", "4"]
+    assert lines[3].split() == ["2024-03-05", "1", "1", "8", "0.0", "0.00", "8"]
+    assert lines[4].split() == ["total", "2", "2", "12", "12.5", "30.00"]
+    assert "Top destinations 2024-03-03 to 2024-03-05:" in text
+
+
+def test_report_without_exports():
+    assert analytics.report(ExportHistory([])) == "No exports found."
@@ -1,3 +1,4 @@
+import threading
 from unittest import mock
 
 import pytest
@@ -7,7 +8,7 @@ from ups_manifestor import api_requests, exceptions
 
 @pytest.fixture(autouse=True)
 def mock_requests():
-    with mock.patch("ups_manifestor.api_requests.requests") as mock_requests:
+    with mock.patch("ups_manifestor.api_requests.session") as mock_requests:
         yield mock_requests
 
 
@@ -88,7 +89,7 @@ def test_make_request_makes_request(
 ):
     base_request.make_request()
     mock_requests.post.assert_called_once_with(
-        mock_make_url.return_value, mock_request_data.return_value
+        mock_make_url.return_value, mock_request_data.return_value, stream=False
     )
 
 
@@ -146,3 +147,210 @@ class TestCloseShipmentRequest:
             "token": "TEST_TOKEN",
             "shipment_id": shipment_id,
         }
+
+    def test_request_data_with_idempotency_key(self, load_settings):
+        assert api_requests.CloseShipment().request_data(
+            shipment_id=12, idempotency_key="abc"
+        ) == {
+            "token": "TEST_TOKEN",
+            "shipment_id": 12,
+            "idempotency_key": "abc",
+        }
+
+
+class TestShipmentChangesRequest:
+    def test_request_data(self, load_settings):
+        assert api_requests.ShipmentChangesRequest().request_data() == {
+            "token": "TEST_TOKEN"
+        }
+
+    def test_request_data_with_last_event_id(self, load_settings):
+        assert api_requests.ShipmentChangesRequest().request_data(
+            last_event_id="5"
+        ) == {"token": "TEST_TOKEN", "last_event_id": "5"}
+
+    def test_post_uses_read_timeout(self, mock_requests):
+        request = api_requests.ShipmentChangesRequest()
+        request.post("url", {})
+        mock_requests.post.assert_called_once_with(
+            "url", {}, stream=True, timeout=request.TIMEOUT
+        )
+
+    def test_process_response(self):
+        response = mock.Mock()
+        request = api_requests.ShipmentChangesRequest()
+        assert request.process_response(response) == response
+
+
+def test_token_bucket_does_not_wait_within_capacity():
+    bucket = api_requests.TokenBucket(rate=100)
+    with mock.patch("ups_manifestor.api_requests.time.sleep") as mock_sleep:
+        assert bucket.consume(100) is True
+    mock_sleep.assert_not_called()
+
+
+def test_token_bucket_waits_when_empty():
+    bucket = api_requests.TokenBucket(rate=100)
+    with mock.patch("ups_manifestor.api_requests.time.sleep") as mock_sleep:
+        bucket.consume(150)
+    wait = mock_sleep.call_args[0][0]
+    assert 0.4 < wait <= 0.5
+
+
+def test_token_bucket_wait_is_cancellable():
+    bucket = api_requests.TokenBucket(rate=1)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert bucket.consume(100, cancel_event) is False
+
+
+def test_token_bucket_take_borrows_tokens():
+    bucket = api_requests.TokenBucket(rate=100)
+    bucket.take(150)
+    with mock.patch("ups_manifestor.api_requests.time.sleep") as mock_sleep:
+        bucket.consume(1)
+    assert mock_sleep.call_args[0][0] > 0.5
+
+
+@pytest.mark.parametrize(
+    "request_class,priority",
+    [
+        (api_requests.CurrentShipmentsRequest, api_requests.REFRESH),
+        (api_requests.ShipmentExportsRequest, api_requests.REFRESH),
+        (api_requests.CloseShipment, api_requests.INTERACTIVE),
+        (api_requests.DownloadShipmentFile, api_requests.INTERACTIVE),
+        (api_requests.DownloadAddressFile, api_requests.INTERACTIVE),
+        (api_requests.ShipmentChangesRequest, None),
+    ],
+)
+def test_request_priority(request_class, priority):
+    assert request_class().priority == priority
+
+
+def test_request_priority_can_be_given():
+    request = api_requests.DownloadShipmentFile(priority=api_requests.BULK)
+    assert request.priority == api_requests.BULK
+
+
+def test_make_request_is_scheduled(
+    mock_requests, mock_make_url, mock_request_data, base_request
+):
+    with mock.patch("ups_manifestor.api_requests.scheduler") as mock_scheduler:
+        base_request.make_request()
+    mock_scheduler.hold.assert_called_once_with(api_requests.REFRESH)
+    mock_scheduler.hold.return_value.release.assert_called_once_with()
+
+
+@pytest.fixture
+def mock_scheduler():
+    scheduler = api_requests.RequestScheduler()
+    with mock.patch("ups_manifestor.api_requests.scheduler", scheduler):
+        yield scheduler
+
+
+def test_streamed_response_holds_slot_until_closed(
+    mock_requests, mock_make_url, mock_request_data, mock_scheduler
+):
+    response = api_requests.DownloadShipmentFile().make_request(export_id=1)
+    assert mock_scheduler.active[api_requests.INTERACTIVE] == 1
+    response.close()
+    response.close()
+    assert mock_scheduler.active[api_requests.INTERACTIVE] == 0
+    mock_requests.post.return_value.close.assert_called_with()
+
+
+def test_streamed_response_releases_slot_when_read(
+    mock_requests, mock_make_url, mock_request_data, mock_scheduler
+):
+    mock_requests.post.return_value.iter_content.return_value = [b"a", b"b"]
+    response = api_requests.DownloadShipmentFile().make_request(export_id=1)
+    assert list(response.iter_content(chunk_size=1)) == [b"a", b"b"]
+    assert mock_scheduler.active[api_requests.INTERACTIVE] == 0
+
+
+def test_failed_request_releases_slot(
+    mock_requests, mock_make_url, mock_request_data, mock_scheduler
+):
+    mock_requests.post.return_value.raise_for_status.side_effect = Exception
+    with pytest.raises(exceptions.HTTPRequestError):
+        api_requests.DownloadShipmentFile().make_request(export_id=1)
+    assert mock_scheduler.active[api_requests.INTERACTIVE] == 0
+    mock_requests.post.return_value.close.assert_called_once_with()
+
+
+class TestRequestScheduler:
+    @pytest.fixture
+    def scheduler(self):
+        return api_requests.RequestScheduler(
+            limits={api_requests.INTERACTIVE: 2}, background_limit=2
+        )
+
+    def test_class_limit(self, scheduler):
+        scheduler.acquire(api_requests.BULK)
+        assert not scheduler.can_start(api_requests.BULK)
+        assert scheduler.can_start(api_requests.REFRESH)
+        scheduler.release(api_requests.BULK)
+        assert scheduler.can_start(api_requests.BULK)
+
+    def test_background_limit(self, scheduler):
+        scheduler.acquire(api_requests.REFRESH)
+        scheduler.acquire(api_requests.BULK)
+        assert not scheduler.can_start(api_requests.REFRESH)
+        assert scheduler.can_start(api_requests.INTERACTIVE)
+
+    def test_interactive_limit(self, scheduler):
+        scheduler.acquire(api_requests.INTERACTIVE)
+        scheduler.acquire(api_requests.INTERACTIVE)
+        assert not scheduler.can_start(api_requests.INTERACTIVE)
+
+    def test_set_limit(self, scheduler):
+        scheduler.set_limit(api_requests.BULK, 3)
+        for _ in range(3):
+            assert scheduler.can_start(api_requests.BULK)
+            scheduler.acquire(api_requests.BULK)
+        assert not scheduler.can_start(api_requests.BULK)
+        assert scheduler.background_limit == 3
+
+    def test_waiting_refresh_goes_before_bulk(self, scheduler):
+        scheduler.waiting[api_requests.REFRESH] = 1
+        assert not scheduler.can_start(api_requests.BULK)
+
+    def test_bulk_goes_before_refresh_at_its_limit(self, scheduler):
+        scheduler.background_limit = 3
+        scheduler.acquire(api_requests.REFRESH)
+        scheduler.acquire(api_requests.REFRESH)
+        scheduler.waiting[api_requests.REFRESH] = 1
+        assert scheduler.can_start(api_requests.BULK)
+
+    def test_interactive_request_does_not_wait_for_background(self, scheduler):
+        scheduler.acquire(api_requests.REFRESH)
+        scheduler.acquire(api_requests.BULK)
+        started = threading.Event()
+
+        def background():
+            with scheduler.slot(api_requests.REFRESH):
+                started.set()
+
+        thread = threading.Thread(target=background, daemon=True)
+        thread.start()
+        with scheduler.slot(api_requests.INTERACTIVE):
+            assert not started.is_set()
+        scheduler.release(api_requests.BULK)
+        thread.join(timeout=5)
+        assert started.is_set()
+
+    def test_unscheduled_requests(self, scheduler):
+        with scheduler.slot(None):
+            assert scheduler.active == scheduler.waiting
+
+    def test_rate_limit_does_not_delay_interactive_requests(self, scheduler):
+        scheduler.set_rate(1)
+        with mock.patch("ups_manifestor.api_requests.time.sleep") as mock_sleep:
+            with scheduler.slot(api_requests.INTERACTIVE):
+                pass
+            with scheduler.slot(api_requests.INTERACTIVE):
+                pass
+            mock_sleep.assert_not_called()
+            with scheduler.slot(api_requests.REFRESH):
+                pass
+        assert mock_sleep.call_args[0][0] > 1
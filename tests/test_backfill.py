@@ -0,0 +1,156 @@
+import datetime as dt
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import api_requests, backfill
+from ups_manifestor.backfill import Backfill
+from ups_manifestor.fake_server import FakeServer
+from ups_manifestor.settings import Settings
+
+
+@pytest.fixture
+def server():
+    with FakeServer(token="TOKEN") as server:
+        with mock.patch.multiple(
+            Settings, PROTOCOL="http", DOMAIN=server.domain, TOKEN="TOKEN"
+        ):
+            yield server
+
+
+@pytest.fixture
+def export_ids(server):
+    export_ids = []
+    for number in range(6):
+        server.state.add_shipment(
+            {
+                "id": number,
+                "description": f"Shipment {number}",
+                "order_number": f"ORDER-{number}",
+                "destination": "UK",
+                "package_count": 1,
+                "value": 10,
+            }
+        )
+        export_ids.append(server.state.close_shipment(number))
+    return export_ids
+
+
+@pytest.fixture
+def archive_directory(tmp_path):
+    return tmp_path / "archive"
+
+
+def test_select_exports():
+    exports = [
+        {"id": 3, "created_at": "2024-03-09T10:00:00"},
+        {"id": 1, "created_at": "2024-03-01T10:00:00"},
+        {"id": 2, "created_at": "2024-03-05T10:00:00"},
+        {"id": 4, "created_at": None},
+    ]
+    assert backfill.select_exports(exports) == [4, 1, 2, 3]
+    assert backfill.select_exports(exports, export_ids=[3, 1]) == [1, 3]
+    assert backfill.select_exports(
+        exports, start=dt.date(2024, 3, 5), end=dt.date(2024, 3, 9)
+    ) == [2, 3]
+
+
+def test_select_exports_keeps_unlisted_ids():
+    exports = [{"id": 1, "created_at": "2024-03-01T10:00:00"}]
+    assert backfill.select_exports(exports, export_ids=[1, 99]) == [99, 1]
+    assert backfill.select_exports(
+        exports, export_ids=[1, 99], start=dt.date(2024, 3, 1)
+    ) == [1]
+
+
+def test_run_archives_files(export_ids, archive_directory):
+    result = Backfill(archive_directory, workers=3).run(export_ids)
+    assert sorted(result.downloaded) == export_ids
+    assert result.byte_count > 0
+    for export_id in export_ids:
+        directory = archive_directory / str(export_id)
+        commodities = api_requests.DownloadShipmentFile().request(export_id=export_id)
+        assert (directory / "commodities.csv").read_bytes() == commodities.content
+        assert (directory / "address.csv").is_file()
+    assert list(archive_directory.glob("*/.*.part")) == []
+
+
+def test_run_skips_archived_exports(export_ids, archive_directory):
+    Backfill(archive_directory).run(export_ids[:2])
+    with mock.patch.object(Backfill, "fetch", return_value=0) as fetch:
+        result = Backfill(archive_directory).run(export_ids)
+    assert result.skipped == export_ids[:2]
+    assert sorted(call.args[0] for call in fetch.call_args_list) == export_ids[2:]
+
+
+def test_run_resumes_after_failure(export_ids, archive_directory):
+    progress = mock.Mock()
+    unknown_export_id = max(export_ids) + 1
+    result = Backfill(archive_directory).run(
+        [export_ids[0], unknown_export_id], on_progress=progress
+    )
+    assert result.downloaded == [export_ids[0]]
+    assert list(result.failed) == [unknown_export_id]
+    assert progress.call_count == 2
+    assert not (archive_directory / str(unknown_export_id) / "commodities.csv").exists()
+    result = Backfill(archive_directory).run([export_ids[0], export_ids[1]])
+    assert result.skipped == [export_ids[0]]
+    assert result.downloaded == [export_ids[1]]
+
+
+def test_run_continues_after_unexpected_error(export_ids, archive_directory):
+    def fetch(export_id):
+        if export_id == export_ids[0]:
+            raise ValueError("Bad response")
+        return 1
+
+    with mock.patch.object(Backfill, "fetch", side_effect=fetch):
+        result = Backfill(archive_directory).run(export_ids[:2])
+    assert result.downloaded == [export_ids[1]]
+    assert result.failed == {export_ids[0]: "Bad response"}
+
+
+def test_run_ignores_unreadable_manifest_lines(export_ids, archive_directory):
+    archive_directory.mkdir()
+    manifest_path = archive_directory / backfill.MANIFEST_FILE_NAME
+    manifest_path.write_text(
+        f'{{"export_id": {export_ids[0]}}}\nnot json\n{{}}\n{{"export_id": 1'
+    )
+    result = Backfill(archive_directory).run(export_ids[:2])
+    assert result.skipped == [export_ids[0]]
+    assert result.downloaded == [export_ids[1]]
+    assert Backfill(archive_directory).completed == set(export_ids[:2])
+
+
+def test_run_uses_bulk_priority(export_ids, archive_directory):
+    with mock.patch.object(
+        api_requests.scheduler, "hold", wraps=api_requests.scheduler.hold
+    ) as hold:
+        Backfill(archive_directory).run(export_ids[:1])
+    assert {call.args[0] for call in hold.call_args_list} == {api_requests.BULK}
+
+
+def test_run_copies_cached_files(archive_directory, tmp_path):
+    cached_path = tmp_path / "cached.csv"
+    cached_path.write_bytes(b"cached")
+    cache = mock.Mock()
+    cache.get.return_value = cached_path
+    result = Backfill(archive_directory, cache=cache).run([7])
+    assert result.downloaded == [7]
+    assert result.byte_count == 12
+    assert (archive_directory / "7" / "address.csv").read_bytes() == b"cached"
+
+
+def test_result_summary():
+    result = backfill.BackfillResult()
+    result.downloaded = [1, 2]
+    result.skipped = [3]
+    result.failed = {4: "Error"}
+    result.byte_count = 4_000_000
+    result.seconds = 2
+    assert result.summary().splitlines() == [
+        "Downloaded 2 exports (4.0 MB) in 2.0s: 1.0 exports/s, 2.00 MB/s.",
+        "Skipped 1 exports already downloaded.",
+        "1 exports failed:",
+        "  4: Error",
+    ]
@@ -0,0 +1,18 @@
+from ups_manifestor import benchmark
+
+
+def test_make_body():
+    assert len(benchmark.make_body(1000)) >= 1000
+
+
+def test_run():
+    results = benchmark.run(100_000, repeat=1)
+    assert set(results) == {benchmark.ITER_CONTENT, benchmark.ENGINE}
+    assert all(seconds > 0 for seconds, _ in results.values())
+    text = benchmark.format_results(results, 100_000)
+    assert text.splitlines()[1].startswith(benchmark.ITER_CONTENT)
+
+
+def test_main(capsys):
+    benchmark.main(["--size", "0.1", "--repeat", "1"])
+    assert "MB/s" in capsys.readouterr().out
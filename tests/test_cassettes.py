@@ -0,0 +1,230 @@
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import api_requests, exceptions
+from ups_manifestor.cassettes import REDACTED, Cassette, CassetteError
+
+URL = "https://test.com/fba/api/download_shipment_file"
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return tmp_path / "cassette.json"
+
+
+@pytest.fixture
+def mock_requests():
+    with mock.patch("ups_manifestor.api_requests.session") as mock_requests:
+        yield mock_requests
+
+
+@pytest.fixture
+def live_response(mock_requests):
+    response = mock_requests.post.return_value
+    response.status_code = 200
+    response.headers = {"Content-Type": "application/json"}
+    response.iter_content.return_value = [b'{"shipments": ', b"[]}"]
+    return response
+
+
+@pytest.fixture
+def recorded_cassette(load_settings, cassette_path, live_response):
+    with Cassette(cassette_path, mode=Cassette.RECORD).use():
+        api_requests.CurrentShipmentsRequest().request()
+    return cassette_path
+
+
+def make_interaction(url, data, chunks, status_code=200):
+    return {
+        "url": url,
+        "data": data,
+        "status_code": status_code,
+        "headers": {},
+        "chunks": chunks,
+    }
+
+
+def write_cassette(path, interactions):
+    with open(path, "w") as f:
+        json.dump({"interactions": interactions}, f)
+
+
+def test_record_returns_response(load_settings, cassette_path, live_response):
+    with Cassette(cassette_path, mode=Cassette.RECORD).use():
+        response = api_requests.CurrentShipmentsRequest().request()
+    assert response == {"shipments": []}
+
+
+def test_record_writes_cassette(recorded_cassette):
+    with open(recorded_cassette) as f:
+        (interaction,) = json.load(f)["interactions"]
+    assert interaction["url"] == "https://test.com/fba/api/current_shipments"
+    assert interaction["status_code"] == 200
+    assert len(interaction["chunks"]) == 2
+
+
+def test_record_redacts_token(recorded_cassette):
+    contents = recorded_cassette.read_text()
+    assert "TEST_TOKEN" not in contents
+    assert REDACTED in contents
+
+
+def test_replay(recorded_cassette, mock_requests):
+    mock_requests.post.reset_mock()
+    with Cassette(recorded_cassette).use():
+        response = api_requests.CurrentShipmentsRequest().request()
+    assert response == {"shipments": []}
+    mock_requests.post.assert_not_called()
+
+
+def test_replay_matches_request_data(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/download_shipment_file",
+                {"token": REDACTED, "export_id": export_id},
+                [[0, base64.b64encode(f"export {export_id}".encode()).decode()]],
+            )
+            for export_id in (1, 2)
+        ],
+    )
+    with Cassette(cassette_path).use():
+        response = api_requests.DownloadShipmentFile().request(export_id=2)
+    assert response.content == b"export 2"
+
+
+def test_replay_ignores_idempotency_key(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/close_shipment",
+                {"token": REDACTED, "shipment_id": 3, "idempotency_key": "recorded"},
+                [[0, base64.b64encode(b'{"export_id": 15}').decode()]],
+            )
+        ],
+    )
+    with Cassette(cassette_path).use():
+        response = api_requests.CloseShipment().request(
+            shipment_id=3, idempotency_key="replayed"
+        )
+    assert response == {"export_id": 15}
+
+
+def test_concurrent_replays_play_each_interaction_once(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/download_shipment_file",
+                {"token": REDACTED, "export_id": 1},
+                [[0, base64.b64encode(f"copy {copy}".encode()).decode()]],
+            )
+            for copy in range(20)
+        ],
+    )
+    cassette = Cassette(cassette_path)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(
+            executor.map(
+                lambda _: cassette.replay(URL, {"token": "t", "export_id": 1}),
+                range(20),
+            )
+        )
+    assert sorted(response.content for response in responses) == sorted(
+        f"copy {copy}".encode() for copy in range(20)
+    )
+
+
+def test_replay_unrecorded_request(load_settings, cassette_path):
+    write_cassette(cassette_path, [])
+    with Cassette(cassette_path).use():
+        with pytest.raises(exceptions.HTTPRequestError):
+            api_requests.CurrentShipmentsRequest().request()
+
+
+def test_replay_recorded_error_status(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/current_shipments",
+                {"token": REDACTED},
+                [[0, ""]],
+                status_code=500,
+            )
+        ],
+    )
+    with Cassette(cassette_path).use():
+        with pytest.raises(exceptions.HTTPRequestError):
+            api_requests.CurrentShipmentsRequest().request()
+
+
+def test_replay_streams_chunks(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/download_address_file",
+                {"token": REDACTED, "export_id": 1},
+                [[0, "YWJj"], [0, "ZGVm"]],
+            )
+        ],
+    )
+    with Cassette(cassette_path).use():
+        response = api_requests.DownloadAddressFile().request(export_id=1)
+    assert list(response.iter_content(chunk_size=2)) == [b"ab", b"cd", b"ef"]
+
+
+@pytest.mark.parametrize("speed,expected_delay", [(1, 0.5), (2, 0.25)])
+def test_replay_speed(load_settings, cassette_path, speed, expected_delay):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/current_shipments",
+                {"token": REDACTED},
+                [[0.5, "e30="]],
+            )
+        ],
+    )
+    with mock.patch("ups_manifestor.cassettes.time") as mock_time:
+        mock_time.monotonic.return_value = 0
+        with Cassette(cassette_path, speed=speed).use():
+            api_requests.CurrentShipmentsRequest().request()
+    mock_time.sleep.assert_called_once_with(expected_delay)
+
+
+def test_replay_without_speed_does_not_wait(load_settings, cassette_path):
+    write_cassette(
+        cassette_path,
+        [
+            make_interaction(
+                "https://test.com/fba/api/current_shipments",
+                {"token": REDACTED},
+                [[10, "e30="]],
+            )
+        ],
+    )
+    with mock.patch("ups_manifestor.cassettes.time.sleep") as mock_sleep:
+        with Cassette(cassette_path).use():
+            api_requests.CurrentShipmentsRequest().request()
+    mock_sleep.assert_not_called()
+
+
+def test_cassette_is_inactive_after_use(cassette_path):
+    write_cassette(cassette_path, [])
+    with Cassette(cassette_path).use():
+        assert Cassette.active is not None
+    assert Cassette.active is None
+
+
+def test_replay_error(cassette_path):
+    write_cassette(cassette_path, [])
+    with pytest.raises(CassetteError):
+        Cassette(cassette_path).replay("https://test.com/page", {"token": "TOKEN"})
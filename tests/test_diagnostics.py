@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from ups_manifestor import diagnostics
+from ups_manifestor.diagnostics import Profiler
+
+
+@pytest.fixture
+def profile_directory(tmp_path):
+    directory = tmp_path / "diagnostics"
+    Profiler.enable(directory)
+    yield directory
+    Profiler.disable()
+
+
+@diagnostics.profiled("outer action")
+def outer_action():
+    return inner_action() + 1
+
+
+@diagnostics.profiled("inner action")
+def inner_action():
+    return sum(range(1000))
+
+
+def test_profiled_function_returns_value():
+    assert outer_action() == 499501
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    Profiler.directory = tmp_path
+    outer_action()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_writes_stats_and_snapshot(profile_directory):
+    outer_action()
+    assert (profile_directory / "0001-outer_action.pstats").is_file()
+    assert (profile_directory / "0001-outer_action.snapshot").is_file()
+
+
+def test_nested_actions_are_profiled_once(profile_directory):
+    outer_action()
+    assert len(list(profile_directory.glob("*.pstats"))) == 1
+
+
+def test_each_action_is_profiled(profile_directory):
+    outer_action()
+    inner_action()
+    assert sorted(path.name for path in profile_directory.glob("*.pstats")) == [
+        "0001-outer_action.pstats",
+        "0002-inner_action.pstats",
+    ]
+
+
+def test_writes_summary(profile_directory):
+    outer_action()
+    summary = (profile_directory / Profiler.SUMMARY_FILE_NAME).read_text()
+    assert "0001-outer_action" in summary
+    assert "inner_action" in summary
+
+
+def test_profile_releases_depth_on_error(profile_directory):
+    with pytest.raises(ValueError):
+        with Profiler.profile("failing action"):
+            raise ValueError()
+    assert Profiler.depth() == 0
+    assert Profiler.profiling_thread is None
+    assert (profile_directory / "0001-failing_action.pstats").is_file()
+
+
+def test_actions_on_other_threads_are_not_profiled(profile_directory):
+    results = []
+
+    def other_thread():
+        results.append((Profiler.depth(), outer_action()))
+
+    with Profiler.profile("gui action"):
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+    assert results == [(0, 499501)]
+    assert [path.name for path in profile_directory.glob("*.pstats")] == [
+        "0001-gui_action.pstats"
+    ]
+
+
+def test_summarise(profile_directory):
+    outer_action()
+    summary = diagnostics.summarise(profile_directory)
+    assert "1 profiled actions" in summary
+    assert "inner_action" in summary
+
+
+def test_summarise_without_profiles(tmp_path):
+    assert diagnostics.summarise(tmp_path) == f"No profiles found in {tmp_path}."
+
+
+def test_write_report(profile_directory):
+    Profiler.write_report("report.txt", "text")
+    assert (profile_directory / "report.txt").read_text() == "text"
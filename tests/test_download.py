@@ -0,0 +1,129 @@
+import gzip
+import io
+import os
+from unittest import mock
+
+import pytest
+import requests
+import urllib3
+
+from ups_manifestor import download, multipart
+from ups_manifestor.benchmark import make_response
+from ups_manifestor.download import DownloadEngine, DownloadStats
+
+
+@pytest.fixture
+def body():
+    return bytes(range(256)) * 4000
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "file.csv"
+
+
+def test_download_reads_into_buffers(body, path):
+    response = make_response(body)
+    engine = DownloadEngine(buffer_count=2)
+    with mock.patch.object(
+        engine, "copy_chunks", side_effect=AssertionError
+    ), mock.patch.object(download, "write_all", wraps=download.write_all) as write:
+        stats = engine.download(response, path)
+    assert path.read_bytes() == body
+    assert stats.byte_count == len(body)
+    assert all(len(call.args[1]) <= 2 for call in write.call_args_list)
+
+
+def test_download_parts_reads_into_buffers(body, tmp_path):
+    parts = [("commodities", "text/csv", body), ("address", "text/csv", body[:10])]
+    response = make_response(multipart.encode(parts, "boundary"))
+    response.headers["Content-Type"] = 'multipart/mixed; boundary="boundary"'
+    paths = {"commodities": tmp_path / "commodities.csv"}
+    engine = DownloadEngine(buffer_count=2)
+    with mock.patch.object(
+        response, "iter_content", side_effect=AssertionError
+    ), mock.patch.object(download, "write_all", wraps=download.write_all) as write:
+        names = engine.download_parts(
+            response, lambda headers: paths.get(multipart.part_name(headers))
+        )
+    assert names == ["commodities", "address"]
+    assert paths["commodities"].read_bytes() == body
+    assert write.call_count < len(body) // download.MIN_CHUNK_SIZE
+
+
+def test_vectored_writer_writes_when_full(path):
+    with open(path, "wb", buffering=0) as file:
+        writer = download.VectoredWriter(file, size=4)
+        writer.write(b"ab")
+        assert path.read_bytes() == b""
+        writer.write(b"cd")
+        assert path.read_bytes() == b"abcd"
+        writer.write(b"e")
+        writer.flush()
+    assert path.read_bytes() == b"abcde"
+
+
+def test_download_grows_chunk_size_for_fast_reads(body, path):
+    engine = DownloadEngine()
+    engine.download(make_response(body), path)
+    assert engine.chunk_size == download.MAX_CHUNK_SIZE
+
+
+def test_adapt_shrinks_chunk_size_for_slow_reads():
+    engine = DownloadEngine()
+    for _ in range(10):
+        engine.adapt(True, download.SLOW_READ_SECONDS + 1)
+    assert engine.chunk_size == download.MIN_CHUNK_SIZE
+
+
+def test_adapt_keeps_chunk_size_for_short_reads():
+    engine = DownloadEngine()
+    engine.adapt(False, 0)
+    assert engine.chunk_size == DownloadEngine.INITIAL_CHUNK_SIZE
+
+
+def test_download_decodes_compressed_response(body, path):
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Encoding"] = "gzip"
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(gzip.compress(body)),
+        headers={"Content-Encoding": "gzip"},
+        preload_content=False,
+    )
+    stats = DownloadEngine().download(response, path)
+    assert path.read_bytes() == body
+    assert stats.byte_count == len(body)
+
+
+def test_download_copies_chunks_without_raw_body(path):
+    response = mock.Mock()
+    response.iter_content.return_value = [b"first", b"second"]
+    assert DownloadEngine().download(response, path).byte_count == 11
+    assert path.read_bytes() == b"firstsecond"
+
+
+def test_write_all_retries_partial_writes(path):
+    writes = []
+
+    def writev(fd, buffers):
+        writes.append(b"".join(buffers))
+        return min(3, sum(len(buffer) for buffer in buffers))
+
+    with open(path, "wb", buffering=0) as file, mock.patch.object(
+        download.os, "writev", side_effect=writev, create=True
+    ):
+        download.write_all(file, [b"abcd", b"", b"ef"])
+    assert writes == [b"abcdef", b"def"]
+
+
+def test_write_all_without_writev(path, monkeypatch):
+    monkeypatch.delattr(os, "writev", raising=False)
+    with open(path, "wb", buffering=0) as file:
+        download.write_all(file, [b"abc", bytearray(b"def")])
+    assert path.read_bytes() == b"abcdef"
+
+
+def test_download_stats():
+    assert DownloadStats(100, 2).bytes_per_second == 50
+    assert DownloadStats(100, 0).bytes_per_second == 100
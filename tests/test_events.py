@@ -0,0 +1,108 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import events, exceptions
+
+
+@pytest.fixture
+def job_queue():
+    return events.JobQueue()
+
+
+@pytest.fixture
+def mock_monotonic():
+    with mock.patch("ups_manifestor.events.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 100
+        yield mock_monotonic
+
+
+def test_posted_callback_runs(job_queue):
+    callback = mock.Mock()
+    job_queue.post(callback, 1, 2)
+    callback.assert_not_called()
+    job_queue.run_pending()
+    callback.assert_called_once_with(1, 2)
+
+
+def test_posted_callbacks_run_once(job_queue):
+    callback = mock.Mock()
+    job_queue.post(callback)
+    job_queue.run_pending()
+    job_queue.run_pending()
+    callback.assert_called_once_with()
+
+
+def test_post_from_thread(job_queue):
+    callback = mock.Mock()
+    thread = threading.Thread(target=job_queue.post, args=(callback, "result"))
+    thread.start()
+    thread.join()
+    job_queue.run_pending()
+    callback.assert_called_once_with("result")
+
+
+def test_scheduled_callback_waits_until_due(job_queue, mock_monotonic):
+    callback = mock.Mock()
+    job_queue.schedule(5, callback, "arg")
+    mock_monotonic.return_value = 104
+    job_queue.run_pending()
+    callback.assert_not_called()
+    mock_monotonic.return_value = 105
+    job_queue.run_pending()
+    callback.assert_called_once_with("arg")
+
+
+def test_scheduled_callbacks_run_in_due_order(job_queue, mock_monotonic):
+    calls = []
+    job_queue.schedule(2, calls.append, "second")
+    job_queue.schedule(1, calls.append, "first")
+    job_queue.schedule(2, calls.append, "third")
+    mock_monotonic.return_value = 110
+    job_queue.run_pending()
+    assert calls == ["first", "second", "third"]
+
+
+def test_scheduled_callback_can_reschedule(job_queue, mock_monotonic):
+    callback = mock.Mock(side_effect=lambda: job_queue.schedule(1, callback))
+    job_queue.schedule(1, callback)
+    mock_monotonic.return_value = 101
+    job_queue.run_pending()
+    callback.assert_called_once_with()
+    assert len(job_queue.scheduled) == 1
+
+
+def test_failing_callback_does_not_stop_queue(mock_monotonic):
+    on_error = mock.Mock()
+    job_queue = events.JobQueue(on_error=on_error)
+    error = ValueError("failed")
+    callback = mock.Mock()
+    job_queue.post(mock.Mock(side_effect=error, __name__="fail"))
+    job_queue.post(callback)
+    job_queue.schedule(0, mock.Mock(side_effect=error, __name__="fail"))
+    job_queue.schedule(0, callback)
+    job_queue.run_pending()
+    assert callback.call_count == 2
+    assert on_error.call_args_list == [mock.call(error), mock.call(error)]
+
+
+def test_close_request_is_raised(job_queue):
+    job_queue.post(mock.Mock(side_effect=exceptions.CloseProgramRequest))
+    with pytest.raises(exceptions.CloseProgramRequest):
+        job_queue.run_pending()
+
+
+def test_dispatch_stats_summary():
+    stats = events.DispatchStats()
+    stats.record(0.000010, 0.002)
+    stats.record(0.000030, 0.004)
+    assert stats.summary() == (
+        "2 events dispatched.\n"
+        "Dispatch overhead: mean 20.0us, max 30.0us.\n"
+        "Handler time: mean 3.00ms, max 4.00ms.\n"
+    )
+
+
+def test_dispatch_stats_summary_without_events():
+    assert events.DispatchStats().summary() == "No events dispatched."
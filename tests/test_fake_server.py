@@ -0,0 +1,97 @@
+import io
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import api_requests, exceptions, multipart
+from ups_manifestor.fake_server import FakeServer
+from ups_manifestor.settings import Settings
+
+
+@pytest.fixture
+def server():
+    with FakeServer(token="TOKEN") as server:
+        with mock.patch.multiple(
+            Settings, PROTOCOL="http", DOMAIN=server.domain, TOKEN="TOKEN"
+        ):
+            yield server
+
+
+@pytest.fixture
+def shipment():
+    return {
+        "id": 7,
+        "description": "Shipment",
+        "order_number": "ORDER-7",
+        "destination": "Germany",
+        "package_count": 2,
+        "value": 10,
+    }
+
+
+def test_current_shipments(server, shipment):
+    server.state.add_shipment(shipment)
+    data = api_requests.CurrentShipmentsRequest().request()
+    assert data == {"shipments": [shipment]}
+
+
+def test_close_shipment_creates_export(server, shipment):
+    server.state.add_shipment(shipment)
+    export_id = api_requests.CloseShipment().request(shipment_id=7)["export_id"]
+    exports = api_requests.ShipmentExportsRequest().request()["exports"]
+    assert [export["id"] for export in exports] == [export_id]
+    assert api_requests.CurrentShipmentsRequest().request() == {"shipments": []}
+
+
+def test_close_shipment_is_idempotent(server, shipment):
+    server.state.add_shipment(shipment)
+    first = api_requests.CloseShipment().request(shipment_id=7, idempotency_key="k")
+    second = api_requests.CloseShipment().request(shipment_id=7, idempotency_key="k")
+    assert first == second
+
+
+def test_close_unknown_shipment_is_client_error(server):
+    with pytest.raises(exceptions.HTTPRequestError) as error:
+        api_requests.CloseShipment().request(shipment_id=99)
+    assert error.value.is_client_error
+
+
+def test_download_files(server, shipment):
+    server.state.add_shipment(shipment)
+    export_id = server.state.close_shipment(7)
+    response = api_requests.DownloadShipmentFile().request(export_id=export_id)
+    assert b"ORDER-7" in response.content
+    response = api_requests.DownloadAddressFile().request(export_id=export_id)
+    assert response.text.splitlines()[1].split(",")[17] == "ORDER-7"
+
+
+def test_rejects_invalid_token(server):
+    with mock.patch.object(Settings, "TOKEN", "WRONG"):
+        with pytest.raises(exceptions.HTTPRequestError) as error:
+            api_requests.CurrentShipmentsRequest().request()
+    assert error.value.status_code == 403
+
+
+def test_download_shipping_files_bundles_both_files(server, shipment):
+    server.state.add_shipment(shipment)
+    export_id = server.state.close_shipment(7)
+    response = api_requests.DownloadShippingFiles().request(export_id=export_id)
+    parts = {}
+    multipart.demultiplex(
+        response.iter_content(chunk_size=100),
+        multipart.get_boundary(response.headers["Content-Type"]),
+        lambda headers: parts.setdefault(multipart.part_name(headers), io.BytesIO()),
+    )
+    commodities = api_requests.DownloadShipmentFile().request(export_id=export_id)
+    address = api_requests.DownloadAddressFile().request(export_id=export_id)
+    assert parts["commodities"].getvalue() == commodities.content
+    assert parts["address"].getvalue() == address.content
+
+
+def test_download_shipping_files_without_bundled_downloads(server, shipment):
+    server.bundled_downloads = False
+    server.state.add_shipment(shipment)
+    export_id = server.state.close_shipment(7)
+    with pytest.raises(exceptions.HTTPRequestError) as error:
+        api_requests.DownloadShippingFiles().request(export_id=export_id)
+    assert error.value.status_code == 404
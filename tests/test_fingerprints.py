@@ -0,0 +1,134 @@
+import json
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import fingerprints
+from ups_manifestor.fingerprints import FingerprintIndex
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return tmp_path / "fingerprints.jsonl"
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = [tmp_path / "commodities.csv", tmp_path / "address.csv"]
+    for path in paths:
+        path.write_text(f"{path.name} contents")
+    return paths
+
+
+def test_identify_recorded_files(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.record([15], files)
+    assert [index.identify(path) for path in files] == [(15,), (15,)]
+
+
+def test_index_is_persisted(index_path, files):
+    FingerprintIndex(index_path).record([15, 16], files)
+    assert FingerprintIndex(index_path).identify(files[0]) == (15, 16)
+
+
+def test_index_skips_torn_record(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.record([15], files[:1])
+    index.record([16], files[1:])
+    index_path.write_text(index_path.read_text()[:-10])
+    reloaded = FingerprintIndex(index_path)
+    assert reloaded.identify(files[0]) == (15,)
+    assert reloaded.identify(files[1]) == ()
+    reloaded.record([17], files[1:])
+    assert FingerprintIndex(index_path).identify(files[1]) == (17,)
+
+
+def test_index_keeps_latest_records(index_path, files):
+    with mock.patch.object(FingerprintIndex, "MAX_RECORDS", 2):
+        index = FingerprintIndex(index_path)
+        index.record([15], files[:1])
+        index.record([16], files[1:])
+        files[0].write_text("new contents")
+        index.record([17], files[:1])
+        index.record([18], files[:1])
+        assert len(index_path.read_text().splitlines()) == 2
+        reloaded = FingerprintIndex(index_path)
+    assert [record["export_ids"] for record in reloaded.records] == [[17], [18]]
+    assert reloaded.identify(files[0]) == (18,)
+    assert reloaded.identify(files[1]) == ()
+    assert index.identify(files[1]) == ()
+
+
+def test_identify_shared_fingerprint(index_path, files, tmp_path):
+    shared_path = tmp_path / "shared_fingerprint"
+    other_station = FingerprintIndex(tmp_path / "other.jsonl")
+    shared_path.write_text(json.dumps(other_station.record([15], files)))
+    index = FingerprintIndex(index_path)
+    index.load_shared(shared_path)
+    assert index.identify(files[0]) == (15,)
+    shared_path.unlink()
+    index.load_shared(shared_path)
+    assert index.identify(files[0]) == ()
+
+
+def test_identify_missing_file(index_path, tmp_path):
+    assert FingerprintIndex(index_path).identify(tmp_path / "missing.csv") is None
+
+
+def test_identify_changed_file(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.record([15], files)
+    files[0].write_text("edited by hand")
+    assert index.identify(files[0]) == ()
+
+
+def test_hashes_are_cached(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.identify(files[0])
+    with mock.patch("ups_manifestor.fingerprints.file_hash") as mock_file_hash:
+        index.identify(files[0])
+    mock_file_hash.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "export_ids,expected",
+    [([15], "Export 15"), ([15, 16], "Merged exports 15, 16")],
+)
+def test_loaded_export_status(index_path, files, export_ids, expected):
+    index = FingerprintIndex(index_path)
+    index.record(export_ids, files)
+    assert fingerprints.loaded_export_status(index, files) == expected
+
+
+def test_loaded_export_status_of_missing_files(index_path, tmp_path):
+    index = FingerprintIndex(index_path)
+    paths = [tmp_path / "commodities.csv", tmp_path / "address.csv"]
+    assert fingerprints.loaded_export_status(index, paths) == "No shipping files"
+
+
+def test_loaded_export_status_of_edited_file(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.record([15], files)
+    files[1].write_text("edited by hand")
+    assert (
+        fingerprints.loaded_export_status(index, files)
+        == "Export 15, changed since download"
+    )
+
+
+def test_loaded_export_status_of_foreign_files(index_path, files):
+    assert (
+        fingerprints.loaded_export_status(FingerprintIndex(index_path), files)
+        == "Not downloaded by any station"
+    )
+
+
+def test_loaded_export_status_of_mixed_files(index_path, files):
+    index = FingerprintIndex(index_path)
+    index.record([15], files)
+    files[1].write_text("other export")
+    index.record([16], files[1:])
+    assert (
+        fingerprints.loaded_export_status(index, files)
+        == "Files from different exports: Export 15; Export 16"
+    )
@@ -0,0 +1,199 @@
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import exceptions
+from ups_manifestor.journal import CloseJournal, JournalReplayer
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return tmp_path / "close_journal.jsonl"
+
+
+@pytest.fixture
+def journal(journal_path):
+    return CloseJournal(journal_path)
+
+
+@pytest.fixture
+def close():
+    return mock.Mock(side_effect=lambda shipment_id, idempotency_key: shipment_id * 10)
+
+
+@pytest.fixture
+def download():
+    return mock.Mock()
+
+
+def http_error(status_code=None):
+    response = None if status_code is None else mock.Mock(status_code=status_code)
+    return exceptions.HTTPRequestError("url", response)
+
+
+def test_submit_returns_idempotency_key(journal):
+    key = journal.submit(1)
+    assert journal.pending() == [mock.ANY]
+    assert journal.pending()[0]["key"] == key
+
+
+def test_submit_is_durable(journal, journal_path):
+    key = journal.submit(1)
+    assert [entry["key"] for entry in CloseJournal(journal_path).pending()] == [key]
+
+
+def test_load_skips_torn_record(journal, journal_path):
+    key = journal.submit(1)
+    journal.submit(2)
+    journal_path.write_text(journal_path.read_text()[:-10])
+    journal = CloseJournal(journal_path)
+    assert [entry["key"] for entry in journal.pending()] == [key]
+    journal.submit(3)
+    assert len(CloseJournal(journal_path).pending()) == 2
+
+
+def test_submit_same_shipment_twice(journal):
+    assert journal.submit(1) == journal.submit(1)
+    assert len(journal.pending()) == 1
+
+
+def test_replay_closes_in_order(journal, close, download):
+    first_key = journal.submit(1)
+    second_key = journal.submit(2)
+    assert journal.replay(close, download) is True
+    assert close.call_args_list == [
+        mock.call(1, idempotency_key=first_key),
+        mock.call(2, idempotency_key=second_key),
+    ]
+    assert download.call_args_list == [mock.call(10), mock.call(20)]
+    assert journal.is_empty()
+
+
+def test_replay_downloads_for_lane(journal, journal_path, close, download):
+    journal.submit(1, lane="Freight")
+    journal.submit(2)
+    assert CloseJournal(journal_path).replay(close, download) is True
+    assert download.call_args_list == [mock.call(10, lane="Freight"), mock.call(20)]
+
+
+def test_replay_fails_download_for_unknown_lane(journal, close, download):
+    journal.submit(1, lane="Freight")
+    download.side_effect = exceptions.UnknownLaneError("Freight")
+    assert journal.replay(close, download) is True
+    assert journal.undownloaded() == []
+    assert [entry["error"] for entry in journal.failed()] == [
+        "Unknown shipment lane 'Freight'."
+    ]
+
+
+def test_replay_compacts_journal(journal, journal_path, close, download):
+    journal.submit(1)
+    journal.replay(close, download)
+    assert journal_path.read_text() == ""
+
+
+def test_replay_stops_while_offline(journal, close, download):
+    journal.submit(1)
+    journal.submit(2)
+    close.side_effect = http_error()
+    assert journal.replay(close, download) is False
+    close.assert_called_once()
+    download.assert_not_called()
+    assert len(journal.pending()) == 2
+
+
+def test_replay_stops_on_server_error(journal, close, download):
+    journal.submit(1)
+    close.side_effect = http_error(503)
+    assert journal.replay(close, download) is False
+    assert len(journal.pending()) == 1
+
+
+@pytest.mark.parametrize("status_code", [401, 408, 429])
+def test_replay_stops_on_retryable_client_error(journal, close, download, status_code):
+    journal.submit(1)
+    close.side_effect = http_error(status_code)
+    assert journal.replay(close, download) is False
+    assert len(journal.pending()) == 1
+    assert journal.failed() == []
+
+
+def test_replay_skips_rejected_close(journal, close, download):
+    journal.submit(1)
+    journal.submit(2)
+    close.side_effect = [http_error(400), 20]
+    assert journal.replay(close, download) is True
+    download.assert_called_once_with(20)
+    assert [entry["shipment_id"] for entry in journal.failed()] == [1]
+
+
+def test_replay_retries_failed_download(journal, journal_path, close, download):
+    journal.submit(1)
+    download.side_effect = http_error()
+    assert journal.replay(close, download) is False
+    reloaded = CloseJournal(journal_path)
+    assert reloaded.pending() == []
+    assert [entry["export_id"] for entry in reloaded.undownloaded()] == [10]
+    download.side_effect = None
+    assert reloaded.replay(close, download) is True
+    close.assert_called_once()
+
+
+def test_replay_retries_download_after_any_error(
+    journal, journal_path, close, download
+):
+    journal.submit(1)
+    download.side_effect = OSError("disk full")
+    assert journal.replay(close, download) is False
+    assert journal.download_errors() == ["disk full"]
+    assert journal.replay(close, download) is False
+    assert len(journal_path.read_text().splitlines()) == 3
+    download.side_effect = None
+    assert journal.replay(close, download) is True
+    assert journal.is_empty()
+
+
+def test_rejected_closes_are_kept(journal, journal_path, close, download):
+    journal.submit(1)
+    close.side_effect = http_error(400)
+    journal.replay(close, download)
+    assert [entry["shipment_id"] for entry in CloseJournal(journal_path).failed()] == [
+        1
+    ]
+
+
+def test_clear_failed(journal, journal_path, close, download):
+    journal.submit(1)
+    close.side_effect = [http_error(400)]
+    journal.replay(close, download)
+    journal.submit(2)
+    journal.clear_failed()
+    assert journal.failed() == []
+    reloaded = CloseJournal(journal_path)
+    assert reloaded.failed() == []
+    assert [entry["shipment_id"] for entry in reloaded.pending()] == [2]
+
+
+def test_rejected_closes_expire(journal, journal_path, close, download):
+    journal.submit(1)
+    close.side_effect = http_error(400)
+    with mock.patch("time.time", return_value=1000):
+        journal.replay(close, download)
+    with mock.patch("time.time", return_value=1000 + CloseJournal.FAILED_RETENTION + 1):
+        assert CloseJournal(journal_path).failed() == []
+
+
+def test_replayer_reports_unexpected_errors(journal, close, download):
+    journal.submit(1)
+    close.side_effect = OSError("disk full")
+    on_replayed = mock.Mock()
+    JournalReplayer(journal, close, download, on_replayed).replay_once()
+    (error,), _ = on_replayed.call_args
+    assert isinstance(error, OSError)
+
+
+def test_replayer_does_nothing_when_empty(journal, close, download):
+    on_replayed = mock.Mock()
+    JournalReplayer(journal, close, download, on_replayed).replay_once()
+    close.assert_not_called()
+    on_replayed.assert_not_called()
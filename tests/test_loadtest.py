@@ -0,0 +1,96 @@
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import exceptions, loadtest
+from ups_manifestor.fake_server import FakeServer
+from ups_manifestor.settings import Settings
+
+
+@pytest.fixture
+def server(tmp_path):
+    with FakeServer(token="TOKEN") as server:
+        with mock.patch.multiple(
+            Settings,
+            PROTOCOL="http",
+            DOMAIN=server.domain,
+            TOKEN="TOKEN",
+            SHIPMENT_DIRECTORY=str(tmp_path),
+            COMMODITIES_FILE_NAME="commodities.csv",
+            ADDRESS_FILE_NAME="address.csv",
+        ):
+            yield server
+
+
+def test_station_shipments_belong_to_station():
+    shipments = loadtest.station_shipments(3, 5)
+    assert len(shipments) == 5
+    assert {s["id"] // loadtest.STATION_ID_BLOCK for s in shipments} == {3}
+
+
+@pytest.mark.parametrize(
+    "error,kind",
+    [
+        (exceptions.LockTimeout("lock"), loadtest.CONTENTION),
+        (PermissionError(), loadtest.CONTENTION),
+        (exceptions.HTTPRequestError("url", None), loadtest.HTTP),
+        (KeyError(), loadtest.OTHER),
+    ],
+)
+def test_classify_error(error, kind):
+    assert loadtest.classify_error(error) == kind
+
+
+def test_station_closes_its_own_shipments(server):
+    shipments = loadtest.station_shipments(0, 1) + loadtest.station_shipments(1, 1)
+    for shipment in shipments:
+        server.state.add_shipment(shipment)
+    station = loadtest.Station(1)
+    station.list()
+    assert station.close() is True
+    assert station.close() is False
+    assert list(server.state.shipments) == [0]
+
+
+def test_station_downloads_newest_export(server, tmp_path):
+    for shipment in loadtest.station_shipments(0, 1):
+        server.state.add_shipment(shipment)
+    station = loadtest.Station(0)
+    station.list()
+    assert station.download() is False
+    station.close()
+    station.list()
+    assert station.download() is True
+    assert station.status() is True
+    assert station.shipment_file_manager.read_generation() == 1
+
+
+def test_station_run_records_samples(server):
+    for shipment in loadtest.station_shipments(0, 5):
+        server.state.add_shipment(shipment)
+    samples = loadtest.Station(0).run(duration=0.3, think_time=0.001)
+    assert samples
+    assert {name for name, _, _ in samples} <= set(loadtest.OPERATION_WEIGHTS)
+    assert all(error is None for _, _, error in samples)
+
+
+def test_summarise_round():
+    samples = [
+        (loadtest.LIST, 0.1, None),
+        (loadtest.LIST, 0.3, None),
+        (loadtest.DOWNLOAD, 0.2, loadtest.CONTENTION),
+    ]
+    summary = loadtest.summarise_round(2, samples, duration=2)
+    assert summary["operations"] == 3
+    assert summary["throughput"] == 1.5
+    assert summary["errors"] == {loadtest.CONTENTION: 1, loadtest.HTTP: 0, "other": 0}
+    assert summary["latency"][loadtest.LIST] == (0.1, 0.3, 0.3)
+    assert loadtest.CLOSE not in summary["latency"]
+    assert "list 100/300/300" in loadtest.format_summaries([summary])
+
+
+def test_run_stations_in_processes():
+    (summary,) = loadtest.run([2], duration=0.5, think_time=0.01, shipments=2)
+    assert summary["stations"] == 2
+    assert summary["operations"] > 0
+    assert summary["errors"][loadtest.CONTENTION] == 0
@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import exceptions
+from ups_manifestor.locking import DirectoryLock
+
+
+@pytest.fixture
+def lock(tmp_path):
+    return DirectoryLock(tmp_path)
+
+
+@pytest.fixture
+def other_lock(tmp_path):
+    other_lock = DirectoryLock(tmp_path)
+    other_lock.TIMEOUT = 0.1
+    return other_lock
+
+
+def write_lock(lock, owner, age):
+    acquired_at = time.time() - age
+    with open(lock.lock_path, "w") as f:
+        json.dump({"owner": owner, "acquired_at": acquired_at}, f)
+    os.utime(lock.lock_path, (acquired_at, acquired_at))
+
+
+def test_acquire_creates_lock_file(lock):
+    lock.acquire()
+    assert lock.read_lock()["owner"] == lock.owner
+
+
+def test_release_removes_lock_file(lock):
+    lock.acquire()
+    lock.release()
+    assert not lock.lock_path.exists()
+
+
+def test_context_manager(lock):
+    with lock:
+        assert lock.lock_path.exists()
+    assert not lock.lock_path.exists()
+
+
+def test_lock_is_exclusive(lock, other_lock):
+    with lock:
+        with pytest.raises(exceptions.LockTimeout):
+            other_lock.acquire()
+
+
+def test_waits_for_lock_to_be_released(lock, other_lock):
+    lock.acquire()
+    with mock.patch(
+        "ups_manifestor.locking.time.sleep", side_effect=lambda _: lock.release()
+    ):
+        other_lock.acquire()
+    assert other_lock.read_lock()["owner"] == other_lock.owner
+
+
+def test_breaks_stale_lock(lock):
+    write_lock(lock, "crashed station", age=lock.LEASE_SECONDS + 1)
+    lock.TIMEOUT = 0.1
+    lock.acquire()
+    assert lock.read_lock()["owner"] == lock.owner
+
+
+def test_does_not_break_live_lock(lock, other_lock):
+    write_lock(lock, "working station", age=1)
+    with pytest.raises(exceptions.LockTimeout):
+        other_lock.acquire()
+
+
+def test_lock_age_ignores_local_clock(lock):
+    write_lock(lock, "working station", age=1)
+    with mock.patch(
+        "ups_manifestor.locking.time.time", return_value=time.time() + 3600
+    ):
+        lock.break_if_stale()
+    assert lock.read_lock()["owner"] == "working station"
+
+
+def test_restores_lock_taken_while_breaking(lock):
+    write_lock(lock, "crashed station", age=lock.LEASE_SECONDS + 1)
+    real_replace = os.replace
+
+    def replace_after_new_lock(source, destination):
+        write_lock(lock, "new station", age=0)
+        real_replace(source, destination)
+
+    with mock.patch(
+        "ups_manifestor.locking.os.replace", side_effect=replace_after_new_lock
+    ):
+        lock.break_if_stale()
+    assert lock.read_lock()["owner"] == "new station"
+
+
+def test_acquire_fails_if_lock_cannot_be_restored(lock):
+    write_lock(lock, "crashed station", age=lock.LEASE_SECONDS + 1)
+    real_replace = os.replace
+
+    def replace_after_new_lock(source, destination):
+        write_lock(lock, "new station", age=0)
+        real_replace(source, destination)
+
+    with mock.patch(
+        "ups_manifestor.locking.os.replace", side_effect=replace_after_new_lock
+    ), mock.patch(
+        "ups_manifestor.locking.os.link", side_effect=PermissionError("no links")
+    ):
+        with pytest.raises(exceptions.LockError, match="no links"):
+            lock.acquire()
+    assert list(lock.directory.glob(f"{lock.LOCK_FILE_NAME}.*")) == []
+
+
+def test_release_does_not_remove_other_lock(lock):
+    write_lock(lock, "other station", age=0)
+    lock.release()
+    assert lock.read_lock()["owner"] == "other station"
+
+
+def test_generation_starts_at_zero(lock):
+    assert lock.read_generation() == 0
+
+
+def test_increment_generation(lock):
+    with lock:
+        assert lock.increment_generation() == 1
+        assert lock.increment_generation() == 2
+    assert lock.read_generation() == 2
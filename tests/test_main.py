@@ -2,6 +2,7 @@ from unittest import mock
 
 import pytest
 
+import main as main_module
 from main import main
 
 
@@ -23,6 +24,18 @@ def mock_settings():
         yield mock_settings
 
 
+@pytest.fixture(autouse=True)
+def mock_scheduler():
+    with mock.patch("main.scheduler") as mock_scheduler:
+        yield mock_scheduler
+
+
+@pytest.fixture(autouse=True)
+def mock_tracer():
+    with mock.patch("main.Tracer") as mock_tracer:
+        yield mock_tracer
+
+
 def test_loads_settings(mock_settings):
     main()
     mock_settings.load_settings.assert_called_once_with()
@@ -37,3 +50,176 @@ def test_handles_errors(mock_application, mock_error_window):
     mock_application.side_effect = Exception
     main()
     mock_error_window.assert_called_once
+
+
+@pytest.fixture
+def mock_profiler():
+    with mock.patch("main.Profiler") as mock_profiler:
+        yield mock_profiler
+
+
+@pytest.fixture
+def mock_summarise():
+    with mock.patch("main.summarise") as mock_summarise:
+        yield mock_summarise
+
+
+def test_profiling_is_disabled_by_default(mock_profiler):
+    main()
+    mock_profiler.enable.assert_not_called()
+
+
+def test_profile_option_enables_profiler(mock_profiler):
+    main(["--profile"])
+    mock_profiler.enable.assert_called_once_with("diagnostics")
+
+
+def test_profile_option_sets_directory(mock_profiler):
+    main(["--profile", "profiles"])
+    mock_profiler.enable.assert_called_once_with("profiles")
+
+
+def test_profile_summary_option(mock_summarise, mock_application):
+    main(["--profile-summary", "profiles"])
+    mock_summarise.assert_called_once_with("profiles")
+    mock_application.assert_not_called()
+
+
+def test_report_option(mock_application, capsys):
+    with mock.patch("main.ShipmentExports") as mock_shipment_exports:
+        mock_shipment_exports.return_value.exports = [
+            {"created_at": "2024-03-01", "package_count": 3, "shipment_count": 1}
+        ]
+        main(["--report", "7"])
+    mock_shipment_exports.return_value.update.assert_called_once_with()
+    assert "2024-03-01" in capsys.readouterr().out
+    mock_application.assert_not_called()
+
+
+def test_backfill_option(mock_application, mock_scheduler, tmp_path, capsys):
+    with mock.patch("main.ShipmentExports") as mock_shipment_exports, mock.patch(
+        "main.Backfill"
+    ) as mock_backfill, mock.patch("main.ExportFileCache"):
+        mock_shipment_exports.return_value.exports = [
+            {"id": 1, "created_at": "2024-03-01"},
+            {"id": 2, "created_at": "2024-03-05"},
+            {"id": 3, "created_at": "2024-03-09"},
+        ]
+        mock_backfill.return_value.run.return_value.summary.return_value = "Summary"
+        main(
+            [
+                "--backfill",
+                str(tmp_path),
+                "--since",
+                "2024-03-02",
+                "--until",
+                "2024-03-31",
+                "--workers",
+                "8",
+            ]
+        )
+    mock_backfill.assert_called_once_with(str(tmp_path), workers=8, cache=mock.ANY)
+    mock_scheduler.set_limit.assert_called_once_with(main_module.BULK, 8)
+    mock_backfill.return_value.run.assert_called_once_with([2, 3], on_progress=mock.ANY)
+    assert "Summary" in capsys.readouterr().out
+    mock_application.assert_not_called()
+
+
+def test_backfill_option_reports_unlisted_exports(
+    mock_application, mock_scheduler, tmp_path, capsys
+):
+    with mock.patch("main.ShipmentExports") as mock_shipment_exports, mock.patch(
+        "main.Backfill"
+    ) as mock_backfill, mock.patch("main.ExportFileCache"):
+        mock_shipment_exports.ID = "id"
+        mock_shipment_exports.return_value.exports = [
+            {"id": 2, "created_at": "2024-03-05"},
+        ]
+        main(
+            ["--backfill", str(tmp_path), "--exports", "2,99", "--since", "2024-03-01"]
+        )
+    mock_backfill.return_value.run.assert_called_once_with([2], on_progress=mock.ANY)
+    assert "unknown: 99" in capsys.readouterr().out
+
+
+def test_sets_request_rate(mock_scheduler, mock_settings):
+    main()
+    mock_scheduler.set_rate.assert_called_once_with(mock_settings.REQUESTS_PER_SECOND)
+
+
+def test_enables_tracing(mock_tracer, mock_settings):
+    main()
+    mock_tracer.enable.assert_called_once_with(mock_settings.TRACE_PATH)
+
+
+def test_trace_summary_option(mock_settings, mock_application):
+    with mock.patch("main.summarise_traces") as mock_summarise_traces:
+        main(["--trace-summary"])
+    mock_summarise_traces.assert_called_once_with(mock_settings.TRACE_PATH)
+    mock_application.assert_not_called()
+
+
+@pytest.fixture
+def mock_sync_service():
+    with mock.patch("main.SyncService") as mock_sync_service:
+        yield mock_sync_service
+
+
+@pytest.fixture
+def mock_service_client():
+    with mock.patch("main.ServiceClient") as mock_service_client:
+        yield mock_service_client
+
+
+def test_serve_option_runs_service(mock_sync_service, mock_application):
+    main(["--serve"])
+    mock_sync_service.return_value.serve_forever.assert_called_once_with()
+    mock_application.assert_not_called()
+
+
+def test_connect_option_runs_application_as_client(
+    mock_service_client, mock_application
+):
+    main(["--connect"])
+    mock_application.assert_called_once_with(client=mock_service_client.return_value)
+
+
+@pytest.mark.parametrize("option", ["--serve", "--connect"])
+def test_service_options_reject_lanes(
+    option, mock_settings, mock_sync_service, mock_application
+):
+    mock_settings.LANES = {"Parcel": {}, "Freight": {}}
+    with pytest.raises(SystemExit):
+        main([option])
+    mock_sync_service.assert_not_called()
+    mock_application.assert_not_called()
+
+
+def test_status_option_prints_status(mock_service_client, mock_application, capsys):
+    mock_service_client.return_value.call.return_value = []
+    main(["--status"])
+    assert "Open shipments: 0" in capsys.readouterr().out
+    mock_application.assert_not_called()
+
+
+@pytest.fixture
+def mock_cassette():
+    with mock.patch("main.Cassette") as mock_cassette:
+        yield mock_cassette
+
+
+def test_record_option_records_cassette(mock_cassette, mock_application):
+    main(["--record", "traffic.json"])
+    mock_cassette.assert_called_once_with("traffic.json", mode=mock_cassette.RECORD)
+    mock_cassette.return_value.use.assert_called_once_with()
+
+
+def test_replay_option_replays_cassette(mock_cassette, mock_application):
+    main(["--replay", "traffic.json", "--replay-speed", "2"])
+    mock_cassette.assert_called_once_with("traffic.json", speed=2.0)
+    mock_cassette.return_value.use.assert_called_once_with()
+
+
+def test_no_cassette_by_default(mock_cassette):
+    main()
+    mock_cassette.assert_not_called()
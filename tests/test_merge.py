@@ -0,0 +1,203 @@
+import io
+import threading
+import time
+
+import pytest
+
+from ups_manifestor import api_requests, merge
+
+
+def csv_bytes(*rows):
+    return "".join(",".join(row) + "\r\n" for row in rows).encode()
+
+
+def chunked(data, size=7):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def merged(sources, order_number_column=0, start_row=1, end_row=-1):
+    target = io.StringIO(newline="")
+    merge.merge_csv(
+        [chunked(source) for source in sources],
+        target,
+        order_number_column,
+        start_row,
+        end_row,
+    )
+    return target.getvalue()
+
+
+def test_iter_lines_joins_chunks():
+    chunks = [b"a,b\r", b"\nc,", b"d\r\ne"]
+    assert list(merge.iter_lines(chunks)) == ["a,b\r\n", "c,d\r\n", "e"]
+
+
+def test_iter_lines_keeps_bytes():
+    data = "café \x85\n".encode("utf8")
+    lines = list(merge.iter_lines([data]))
+    assert "".join(lines).encode(merge.ENCODING) == data
+    assert len(lines) == 1
+
+
+def test_read_chunks(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"abcde")
+    assert list(merge.read_chunks(path, chunk_size=2)) == [b"ab", b"cd", b"e"]
+
+
+def test_merge_keeps_header_once():
+    output = merged(
+        [
+            csv_bytes(["Order"], ["A"], ["END"]),
+            csv_bytes(["Order"], ["B"], ["END"]),
+        ]
+    )
+    assert output == csv_bytes(["Order"], ["A"], ["B"], ["END"]).decode()
+
+
+def test_merge_without_trailer():
+    output = merged(
+        [csv_bytes(["Order"], ["A"]), csv_bytes(["Order"], ["B"])], end_row=None
+    )
+    assert output == csv_bytes(["Order"], ["A"], ["B"]).decode()
+
+
+def test_merge_dedupes_orders_across_sources():
+    output = merged(
+        [
+            csv_bytes(["Order", "Item"], ["A", "1"], ["A", "2"], ["END"]),
+            csv_bytes(["Order", "Item"], ["A", "3"], ["B", "4"], ["END"]),
+        ]
+    )
+    assert (
+        output
+        == (
+            csv_bytes(["Order", "Item"], ["A", "1"], ["A", "2"], ["B", "4"], ["END"])
+        ).decode()
+    )
+
+
+def test_merge_order_number_column():
+    output = merged(
+        [
+            csv_bytes(["x", "Order"], ["1", "A"]),
+            csv_bytes(["x", "Order"], ["2", "A"], ["3", "B"]),
+        ],
+        order_number_column=1,
+        end_row=None,
+    )
+    assert output == csv_bytes(["x", "Order"], ["1", "A"], ["3", "B"]).decode()
+
+
+def test_merge_quoted_newlines():
+    source = b'Order,Note\r\nA,"two\r\nlines"\r\nEND\r\n'
+    assert merged([source]) == source.decode()
+
+
+def test_merge_keeps_row_formatting():
+    first = b'"Order","Note"\n"A","1.50"\n"END",""\n'
+    second = b'"Order","Note"\n"B","say ""hi"""\n"END",""\n'
+    assert merged([first, second]) == (
+        '"Order","Note"\n"A","1.50"\n"B","say ""hi"""\n"END",""\n'
+    )
+
+
+def test_merge_ends_last_row_of_source():
+    output = merged([b"Order\r\nA\r\nB", b"Order\r\nC\r\nEND\r\n"], end_row=None)
+    assert output == "Order\r\nA\r\nB\r\nC\r\nEND\r\n"
+
+
+def test_iter_records():
+    lines = ['A,"two\r\n', 'lines"\r\n', "B,x"]
+    assert list(merge.iter_records(lines)) == [
+        ('A,"two\r\nlines"\r\n', ["A", "two\r\nlines"]),
+        ("B,x\r\n", ["B", "x"]),
+    ]
+
+
+def test_merge_returns_row_count():
+    target = io.StringIO()
+    count = merge.merge_csv(
+        [[csv_bytes(["Order"], ["A"], ["B"], ["END"])]], target, 0, 1, -1
+    )
+    assert count == 2
+
+
+def test_merge_files(tmp_path):
+    target_path = tmp_path / "merged.csv"
+    sources = [
+        csv_bytes(["Order"], ["A"], ["END"]),
+        csv_bytes(["Order"], ["B"], ["END"]),
+    ]
+    merge.merge_files(
+        [lambda source=source: chunked(source) for source in sources],
+        target_path,
+        0,
+        1,
+        -1,
+    )
+    assert target_path.read_bytes() == csv_bytes(["Order"], ["A"], ["B"], ["END"])
+
+
+def test_merge_files_raises_source_errors(tmp_path):
+    def fail():
+        yield b"Order\r\n"
+        raise OSError("connection lost")
+
+    with pytest.raises(OSError):
+        merge.merge_files([fail], tmp_path / "merged.csv", 0, 1, -1)
+
+
+def test_merge_files_with_more_sources_than_request_slots(tmp_path):
+    scheduler = api_requests.RequestScheduler(limits={api_requests.INTERACTIVE: 2})
+    rows = [[f"{source}-{row}"] for source in range(6) for row in range(100)]
+    sources = [
+        csv_bytes(["Order"], *rows[source * 100 : (source + 1) * 100], ["END"])
+        for source in range(6)
+    ]
+
+    def read(source, slot):
+        try:
+            yield from chunked(source)
+        finally:
+            slot.release()
+
+    def download(source):
+        # Like a streamed response, the slot is held until the body is read.
+        if source is sources[0]:
+            time.sleep(0.2)
+        return read(source, scheduler.hold(api_requests.INTERACTIVE))
+
+    target_path = tmp_path / "merged.csv"
+    thread = threading.Thread(
+        target=merge.merge_files,
+        args=(
+            [lambda source=source: download(source) for source in sources],
+            target_path,
+            0,
+            1,
+            -1,
+        ),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert target_path.read_bytes() == csv_bytes(["Order"], *rows, ["END"])
+
+
+def test_source_stream_is_bounded():
+    produced = []
+    release = threading.Event()
+
+    def chunks():
+        for i in range(10):
+            produced.append(i)
+            yield bytes([i])
+        release.set()
+
+    stream = merge.SourceStream(chunks, buffer_size=2)
+    stream.start()
+    assert not release.wait(0.2)
+    assert len(produced) <= 3
+    assert b"".join(stream) == bytes(range(10))
@@ -28,15 +28,13 @@ def test_update_method_makes_request(mock_api_requests):
     mock_api_requests.CurrentShipmentsRequest.return_value.request.assert_called_once_with()
 
 
-def test_update_method_sets_shipments(mock_api_requests):
+def test_update_method_sets_shipments(mock_api_requests, shipment):
+    mock_api_requests.CurrentShipmentsRequest.return_value.request.return_value = {
+        "shipments": [shipment]
+    }
     current_shipments = CurrentShipments()
     current_shipments.update()
-    assert (
-        current_shipments.shipments
-        == mock_api_requests.CurrentShipmentsRequest.return_value.request.return_value[
-            "shipments"
-        ]
-    )
+    assert list(current_shipments.shipments) == [shipment]
 
 
 def test_get_display_rows_method(shipment):
@@ -60,7 +58,14 @@ def test_close_shipments_method_makes_request(mock_api_requests, shipment_id):
     CurrentShipments().close_shipment(shipment_id=shipment_id)
     mock_api_requests.CloseShipment.assert_called_once_with()
     mock_api_requests.CloseShipment.return_value.request.assert_called_once_with(
-        shipment_id=shipment_id
+        shipment_id=shipment_id, idempotency_key=None
+    )
+
+
+def test_close_shipments_method_sends_idempotency_key(mock_api_requests, shipment_id):
+    CurrentShipments().close_shipment(shipment_id=shipment_id, idempotency_key="abc")
+    mock_api_requests.CloseShipment.return_value.request.assert_called_once_with(
+        shipment_id=shipment_id, idempotency_key="abc"
     )
 
 
@@ -72,3 +77,25 @@ def test_close_shipments_method_returns_export_id(mock_api_requests, shipment_id
             "export_id"
         ]
     )
+
+
+def test_get_display_rows_method_filters(shipment):
+    current_shipments = CurrentShipments()
+    current_shipments.shipments = [shipment, dict(shipment, order_number="BBB1")]
+    current_shipments.set_filter("bbb")
+    assert [row[-1] for row in current_shipments.get_display_rows()] == ["BBB1"]
+
+
+def test_get_display_rows_method_with_records(shipment):
+    current_shipments = CurrentShipments()
+    other_shipment = dict(shipment, order_number="BBB1")
+    current_shipments.shipments = [shipment, other_shipment]
+    rows = current_shipments.get_display_rows([other_shipment])
+    assert [row[-1] for row in rows] == ["BBB1"]
+
+
+def test_close_shipment_invalidates_shipments(mock_api_requests, shipment_id):
+    current_shipments = CurrentShipments()
+    current_shipments.update()
+    current_shipments.close_shipment(shipment_id=shipment_id)
+    assert current_shipments.freshness.invalidated
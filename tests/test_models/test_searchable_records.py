@@ -0,0 +1,97 @@
+from unittest import mock
+
+import pytest
+
+from ups_manifestor.models import FreshnessPolicy, SearchableRecords, Snapshot
+from ups_manifestor.settings import Settings
+
+
+class Records(SearchableRecords):
+    search_keys = ("name",)
+
+
+@pytest.fixture
+def records():
+    return [{"id": 1, "name": "alpha"}, {"id": 2, "name": "beta"}]
+
+
+def test_snapshot_records_are_read_only(records):
+    snapshot = Snapshot(1, records, ("name",))
+    with pytest.raises(TypeError):
+        snapshot.records[0]["name"] = "changed"
+    with pytest.raises(AttributeError):
+        snapshot.records.append({})
+
+
+def test_snapshot_copies_records(records):
+    snapshot = Snapshot(1, records, ("name",))
+    records[0]["name"] = "changed"
+    assert snapshot.get(1)["name"] == "alpha"
+
+
+def test_snapshot_get(records):
+    snapshot = Snapshot(1, records, ("name",))
+    assert snapshot.get(2)["name"] == "beta"
+    assert snapshot.get(3) is None
+
+
+def test_set_records_publishes_new_version(records):
+    model = Records()
+    assert model.version == 0
+    model.set_records(records)
+    assert model.version == 1
+    model.set_records(records)
+    assert model.version == 2
+
+
+def test_set_records_does_not_change_old_snapshot(records):
+    model = Records()
+    model.set_records(records)
+    snapshot = model.snapshot
+    model.set_records(records[:1])
+    assert len(snapshot) == 2
+    assert [record["id"] for record in model.get_display_records(snapshot)] == [1, 2]
+    assert [record["id"] for record in model.get_display_records()] == [1]
+
+
+def test_get(records):
+    model = Records()
+    model.set_records(records)
+    assert model.get(1)["name"] == "alpha"
+
+
+def test_freshness_policy_expires_after_ttl():
+    freshness = FreshnessPolicy(ttl=30)
+    assert freshness.invalidated
+    assert not freshness.is_fresh()
+    with mock.patch("ups_manifestor.models.time.monotonic", return_value=100):
+        freshness.loaded()
+    with mock.patch("ups_manifestor.models.time.monotonic", return_value=129):
+        assert freshness.is_fresh()
+    with mock.patch("ups_manifestor.models.time.monotonic", return_value=130):
+        assert not freshness.is_fresh()
+    assert not freshness.invalidated
+
+
+def test_freshness_policy_invalidate():
+    freshness = FreshnessPolicy(ttl=30)
+    freshness.loaded()
+    freshness.invalidate()
+    assert freshness.invalidated
+    assert not freshness.is_fresh()
+
+
+def test_set_records_marks_records_fresh(records):
+    model = Records()
+    model.freshness.ttl = 30
+    model.set_records(records)
+    assert model.freshness.is_fresh()
+
+
+def test_ttl_is_read_from_settings():
+    class TimedRecords(Records):
+        TTL_SETTING = "SHIPMENTS_TTL"
+
+    with mock.patch.object(Settings, "SHIPMENTS_TTL", 45):
+        assert TimedRecords().freshness.ttl == 45
+    assert Records().freshness.ttl == 0
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 from ups_manifestor.models import ShipmentExports
@@ -22,15 +24,13 @@ def test_update_method_makes_request(mock_api_requests):
     mock_api_requests.ShipmentExportsRequest.return_value.request.assert_called_once_with()
 
 
-def test_update_method_sets_exports(mock_api_requests):
+def test_update_method_sets_exports(mock_api_requests, export):
+    mock_api_requests.ShipmentExportsRequest.return_value.request.return_value = {
+        "exports": [export]
+    }
     current_shipments = ShipmentExports()
     current_shipments.update()
-    assert (
-        current_shipments.exports
-        == mock_api_requests.ShipmentExportsRequest.return_value.request.return_value[
-            "exports"
-        ]
-    )
+    assert list(current_shipments.exports) == [export]
 
 
 def test_get_display_rows_method(export):
@@ -47,3 +47,36 @@ def test_get_display_rows_method(export):
         ]
     ]
     assert current_shipments.get_display_rows() == expected
+
+
+@pytest.fixture
+def exports(export):
+    return [
+        dict(export, id=1, order_numbers="FBA1", created_at="23 Dec 2022"),
+        dict(export, id=2, order_numbers="FBA2", created_at="21 Dec 2022"),
+        dict(export, id=3, order_numbers="XYZ3", created_at="22 Dec 2022"),
+    ]
+
+
+def test_get_display_records_filters_by_order_number(exports):
+    shipment_exports = ShipmentExports()
+    shipment_exports.exports = exports
+    shipment_exports.set_filter("fba")
+    assert [e["id"] for e in shipment_exports.get_display_records()] == [1, 2]
+
+
+def test_toggle_sort_sorts_by_date(exports):
+    shipment_exports = ShipmentExports()
+    shipment_exports.exports = exports
+    shipment_exports.toggle_sort(ShipmentExports.CREATED_AT)
+    assert [e["id"] for e in shipment_exports.get_display_records()] == [2, 3, 1]
+    shipment_exports.toggle_sort(ShipmentExports.CREATED_AT)
+    assert [e["id"] for e in shipment_exports.get_display_records()] == [1, 3, 2]
+
+
+def test_update_method_prefetches_exports(mock_api_requests, export):
+    prefetcher = mock.Mock()
+    request = mock_api_requests.ShipmentExportsRequest.return_value.request
+    request.return_value = {"exports": [export]}
+    ShipmentExports(prefetcher=prefetcher).update()
+    assert list(prefetcher.prefetch.call_args[0][0]) == [export["id"]]
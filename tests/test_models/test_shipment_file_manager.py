@@ -1,9 +1,12 @@
 import csv
+import time
 from pathlib import Path
 from unittest import mock
 
 import pytest
 
+from ups_manifestor import exceptions, models, multipart, tracing
+from ups_manifestor.fingerprints import FingerprintIndex
 from ups_manifestor.models import ShipmentFileManager
 
 
@@ -52,6 +55,7 @@ def mock_settings(shipment_directory, comodities_file_name, address_file_name):
         mock_settings.SHIPMENT_DIRECTORY = str(shipment_directory)
         mock_settings.COMMODITIES_FILE_NAME = comodities_file_name
         mock_settings.ADDRESS_FILE_NAME = address_file_name
+        mock_settings.BUNDLED_DOWNLOADS = False
         yield mock_settings
 
 
@@ -124,6 +128,18 @@ def test_sets_address_file_path(shipment_directory, address_file_name):
     assert ShipmentFileManager().address_file_path == expected
 
 
+def test_lane_overrides_file_paths(tmp_path, address_file_name):
+    lane = {"SHIPMENT_DIRECTORY": str(tmp_path), "COMMODITIES_FILE_NAME": "lane.csv"}
+    shipment_file_manager = ShipmentFileManager(
+        staging_directory=tmp_path / "staging", lane=lane
+    )
+    assert shipment_file_manager.commodities_file_path == tmp_path / "lane.csv"
+    assert shipment_file_manager.address_file_path == tmp_path / address_file_name
+    assert shipment_file_manager.local_commodities_file_path == (
+        tmp_path / "staging" / "lane.csv"
+    )
+
+
 def test_get_file_status_returns_missing_file_file_does_not_exist(shipment_directory):
     returned_value = ShipmentFileManager().get_file_status(
         Path(shipment_directory / "test.csv"), 0, 0, 0
@@ -134,20 +150,54 @@ def test_get_file_status_returns_missing_file_file_does_not_exist(shipment_direc
 @pytest.mark.parametrize(
     "order_number_column,start_row,end_row,expected",
     [
-        (0, 0, None, "1, 2, 3, Col 1"),
-        (0, 1, -1, "1, 2"),
-        (1, 0, None, "A, C, Col 2, E"),
+        (0, 0, None, "4 orders (1 to Col 1), 4 rows, updated 2 min ago"),
+        (0, 1, -1, "2 orders (1 to 2), 2 rows, updated 2 min ago"),
+        (1, 0, None, "4 orders (A to E), 4 rows, updated 2 min ago"),
+        (0, 1, 2, "1 order (1), 1 row, updated 2 min ago"),
+        (0, 0, 0, "0 orders, 0 rows, updated 2 min ago"),
     ],
 )
 def test_get_file_status(
     order_number_column, start_row, end_row, expected, mock_read_csv
 ):
-    returned_value = ShipmentFileManager().get_file_status(
-        Path(__file__), order_number_column, start_row, end_row
-    )
+    path = Path(__file__)
+    with mock.patch("ups_manifestor.models.time.time") as mock_time:
+        mock_time.return_value = path.stat().st_mtime + 150
+        returned_value = ShipmentFileManager().get_file_status(
+            path, order_number_column, start_row, end_row
+        )
     assert returned_value == expected
 
 
+def test_get_file_status_reads_changed_files(csv_file, rows):
+    shipment_file_manager = ShipmentFileManager()
+    with mock.patch.object(
+        shipment_file_manager, "read_csv", wraps=shipment_file_manager.read_csv
+    ) as read_csv:
+        first = shipment_file_manager.get_file_status(csv_file, 0, 1, None)
+        assert shipment_file_manager.get_file_status(csv_file, 0, 1, None) == first
+        assert read_csv.call_count == 1
+        with open(csv_file, "a") as f:
+            csv.writer(f).writerow(["4", "G", "H"])
+        assert shipment_file_manager.get_file_status(csv_file, 0, 1, None).startswith(
+            "4 orders (1 to 4), 4 rows"
+        )
+        assert read_csv.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "seconds,expected",
+    [
+        (5, "updated just now"),
+        (600, "updated 10 min ago"),
+        (3 * 3600, "updated 3 h ago"),
+        (5 * 86400, "updated 5 days ago"),
+    ],
+)
+def test_format_age(seconds, expected):
+    assert models.format_age(seconds) == expected
+
+
 def test_get_file_status_error_response(mock_read_csv):
     mock_read_csv.side_effect = Exception
     returned_value = ShipmentFileManager().get_file_status(Path(__file__), 0, 0, None)
@@ -176,16 +226,242 @@ def test_get_address_file_status(mock_get_file_status):
     )
 
 
+def test_get_file_orders(csv_file):
+    assert ShipmentFileManager().get_file_orders(csv_file, 1, 1, None) == [
+        "A",
+        "C",
+        "E",
+    ]
+
+
+def test_get_file_orders_missing_file(shipment_directory):
+    path = Path(shipment_directory) / "test.csv"
+    assert ShipmentFileManager().get_file_orders(path, 0, 0, None) == []
+
+
+def test_get_commodities_file_orders(csv_file, comodities_file_name):
+    csv_file.rename(csv_file.with_name(comodities_file_name))
+    assert ShipmentFileManager().get_commodities_file_orders() == ["1", "2"]
+
+
+def test_get_address_file_orders(shipment_directory, address_file_name):
+    path = Path(shipment_directory) / address_file_name
+    with open(path, "w") as f:
+        csv.writer(f).writerows([["Header"] * 18, ["x"] * 17 + ["ORDER-1"]])
+    assert ShipmentFileManager().get_address_file_orders() == ["ORDER-1"]
+
+
 def test_read_csv(csv_file, rows):
     assert ShipmentFileManager().read_csv(csv_file) == rows
 
 
+@pytest.fixture
+def mock_commit_files():
+    with mock.patch(
+        "ups_manifestor.models.ShipmentFileManager.commit_files"
+    ) as mock_commit_files:
+        yield mock_commit_files
+
+
 def test_update_shipping_files(
-    mock_update_comodities_file, mock_update_address_file, export_id
+    mock_update_comodities_file, mock_update_address_file, mock_commit_files, export_id
+):
+    ShipmentFileManager().update_shipping_files(export_id)
+    mock_update_comodities_file.assert_called_once_with(
+        export_id=export_id, target_path=mock.ANY
+    )
+    mock_update_address_file.assert_called_once_with(
+        export_id=export_id, target_path=mock.ANY
+    )
+
+
+@pytest.fixture
+def mock_download(rows):
+    def download(export_id, target_path):
+        with open(target_path, "w") as f:
+            csv.writer(f).writerows(rows)
+
+    with mock.patch(
+        "ups_manifestor.models.ShipmentFileManager.update_comodities_file",
+        side_effect=download,
+    ), mock.patch(
+        "ups_manifestor.models.ShipmentFileManager.update_address_file",
+        side_effect=download,
+    ):
+        yield
+
+
+def test_update_shipping_files_replaces_files(mock_download, export_id, rows):
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.update_shipping_files(export_id)
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.commodities_file_path)
+        == rows
+    )
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.address_file_path) == rows
+    )
+
+
+def test_update_shipping_files_increments_generation(mock_download, export_id):
+    shipment_file_manager = ShipmentFileManager()
+    assert shipment_file_manager.read_generation() == 0
+    assert shipment_file_manager.update_shipping_files(export_id) == 1
+    assert shipment_file_manager.update_shipping_files(export_id) == 2
+    assert ShipmentFileManager().read_generation() == 2
+
+
+def test_update_shipping_files_removes_staged_files(
+    mock_download, export_id, shipment_directory
 ):
     ShipmentFileManager().update_shipping_files(export_id)
-    mock_update_comodities_file.assert_called_once_with(export_id=export_id)
-    mock_update_address_file.asser_called_once_with(export_id=export_id)
+    assert list(Path(shipment_directory).glob("*.tmp")) == []
+
+
+def test_update_shipping_files_keeps_files_if_download_fails(
+    mock_update_comodities_file,
+    mock_update_address_file,
+    export_id,
+    shipment_directory,
+):
+    mock_update_address_file.side_effect = Exception
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.commodities_file_path.write_text("current")
+    with pytest.raises(Exception):
+        shipment_file_manager.update_shipping_files(export_id)
+    assert shipment_file_manager.commodities_file_path.read_text() == "current"
+    assert shipment_file_manager.read_generation() == 0
+    assert list(Path(shipment_directory).glob("*.tmp")) == []
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.Tracer.enable(path)
+    yield path
+    tracing.Tracer.disable()
+
+
+def test_check_pickup_traces_removed_files(mock_download, export_id, trace_path):
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.update_shipping_files(export_id)
+    shipment_file_manager.check_pickup()
+    shipment_file_manager.commodities_file_path.unlink()
+    shipment_file_manager.check_pickup()
+    spans = tracing.read_spans(trace_path)
+    assert [span["name"] for span in spans] == [
+        tracing.COMMIT_FILES,
+        tracing.WORLDSHIP_PICKUP,
+    ]
+    assert spans[1]["attributes"] == {"export_ids": [export_id]}
+    assert spans[1]["status"] == "ok"
+
+
+def test_update_shipping_files_records_fingerprints(mock_download, export_id, tmp_path):
+    index = FingerprintIndex(tmp_path / "fingerprints.jsonl")
+    shipment_file_manager = ShipmentFileManager(fingerprint_index=index)
+    assert shipment_file_manager.get_loaded_export_status() == "No shipping files"
+    shipment_file_manager.update_shipping_files(export_id)
+    assert shipment_file_manager.get_loaded_export_status() == f"Export {export_id}"
+
+
+def test_loaded_export_status_identifies_other_stations(
+    mock_download, export_id, tmp_path
+):
+    ShipmentFileManager(
+        fingerprint_index=FingerprintIndex(tmp_path / "other.jsonl")
+    ).update_shipping_files(export_id)
+    shipment_file_manager = ShipmentFileManager(
+        fingerprint_index=FingerprintIndex(tmp_path / "fingerprints.jsonl")
+    )
+    assert shipment_file_manager.get_loaded_export_status() == f"Export {export_id}"
+
+
+@pytest.fixture
+def mock_bundle(mock_api_requests, mock_settings, test_file_contents):
+    mock_settings.BUNDLED_DOWNLOADS = True
+    request_class = mock_api_requests.DownloadShippingFiles
+    request_class.COMMODITIES_PART = "commodities"
+    request_class.ADDRESS_PART = "address"
+    response = request_class.return_value.request.return_value
+    response.headers = {"Content-Type": "multipart/mixed; boundary=BOUNDARY"}
+    body = multipart.encode(
+        [
+            ("commodities", "text/csv", b"commodities"),
+            ("address", "text/csv", test_file_contents),
+        ],
+        "BOUNDARY",
+    )
+    response.iter_content.return_value = [body[:10], body[10:]]
+    return request_class
+
+
+def test_update_shipping_files_downloads_bundle(
+    mock_bundle, mock_update_comodities_file, mock_update_address_file, export_id
+):
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.update_shipping_files(export_id)
+    mock_bundle.return_value.request.assert_called_once_with(export_id=export_id)
+    mock_update_comodities_file.assert_not_called()
+    mock_update_address_file.assert_not_called()
+    assert shipment_file_manager.commodities_file_path.read_bytes() == b"commodities"
+    assert shipment_file_manager.address_file_path.read_bytes() == b"contents"
+
+
+def test_update_shipping_files_falls_back_without_bundled_endpoint(
+    mock_bundle, mock_download, export_id, rows
+):
+    response = mock.Mock(status_code=404)
+    mock_bundle.return_value.request.side_effect = exceptions.HTTPRequestError(
+        "url", response
+    )
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.update_shipping_files(export_id)
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.address_file_path) == rows
+    )
+    assert shipment_file_manager.bundled_downloads is False
+    shipment_file_manager.update_shipping_files(export_id)
+    mock_bundle.return_value.request.assert_called_once()
+
+
+def test_update_shipping_files_raises_bundle_errors(
+    mock_bundle, mock_download, export_id
+):
+    response = mock.Mock(status_code=500)
+    mock_bundle.return_value.request.side_effect = exceptions.HTTPRequestError(
+        "url", response
+    )
+    shipment_file_manager = ShipmentFileManager()
+    with pytest.raises(exceptions.HTTPRequestError):
+        shipment_file_manager.update_shipping_files(export_id)
+    assert shipment_file_manager.bundled_downloads is True
+    assert shipment_file_manager.read_generation() == 0
+
+
+def test_update_shipping_files_rejects_incomplete_bundle(mock_bundle, export_id):
+    mock_bundle.return_value.request.return_value.iter_content.return_value = [
+        multipart.encode([("commodities", "text/csv", b"")], "BOUNDARY")
+    ]
+    with pytest.raises(multipart.MultipartError):
+        ShipmentFileManager().update_shipping_files(export_id)
+
+
+def test_update_shipping_files_uses_cached_files_over_bundle(
+    mock_bundle, mock_download, export_id, rows
+):
+    cache = mock.Mock()
+    cache.get.return_value = "cached.csv"
+    shipment_file_manager = ShipmentFileManager(cache=cache)
+    shipment_file_manager.update_shipping_files(export_id)
+    mock_bundle.assert_not_called()
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.address_file_path) == rows
+    )
+
+
+def test_get_loaded_export_status_without_index():
+    assert ShipmentFileManager().get_loaded_export_status() == ""
 
 
 def test_update_comodites_file(mock_api_requests, mock_update_file, export_id):
@@ -234,3 +510,216 @@ def test_update_file_writes_file(
     assert path.is_file()
     with open(path, "rb") as f:
         assert f.read() == test_file_contents
+
+
+def test_update_file_uses_cached_file(
+    shipment_directory, export_id, mock_download_file_request_class
+):
+    cached_path = Path(shipment_directory) / "cached.csv"
+    cached_path.write_bytes(b"cached")
+    cache = mock.Mock()
+    cache.get.return_value = cached_path
+    path = Path(shipment_directory) / "test.csv"
+    ShipmentFileManager(cache=cache).update_file(
+        export_id, mock_download_file_request_class, path
+    )
+    cache.get.assert_called_once_with(export_id, mock_download_file_request_class)
+    mock_download_file_request_class.assert_not_called()
+    assert path.read_bytes() == b"cached"
+
+
+def test_update_file_traces_download(
+    shipment_directory,
+    export_id,
+    mock_download_file_request_class,
+    test_file_contents,
+    trace_path,
+):
+    mock_download_file_request_class.PATH = "fba/api/commodities_file"
+    path = Path(shipment_directory) / "test.csv"
+    ShipmentFileManager().update_file(export_id, mock_download_file_request_class, path)
+    (span,) = tracing.read_spans(trace_path)
+    assert span["name"] == tracing.DOWNLOAD_FILE
+    assert span["attributes"] == {
+        "export_id": export_id,
+        "file": "fba/api/commodities_file",
+        "bytes": len(test_file_contents),
+        "bytes_per_second": mock.ANY,
+    }
+
+
+def test_update_file_downloads_uncached_file(
+    shipment_directory, export_id, mock_download_file_request_class, test_file_contents
+):
+    cache = mock.Mock()
+    cache.get.return_value = None
+    path = Path(shipment_directory) / "test.csv"
+    ShipmentFileManager(cache=cache).update_file(
+        export_id, mock_download_file_request_class, path
+    )
+    assert path.read_bytes() == test_file_contents
+
+
+@pytest.fixture
+def staging_directory(tmp_path):
+    return tmp_path / "staging"
+
+
+def wait_for_replication(shipment_file_manager):
+    deadline = time.monotonic() + 5
+    while shipment_file_manager.replicator.pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_update_shipping_files_writes_staged_files_locally(
+    mock_download, export_id, rows, staging_directory
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    with mock.patch.object(shipment_file_manager.replicator, "submit"):
+        assert shipment_file_manager.update_shipping_files(export_id) is None
+    assert (
+        shipment_file_manager.read_csv(
+            staging_directory / shipment_file_manager.commodities_file_path.name
+        )
+        == rows
+    )
+    assert not shipment_file_manager.commodities_file_path.exists()
+
+
+def test_update_shipping_files_replicates_staged_files(
+    mock_download, export_id, rows, staging_directory
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    shipment_file_manager.update_shipping_files(export_id)
+    wait_for_replication(shipment_file_manager)
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.commodities_file_path)
+        == rows
+    )
+    assert (
+        shipment_file_manager.read_csv(shipment_file_manager.address_file_path) == rows
+    )
+    assert shipment_file_manager.read_generation() == 1
+    assert shipment_file_manager.local_generation == 1
+    assert list(staging_directory.glob("*.tmp")) == []
+
+
+def test_check_pickup_traces_replicated_files(
+    mock_download, export_id, staging_directory, trace_path
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    shipment_file_manager.update_shipping_files(export_id)
+    wait_for_replication(shipment_file_manager)
+    shipment_file_manager.address_file_path.unlink()
+    shipment_file_manager.check_pickup()
+    (pickup,) = [
+        span
+        for span in tracing.read_spans(trace_path)
+        if span["name"] == tracing.WORLDSHIP_PICKUP
+    ]
+    assert pickup["attributes"] == {"export_ids": [export_id]}
+
+
+def test_file_status_reads_staged_files(
+    mock_get_file_status, staging_directory, comodities_file_name
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    shipment_file_manager.get_commodities_file_status()
+    assert mock_get_file_status.call_args[0][0] == (
+        staging_directory / comodities_file_name
+    )
+
+
+def test_pull_shipping_files_copies_other_stations_files(
+    staging_directory, comodities_file_name
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    shipment_file_manager.commodities_file_path.write_text("shared")
+    with shipment_file_manager.lock:
+        shipment_file_manager.lock.increment_generation()
+    shipment_file_manager.pull_shipping_files()
+    assert (staging_directory / comodities_file_name).read_text() == "shared"
+    assert shipment_file_manager.local_generation == 1
+
+
+def test_pull_shipping_files_keeps_unreplicated_files(
+    staging_directory, comodities_file_name
+):
+    shipment_file_manager = ShipmentFileManager(staging_directory=staging_directory)
+    (staging_directory / comodities_file_name).write_text("local")
+    shipment_file_manager.commodities_file_path.write_text("shared")
+    shipment_file_manager.replicator.pending_files = {}
+    shipment_file_manager.pull_shipping_files()
+    assert (staging_directory / comodities_file_name).read_text() == "local"
+
+
+def test_get_replication_status():
+    assert ShipmentFileManager().get_replication_status() == ""
+
+
+@pytest.fixture
+def mock_open_file():
+    files = {
+        (1, "DownloadShipmentFile"): b"Order,Item\r\nA,1\r\nEND\r\n",
+        (2, "DownloadShipmentFile"): b"Order,Item\r\nA,2\r\nB,3\r\nEND\r\n",
+        (1, "DownloadAddressFile"): b"Header\r\n" + b"x," * 17 + b"A\r\n",
+        (2, "DownloadAddressFile"): b"Header\r\n" + b"y," * 17 + b"B\r\n",
+    }
+
+    def open_file(export_id, request_class):
+        if request_class is models.api_requests.DownloadShipmentFile:
+            return [files[(export_id, "DownloadShipmentFile")]]
+        return [files[(export_id, "DownloadAddressFile")]]
+
+    with mock.patch(
+        "ups_manifestor.models.ShipmentFileManager.open_file", side_effect=open_file
+    ) as mock_open_file:
+        yield mock_open_file
+
+
+def test_merge_shipping_files(mock_open_file, shipment_directory):
+    shipment_file_manager = ShipmentFileManager()
+    assert shipment_file_manager.merge_shipping_files([1, 2]) == 1
+    assert shipment_file_manager.read_csv(
+        shipment_file_manager.commodities_file_path
+    ) == [["Order", "Item"], ["A", "1"], ["B", "3"], ["END"]]
+    address_rows = shipment_file_manager.read_csv(
+        shipment_file_manager.address_file_path
+    )
+    assert [row[17] for row in address_rows[1:]] == ["A", "B"]
+    assert list(Path(shipment_directory).glob("*.tmp")) == []
+
+
+def test_merge_shipping_files_keeps_files_if_download_fails(
+    mock_open_file, shipment_directory
+):
+    mock_open_file.side_effect = Exception
+    shipment_file_manager = ShipmentFileManager()
+    shipment_file_manager.commodities_file_path.write_text("current")
+    with pytest.raises(Exception):
+        shipment_file_manager.merge_shipping_files([1, 2])
+    assert shipment_file_manager.commodities_file_path.read_text() == "current"
+    assert list(Path(shipment_directory).glob("*.tmp")) == []
+
+
+def test_open_file_uses_cached_file(tmp_path, export_id):
+    cached_path = tmp_path / "cached.csv"
+    cached_path.write_bytes(b"cached")
+    cache = mock.Mock()
+    cache.get.return_value = cached_path
+    shipment_file_manager = ShipmentFileManager(cache=cache)
+    assert b"".join(shipment_file_manager.open_file(export_id, mock.Mock())) == (
+        b"cached"
+    )
+
+
+def test_open_file_downloads_uncached_file(export_id):
+    request_class = mock.Mock()
+    response = request_class.return_value.request.return_value
+    response.iter_content.return_value = [b"a", b"b"]
+    chunks = ShipmentFileManager().open_file(export_id, request_class)
+    request_class.return_value.request.assert_called_once_with(export_id=export_id)
+    assert list(chunks) == [b"a", b"b"]
+    response.iter_content.assert_called_once_with(chunk_size=8192)
+    response.close.assert_called_once_with()
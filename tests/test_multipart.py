@@ -0,0 +1,96 @@
+import pytest
+
+from ups_manifestor import multipart
+
+BOUNDARY = "test-boundary"
+
+
+@pytest.fixture
+def parts():
+    return [
+        ("commodities", "text/csv", b"Order,Qty\r\nA1,2\r\n--test-bound\r\nEND\r\n"),
+        ("address", "text/csv", b""),
+        ("other", "text/plain", b"x" * 20000),
+    ]
+
+
+def chunked(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class Collector:
+    def __init__(self, skip=()):
+        self.files = {}
+        self.skip = skip
+
+    def open_part(self, headers):
+        name = multipart.part_name(headers)
+        if name in self.skip:
+            return None
+        self.files[name] = Writer()
+        return self.files[name]
+
+
+class Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17, 8192, 10**6])
+def test_demultiplex(parts, chunk_size):
+    body = b"preamble\r\n" + multipart.encode(parts, BOUNDARY) + b"epilogue"
+    collector = Collector()
+    names = multipart.demultiplex(
+        chunked(body, chunk_size), BOUNDARY, collector.open_part
+    )
+    assert names == ["commodities", "address", "other"]
+    assert {name: writer.data for name, writer in collector.files.items()} == {
+        name: content for name, _, content in parts
+    }
+
+
+def test_demultiplex_skips_parts(parts):
+    collector = Collector(skip=("other",))
+    multipart.demultiplex(
+        [multipart.encode(parts, BOUNDARY)], BOUNDARY, collector.open_part
+    )
+    assert set(collector.files) == {"commodities", "address"}
+
+
+def test_demultiplex_passes_headers(parts):
+    headers = []
+    multipart.demultiplex(
+        [multipart.encode(parts[:1], BOUNDARY)], BOUNDARY, headers.append
+    )
+    assert headers == [
+        {
+            "content-disposition": 'attachment; name="commodities"',
+            "content-type": "text/csv",
+        }
+    ]
+
+
+def test_demultiplex_truncated_body(parts):
+    body = multipart.encode(parts, BOUNDARY)
+    with pytest.raises(multipart.MultipartError):
+        multipart.demultiplex([body[:-20]], BOUNDARY, Collector().open_part)
+
+
+@pytest.mark.parametrize(
+    "content_type,boundary",
+    [
+        ("multipart/mixed; boundary=abc", "abc"),
+        ('multipart/mixed; boundary="a b"; charset=utf-8', "a b"),
+    ],
+)
+def test_get_boundary(content_type, boundary):
+    assert multipart.get_boundary(content_type) == boundary
+
+
+@pytest.mark.parametrize("content_type", [None, "text/csv"])
+def test_get_boundary_without_boundary(content_type):
+    with pytest.raises(multipart.MultipartError):
+        multipart.get_boundary(content_type)
@@ -0,0 +1,133 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import api_requests, exceptions, prefetch
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return prefetch.ExportFileCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def file_contents():
+    return [b"Col 1,Col 2\n", b"1,A\n"]
+
+
+@pytest.fixture
+def mock_request_classes(file_contents):
+    request_classes = []
+    for path in ("fba/api/download_shipment_file", "fba/api/download_address_file"):
+        request_class = mock.Mock(PATH=path)
+        response = request_class.return_value.request.return_value
+        response.iter_content.return_value = file_contents
+        request_classes.append(request_class)
+    with mock.patch(
+        "ups_manifestor.prefetch.Prefetcher.request_classes", request_classes
+    ):
+        yield request_classes
+
+
+@pytest.fixture
+def prefetcher(cache, mock_request_classes):
+    return prefetch.Prefetcher(cache, count=2, bytes_per_second=10**9)
+
+
+def test_cache_path(cache):
+    path = cache.path(12, api_requests.DownloadShipmentFile)
+    assert path == cache.directory / "12-download_shipment_file.csv"
+
+
+def test_cache_get_missing_file(cache):
+    assert cache.get(12, api_requests.DownloadShipmentFile) is None
+
+
+def test_cache_store(cache, file_contents):
+    path = cache.store(12, api_requests.DownloadShipmentFile, file_contents)
+    assert cache.get(12, api_requests.DownloadShipmentFile) == path
+    assert path.read_bytes() == b"".join(file_contents)
+
+
+def test_cache_store_discards_incomplete_file(cache):
+    def chunks():
+        yield b"partial"
+        raise prefetch.PrefetchCancelled()
+
+    with pytest.raises(prefetch.PrefetchCancelled):
+        cache.store(12, api_requests.DownloadShipmentFile, chunks())
+    assert list(cache.directory.iterdir()) == []
+
+
+def test_cache_prune(cache, file_contents):
+    cache.store(12, api_requests.DownloadShipmentFile, file_contents)
+    cache.store(13, api_requests.DownloadShipmentFile, file_contents)
+    cache.prune([13])
+    assert cache.get(12, api_requests.DownloadShipmentFile) is None
+    assert cache.get(13, api_requests.DownloadShipmentFile) is not None
+
+
+def test_prefetch_downloads_files(prefetcher, mock_request_classes, cache):
+    prefetcher.prefetch([1, 2, 3])
+    prefetcher.thread.join()
+    for request_class in mock_request_classes:
+        assert request_class.return_value.request.call_args_list == [
+            mock.call(export_id=1),
+            mock.call(export_id=2),
+        ]
+        assert cache.get(1, request_class) is not None
+        assert cache.get(3, request_class) is None
+
+
+def test_prefetch_requests_are_bulk_priority(prefetcher, mock_request_classes):
+    prefetcher.prefetch([1])
+    prefetcher.thread.join()
+    for request_class in mock_request_classes:
+        request_class.assert_called_once_with(priority=api_requests.BULK)
+
+
+def test_throttle_wait_is_cancellable(prefetcher):
+    prefetcher.bucket = api_requests.TokenBucket(rate=1)
+    cancel_event = mock.Mock(is_set=mock.Mock(return_value=False))
+    cancel_event.wait.return_value = True
+    response = mock.Mock()
+    response.iter_content.return_value = [b"x" * 100]
+    with pytest.raises(prefetch.PrefetchCancelled):
+        list(prefetcher.throttle(response, cancel_event))
+
+
+def test_prefetch_skips_cached_files(
+    prefetcher, mock_request_classes, cache, file_contents
+):
+    shipment_file_class = mock_request_classes[0]
+    cache.store(1, shipment_file_class, file_contents)
+    prefetcher.run([1], threading.Event())
+    shipment_file_class.return_value.request.assert_not_called()
+
+
+def test_prefetch_skips_failed_requests(prefetcher, mock_request_classes, cache):
+    shipment_file_class = mock_request_classes[0]
+    shipment_file_class.return_value.request.side_effect = exceptions.HTTPRequestError(
+        "url", None
+    )
+    prefetcher.run([1], threading.Event())
+    assert cache.get(1, shipment_file_class) is None
+    assert cache.get(1, mock_request_classes[1]) is not None
+
+
+def test_cancelled_prefetch_downloads_nothing(prefetcher, mock_request_classes):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    prefetcher.run([1], cancel_event)
+    for request_class in mock_request_classes:
+        request_class.return_value.request.assert_not_called()
+
+
+def test_prefetch_cancels_previous_prefetch(prefetcher):
+    with mock.patch("ups_manifestor.prefetch.threading.Thread"):
+        prefetcher.prefetch([1])
+        first_cancel_event = prefetcher.cancel_event
+        prefetcher.prefetch([2])
+    assert first_cancel_event.is_set()
+    assert not prefetcher.cancel_event.is_set()
@@ -0,0 +1,137 @@
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import replication
+from ups_manifestor.locking import DirectoryLock
+
+
+@pytest.fixture
+def shipment_directory(tmp_path):
+    path = tmp_path / "share"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def staging_directory(tmp_path):
+    path = tmp_path / "staging"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def lock(shipment_directory):
+    return DirectoryLock(shipment_directory)
+
+
+@pytest.fixture
+def files(shipment_directory, staging_directory):
+    files = {}
+    for name in ("commodities.csv", "address.csv"):
+        source_path = staging_directory / f"{name}.outbox"
+        source_path.write_text(f"{name} contents")
+        files[shipment_directory / name] = source_path
+    return files
+
+
+@pytest.fixture
+def replicator(lock):
+    replicator = replication.WriteBehindReplicator(lock)
+    replicator.RETRY_INTERVALS = (0.01,)
+    return replicator
+
+
+def wait_for(replicator):
+    deadline = time.monotonic() + 5
+    while replicator.pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_file_hash(staging_directory):
+    path = staging_directory / "file"
+    path.write_bytes(b"abc")
+    assert replication.file_hash(path) == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+def test_replicate_copies_files(replicator, files):
+    replicator.replicate(files)
+    for target_path in files:
+        assert target_path.read_text() == f"{target_path.name} contents"
+
+
+def test_replicate_increments_generation(replicator, files, lock):
+    assert replicator.replicate(files) == 1
+    assert lock.read_generation() == 1
+
+
+def test_replicate_removes_copies(replicator, files, shipment_directory):
+    replicator.replicate(files)
+    assert list(shipment_directory.glob("*.tmp")) == []
+
+
+def test_replicate_rejects_corrupt_copy(replicator, files, shipment_directory):
+    with mock.patch(
+        "ups_manifestor.replication.file_hash", side_effect=["a", "b"]
+    ), pytest.raises(replication.ReplicationError):
+        replicator.replicate(files)
+    assert list(shipment_directory.iterdir()) == []
+
+
+def test_submit_replicates_in_background(replicator, files, lock):
+    on_replicated = mock.Mock()
+    replicator.on_replicated = on_replicated
+    replicator.submit(files)
+    wait_for(replicator)
+    for target_path, source_path in files.items():
+        assert target_path.exists()
+        assert not source_path.exists()
+    on_replicated.assert_called_once_with(1)
+
+
+def test_submit_publishes_fingerprint(replicator, files, lock):
+    replicator.submit(files, fingerprint={"export_ids": [15], "hashes": ["a"]})
+    wait_for(replicator)
+    assert json.loads(lock.fingerprint_path.read_text()) == {
+        "export_ids": [15],
+        "hashes": ["a"],
+        "generation": 1,
+    }
+
+
+def test_submit_retries_failed_replication(replicator, files, lock):
+    replicate = replicator.replicate
+    attempts = []
+
+    def fail_once(files, fingerprint):
+        attempts.append(files)
+        if len(attempts) == 1:
+            raise OSError("offline")
+        return replicate(files, fingerprint)
+
+    replicator.replicate = fail_once
+    replicator.submit(files)
+    wait_for(replicator)
+    assert len(attempts) == 2
+    assert replicator.error is None
+    assert lock.read_generation() == 1
+
+
+def test_submit_replaces_waiting_files(replicator, files, staging_directory):
+    newer_files = {
+        target_path: staging_directory / f"{target_path.name}.newer"
+        for target_path in files
+    }
+    for path in newer_files.values():
+        path.write_text("newer")
+    with replicator.condition:
+        replicator.thread = mock.Mock()
+        replicator.submit(files)
+        replicator.submit(newer_files)
+    assert replicator.pending_files == newer_files
+    assert not any(path.exists() for path in files.values())
@@ -0,0 +1,172 @@
+import datetime as dt
+import random
+import time
+
+import pytest
+
+from ups_manifestor import search
+
+
+@pytest.fixture
+def records():
+    return [
+        {
+            "id": 1,
+            "description": "Amazon FBA UK",
+            "order_numbers": "FBA15K1, FBA15K2",
+            "created_at": "22 Dec 2022",
+            "package_count": 12,
+        },
+        {
+            "id": 2,
+            "description": "Amazon FBA DE",
+            "order_numbers": "FBA16X9",
+            "created_at": "3 Jan 2023",
+            "package_count": 2,
+        },
+        {
+            "id": 3,
+            "description": "Stock transfer",
+            "order_numbers": None,
+            "created_at": "1 Mar 2021",
+            "package_count": 7,
+        },
+    ]
+
+
+@pytest.fixture
+def index(records):
+    return search.RecordIndex(
+        records, text_keys=("description", "order_numbers"), date_keys=("created_at",)
+    )
+
+
+def ids(records):
+    return [record["id"] for record in records]
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("FBA15K1, FBA15K2", ["fba15k1", "fba15k2"]),
+        (None, []),
+        (12, ["12"]),
+        (["A1", "B2"], ["a1", "b2"]),
+    ],
+)
+def test_tokenize(value, expected):
+    assert search.tokenize(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("22 Dec 2022", dt.datetime(2022, 12, 22)),
+        ("2022-12-22T10:30:00Z", dt.datetime(2022, 12, 22, 10, 30)),
+        ("2022-12-22", dt.datetime(2022, 12, 22)),
+        (dt.date(2022, 12, 22), dt.datetime(2022, 12, 22)),
+        ("not a date", None),
+        (None, None),
+    ],
+)
+def test_parse_date(value, expected):
+    assert search.parse_date(value) == expected
+
+
+def test_date_parser_remembers_its_own_format():
+    date_parser = search.DateParser()
+    assert date_parser.parse("22/12/2022") == dt.datetime(2022, 12, 22)
+    assert date_parser.formats[0] == "%d/%m/%Y"
+    assert search.DATE_FORMATS[0] == "%d %b %Y %H:%M"
+
+
+def test_empty_query_returns_all_records(index):
+    assert ids(index.select("")) == [1, 2, 3]
+
+
+def test_search_matches_token_prefix(index):
+    assert ids(index.select("fba15")) == [1]
+
+
+def test_search_matches_all_words(index):
+    assert ids(index.select("amazon de")) == [2]
+
+
+def test_search_is_case_insensitive(index):
+    assert ids(index.select("STOCK")) == [3]
+
+
+def test_search_with_no_matches(index):
+    assert index.select("zzz") == []
+
+
+def test_search_narrows_while_typing(index):
+    assert ids(index.select("a")) == [1, 2]
+    assert ids(index.select("amazon")) == [1, 2]
+    assert ids(index.select("amazon u")) == [1]
+    assert ids(index.select("amazon")) == [1, 2]
+
+
+def test_sort_by_number(index):
+    assert ids(index.select(sort_by="package_count")) == [2, 3, 1]
+
+
+def test_sort_by_date(index):
+    assert ids(index.select(sort_by="created_at")) == [3, 1, 2]
+
+
+def test_sort_reversed(index):
+    assert ids(index.select(sort_by="created_at", reverse=True)) == [2, 1, 3]
+
+
+def test_filtered_and_sorted(index):
+    assert ids(index.select("amazon", sort_by="created_at", reverse=True)) == [2, 1]
+
+
+def test_sort_with_missing_values(records):
+    records[1]["created_at"] = None
+    index = search.RecordIndex(records, ("description",), date_keys=("created_at",))
+    assert ids(index.select(sort_by="created_at")) == [3, 1, 2]
+
+
+def make_records(count):
+    generator = random.Random(0)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun"]
+    return [
+        {
+            "id": number,
+            "description": f"Amazon FBA {generator.choice(['UK', 'DE', 'FR'])}",
+            "order_numbers": ", ".join(
+                f"FBA{generator.randint(10, 99)}K{generator.randint(0, 9)}"
+                for _ in range(3)
+            ),
+            "created_at": (
+                f"{generator.randint(1, 28)} {generator.choice(months)} "
+                f"{generator.randint(2019, 2024)} {generator.randint(0, 23):02d}:00"
+            ),
+            "package_count": generator.randint(1, 50),
+        }
+        for number in range(count)
+    ]
+
+
+@pytest.fixture(scope="module")
+def large_index():
+    return search.RecordIndex(
+        make_records(50_000),
+        text_keys=("description", "order_numbers"),
+        date_keys=("created_at",),
+    )
+
+
+@pytest.mark.parametrize("sort_by", [None, "created_at"])
+def test_filtering_while_typing_is_fast(large_index, sort_by):
+    query = "fba12 amazon uk"
+    timings = {}
+    for _ in range(3):
+        for length in range(1, len(query) + 1):
+            start = time.perf_counter()
+            large_index.select(query[:length], sort_by=sort_by)
+            seconds = time.perf_counter() - start
+            timings[length] = min(timings.get(length, seconds), seconds)
+    assert max(timings.values()) < 0.010
@@ -0,0 +1,241 @@
+import threading
+import time
+from types import MappingProxyType
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import exceptions, service
+
+
+@pytest.fixture(autouse=True)
+def mock_models():
+    with mock.patch("ups_manifestor.service.models") as mock_models:
+        yield mock_models
+
+
+@pytest.fixture(autouse=True)
+def mock_prefetch():
+    with mock.patch("ups_manifestor.service.prefetch") as mock_prefetch:
+        yield mock_prefetch
+
+
+@pytest.fixture
+def sync_service(load_settings):
+    sync_service = service.SyncService(address=("127.0.0.1", 0))
+    thread = threading.Thread(target=sync_service.serve_forever, daemon=True)
+    thread.start()
+    yield sync_service
+    sync_service.close()
+
+
+@pytest.fixture
+def client(sync_service):
+    client = service.ServiceClient(sync_service.address)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def current_shipments(mock_models):
+    current_shipments = mock_models.CurrentShipments.return_value
+    current_shipments.freshness.is_fresh.return_value = False
+    return current_shipments
+
+
+def test_current_shipments(client, current_shipments):
+    current_shipments.shipments = (MappingProxyType({"id": 1}),)
+    assert client.call("current_shipments") == [{"id": 1}]
+    current_shipments.update.assert_called_once_with()
+
+
+def test_fresh_current_shipments_are_served_from_cache(client, current_shipments):
+    current_shipments.freshness.is_fresh.return_value = True
+    current_shipments.shipments = (MappingProxyType({"id": 1}),)
+    assert client.call("current_shipments") == [{"id": 1}]
+    current_shipments.update.assert_not_called()
+
+
+def test_refresh_updates_fresh_current_shipments(client, current_shipments):
+    current_shipments.freshness.is_fresh.side_effect = [False, False]
+    current_shipments.shipments = ()
+    client.call("current_shipments", refresh=True)
+    current_shipments.freshness.invalidate.assert_called_once_with()
+    current_shipments.update.assert_called_once_with()
+
+
+def test_concurrent_clients_share_one_update(sync_service, current_shipments):
+    loaded = threading.Event()
+    current_shipments.shipments = ()
+    current_shipments.freshness.is_fresh.side_effect = lambda: loaded.is_set()
+
+    def update():
+        time.sleep(0.1)
+        loaded.set()
+
+    current_shipments.update.side_effect = update
+    clients = [service.ServiceClient(sync_service.address) for _ in range(3)]
+    threads = [
+        threading.Thread(target=client.call, args=("current_shipments",))
+        for client in clients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.close()
+    current_shipments.update.assert_called_once_with()
+
+
+def test_shipment_exports(client, mock_models):
+    shipment_exports = mock_models.ShipmentExports.return_value
+    shipment_exports.freshness.is_fresh.return_value = False
+    shipment_exports.exports = (MappingProxyType({"id": 2}),)
+    assert client.call("shipment_exports") == [{"id": 2}]
+    shipment_exports.update.assert_called_once_with()
+
+
+def test_close_shipment(client, mock_models, mock_prefetch):
+    current_shipments = mock_models.CurrentShipments.return_value
+    current_shipments.close_shipment.return_value = 15
+    assert client.call("close_shipment", shipment_id=3) == 15
+    current_shipments.close_shipment.assert_called_once_with(3, idempotency_key=None)
+    mock_prefetch.Prefetcher.return_value.cancel.assert_called_once_with()
+    shipment_exports = mock_models.ShipmentExports.return_value
+    shipment_exports.freshness.invalidate.assert_called_once_with()
+
+
+def test_update_shipping_files(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.update_shipping_files.return_value = 3
+    assert client.call("update_shipping_files", export_id=15) == 3
+    file_manager.update_shipping_files.assert_called_once_with(15)
+
+
+def test_merge_shipping_files(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.merge_shipping_files.return_value = 4
+    assert client.call("merge_shipping_files", export_ids=[15, 16]) == 4
+    file_manager.merge_shipping_files.assert_called_once_with([15, 16])
+
+
+def test_file_status(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.get_commodities_file_status.return_value = "1, 2"
+    file_manager.get_address_file_status.return_value = "Missing"
+    assert client.call("commodities_file_status") == "1, 2"
+    assert client.call("address_file_status") == "Missing"
+
+
+def test_file_orders(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.get_commodities_file_orders.return_value = ["1", "2"]
+    file_manager.get_address_file_orders.return_value = []
+    assert client.call("commodities_file_orders") == ["1", "2"]
+    assert client.call("address_file_orders") == []
+
+
+def test_loaded_export_status(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.get_loaded_export_status.return_value = "Export 15"
+    assert client.call("loaded_export_status") == "Export 15"
+
+
+def test_errors_are_raised_in_client(client, current_shipments):
+    current_shipments.update.side_effect = exceptions.HTTPRequestError("url", None)
+    with pytest.raises(exceptions.ServiceError, match="Error making request to url"):
+        client.call("current_shipments")
+
+
+def test_unknown_command(client):
+    with pytest.raises(exceptions.ServiceError, match="Unknown command"):
+        client.call("not_a_command")
+
+
+def test_client_raises_if_service_is_not_running(load_settings):
+    with pytest.raises(exceptions.ServiceError):
+        service.ServiceClient(("127.0.0.1", 1))
+
+
+class TestRemoteModels:
+    @pytest.fixture
+    def client(self):
+        return mock.Mock()
+
+    def test_current_shipments_update(self, client):
+        client.call.return_value = [{"id": 1, "order_number": "AAA1"}]
+        current_shipments = service.RemoteCurrentShipments(client)
+        current_shipments.update()
+        client.call.assert_called_once_with("current_shipments", refresh=True)
+        assert list(current_shipments.shipments) == client.call.return_value
+
+    def test_fresh_current_shipments_update_from_service_cache(self, client):
+        client.call.return_value = []
+        current_shipments = service.RemoteCurrentShipments(client)
+        current_shipments.update()
+        current_shipments.update()
+        assert client.call.call_args_list[-1] == mock.call(
+            "current_shipments", refresh=False
+        )
+
+    def test_current_shipments_close_shipment(self, client):
+        returned_value = service.RemoteCurrentShipments(client).close_shipment(3)
+        client.call.assert_called_once_with(
+            "close_shipment", shipment_id=3, idempotency_key=None
+        )
+        assert returned_value == client.call.return_value
+
+    def test_shipment_exports_update(self, client):
+        client.call.return_value = [{"id": 2}]
+        shipment_exports = service.RemoteShipmentExports(client)
+        shipment_exports.update()
+        client.call.assert_called_once_with("shipment_exports", refresh=True)
+        assert list(shipment_exports.exports) == client.call.return_value
+
+    def test_file_manager_update_shipping_files(self, client):
+        service.RemoteShipmentFileManager(client).update_shipping_files(15)
+        client.call.assert_called_once_with("update_shipping_files", export_id=15)
+
+    def test_file_manager_file_status(self, client):
+        file_manager = service.RemoteShipmentFileManager(client)
+        assert file_manager.get_commodities_file_status() == client.call.return_value
+        client.call.assert_called_once_with("commodities_file_status")
+
+    def test_file_manager_file_orders(self, client):
+        file_manager = service.RemoteShipmentFileManager(client)
+        assert file_manager.get_address_file_orders() == client.call.return_value
+        client.call.assert_called_once_with("address_file_orders")
+
+
+@pytest.mark.parametrize(
+    "method,command",
+    [
+        ("get_commodities_file_status", "commodities_file_status"),
+        ("get_address_file_status", "address_file_status"),
+        ("get_commodities_file_orders", "commodities_file_orders"),
+        ("get_address_file_orders", "address_file_orders"),
+        ("get_loaded_export_status", "loaded_export_status"),
+        ("get_replication_status", "replication_status"),
+        ("pull_shipping_files", "pull_shipping_files"),
+        ("check_pickup", "check_pickup"),
+    ],
+)
+def test_remote_file_manager_calls_service(method, command):
+    client = mock.Mock()
+    file_manager = service.RemoteShipmentFileManager(client)
+    assert getattr(file_manager, method)() == client.call.return_value
+    client.call.assert_called_once_with(command)
+
+
+def test_file_generation(client, mock_models):
+    file_manager = mock_models.ShipmentFileManager.return_value
+    file_manager.read_generation.return_value = 4
+    assert client.call("file_generation") == 4
+
+
+def test_remote_file_manager_read_generation():
+    client = mock.Mock()
+    file_manager = service.RemoteShipmentFileManager(client)
+    assert file_manager.read_generation() == client.call.return_value
+    client.call.assert_called_once_with("file_generation")
@@ -0,0 +1,54 @@
+from unittest import mock
+
+import pytest
+
+from ups_manifestor.settings import DEFAULT_LANE, Settings
+
+
+@pytest.fixture
+def top_level_settings():
+    with mock.patch.multiple(
+        Settings,
+        SHIPMENT_DIRECTORY="shipments",
+        COMMODITIES_FILE_NAME="commodities.csv",
+        ADDRESS_FILE_NAME="address.csv",
+        STAGING_DIRECTORY="staging",
+    ):
+        yield
+
+
+def test_load_settings_without_lanes(load_settings):
+    assert list(Settings.LANES) == [DEFAULT_LANE]
+    assert Settings.LANES[DEFAULT_LANE]["SHIPMENT_DIRECTORY"] == (
+        Settings.SHIPMENT_DIRECTORY
+    )
+    assert Settings.LANES[DEFAULT_LANE]["STAGING_DIRECTORY"] is None
+
+
+def test_single_lane_uses_top_level_settings(top_level_settings):
+    assert Settings.load_lanes(None) == {
+        DEFAULT_LANE: {
+            "SHIPMENT_DIRECTORY": "shipments",
+            "COMMODITIES_FILE_NAME": "commodities.csv",
+            "ADDRESS_FILE_NAME": "address.csv",
+            "STAGING_DIRECTORY": "staging",
+        }
+    }
+
+
+def test_lanes_override_top_level_settings(top_level_settings):
+    lanes = Settings.load_lanes(
+        {
+            "Parcel": {},
+            "Freight": {
+                "SHIPMENT_DIRECTORY": "freight",
+                "STAGING_DIRECTORY": "",
+            },
+        }
+    )
+    assert list(lanes) == ["Parcel", "Freight"]
+    assert lanes["Parcel"]["SHIPMENT_DIRECTORY"] == "shipments"
+    assert lanes["Parcel"]["STAGING_DIRECTORY"].replace("\\", "/") == ("staging/Parcel")
+    assert lanes["Freight"]["SHIPMENT_DIRECTORY"] == "freight"
+    assert lanes["Freight"]["ADDRESS_FILE_NAME"] == "address.csv"
+    assert lanes["Freight"]["STAGING_DIRECTORY"] is None
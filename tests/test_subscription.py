@@ -0,0 +1,118 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from ups_manifestor import exceptions, subscription
+from ups_manifestor.fake_server import FakeServer
+from ups_manifestor.settings import Settings
+
+
+@pytest.fixture
+def server():
+    with FakeServer(token="TOKEN", hold_seconds=1, heartbeat_seconds=0.05) as server:
+        with mock.patch.multiple(
+            Settings, PROTOCOL="http", DOMAIN=server.domain, TOKEN="TOKEN"
+        ):
+            yield server
+
+
+class Changes:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.kinds = []
+
+    def __call__(self, kind):
+        with self.condition:
+            self.kinds.append(kind)
+            self.condition.notify_all()
+
+    def wait_for(self, count):
+        with self.condition:
+            assert self.condition.wait_for(lambda: len(self.kinds) >= count, 5)
+        return self.kinds[:count]
+
+
+@pytest.fixture
+def changes():
+    return Changes()
+
+
+@pytest.fixture
+def subscriber(changes):
+    subscriber = subscription.ChangeSubscriber(on_change=changes)
+    subscriber.RECONNECT_INTERVALS = (0.01,)
+    yield subscriber
+    subscriber.stop()
+
+
+def test_parse_events():
+    lines = [
+        b": comment",
+        b"id: 1",
+        b"event: shipments",
+        b"data: {}",
+        b"",
+        b"",
+        b"data: first",
+        b"data:second",
+        b"",
+    ]
+    events = list(subscription.parse_events(lines))
+    assert [(event.id, event.event, event.data) for event in events] == [
+        ("1", "shipments", "{}"),
+        ("1", "message", "first\nsecond"),
+    ]
+
+
+def test_parse_events_ignores_incomplete_event():
+    assert list(subscription.parse_events(["event: shipments"])) == []
+
+
+def test_subscriber_notifies_both_on_connection(server, subscriber, changes):
+    subscriber.start()
+    assert changes.wait_for(2) == [subscription.SHIPMENTS, subscription.EXPORTS]
+
+
+def test_subscriber_notifies_changes(server, subscriber, changes):
+    subscriber.start()
+    changes.wait_for(2)
+    server.state.add_shipment({"id": 1})
+    assert changes.wait_for(3)[2] == subscription.SHIPMENTS
+    assert subscriber.last_event_id == "1"
+    assert subscriber.connected
+
+
+def test_subscriber_resumes_after_long_poll_ends(server, subscriber, changes):
+    server.hold_seconds = 0.1
+    subscriber.start()
+    changes.wait_for(2)
+    time.sleep(0.3)
+    server.state.add_shipment({"id": 2})
+    assert changes.wait_for(3)[2] == subscription.SHIPMENTS
+    assert len(changes.kinds) == 3
+    assert server.state.request_counts["fba/api/shipment_changes"] > 1
+
+
+def test_subscriber_resyncs_after_failure(subscriber, changes):
+    response = mock.MagicMock()
+    response.iter_lines.return_value = []
+    with mock.patch(
+        "ups_manifestor.api_requests.ShipmentChangesRequest.request",
+        side_effect=[exceptions.HTTPRequestError("url", None), response],
+    ), mock.patch.object(subscriber.stop_event, "wait"):
+        subscriber.stop_event.is_set = mock.Mock(side_effect=[False, False, True])
+        subscriber.run()
+    assert changes.kinds == [subscription.SHIPMENTS, subscription.EXPORTS]
+
+
+def test_subscriber_stops_when_unsupported(subscriber):
+    response = mock.Mock(status_code=404)
+    with mock.patch(
+        "ups_manifestor.api_requests.ShipmentChangesRequest.request",
+        side_effect=exceptions.HTTPRequestError("url", response),
+    ):
+        subscriber.run()
+    assert subscriber.supported is False
+    assert subscriber.connected is False
@@ -0,0 +1,113 @@
+from unittest import mock
+
+import pytest
+
+from ups_manifestor.table_binding import TableBinding, row_hash
+
+
+class FakeTable:
+    def __init__(self):
+        self.Widget = mock.Mock()
+        self.Widget.insert.side_effect = lambda parent, index, iid, **kwargs: str(iid)
+        self.SelectedRows = []
+        self.tree_ids = []
+        self.Values = [[]]
+        self.update = mock.Mock(side_effect=self._update)
+
+    def _update(self, values=None, select_rows=None):
+        if values is not None:
+            self.Values = values
+            self.tree_ids = [str(i + 1) for i in range(len(values))]
+            self.SelectedRows = []
+
+
+@pytest.fixture
+def table():
+    return FakeTable()
+
+
+@pytest.fixture
+def binding(table):
+    binding = TableBinding(table)
+    binding.update(ids=[1, 2, 3], rows=[["a"], ["b"], ["c"]])
+    table.update.reset_mock()
+    return binding
+
+
+def test_row_hash():
+    assert row_hash(["a", 1]) == row_hash(["a", 1])
+    assert row_hash(["a", 1]) != row_hash(["a", 2])
+
+
+def test_row_hash_of_unhashable_values():
+    assert row_hash([["a"]]) == row_hash([["a"]])
+
+
+def test_first_update_replaces_values(table):
+    TableBinding(table).update(ids=[1], rows=[["a"]])
+    table.update.assert_called_once_with(values=[["a"]])
+
+
+def test_identical_update_is_skipped(binding, table):
+    binding.update(ids=[1, 2, 3], rows=[["a"], ["b"], ["c"]])
+    table.update.assert_not_called()
+    table.Widget.item.assert_not_called()
+    table.Widget.insert.assert_not_called()
+    table.Widget.delete.assert_not_called()
+
+
+def test_changed_rows_are_repainted(binding, table):
+    binding.update(ids=[1, 2, 3], rows=[["a"], ["B"], ["c"]])
+    table.Widget.item.assert_called_once_with(2, values=["B"])
+    assert table.Values == [["a"], ["B"], ["c"]]
+
+
+def test_added_rows_are_inserted(binding, table):
+    binding.update(ids=[1, 2, 3, 4], rows=[["a"], ["b"], ["c"], ["d"]])
+    table.Widget.insert.assert_called_once_with("", "end", iid=4, values=["d"], tag=3)
+    table.Widget.item.assert_not_called()
+    assert table.tree_ids == ["1", "2", "3", "4"]
+
+
+def test_removed_rows_are_deleted(binding, table):
+    binding.update(ids=[1], rows=[["a"]])
+    assert table.Widget.delete.call_args_list == [mock.call(3), mock.call(2)]
+    assert table.tree_ids == ["1"]
+
+
+def test_diff(binding):
+    changed, added, removed = binding.diff(
+        [row_hash(["a"]), row_hash(["x"]), row_hash(["c"]), row_hash(["d"])]
+    )
+    assert changed == [1]
+    assert list(added) == [3]
+    assert list(removed) == []
+
+
+def test_selection_follows_record_id(binding, table):
+    table.SelectedRows = [0]
+    selection = binding.update(ids=[4, 1, 2], rows=[["d"], ["a"], ["b"]])
+    assert selection == [1]
+    table.update.assert_called_once_with(select_rows=[1])
+    assert table.SelectedRows == [1]
+
+
+def test_selection_is_kept_in_place(binding, table):
+    table.SelectedRows = [1]
+    assert binding.update(ids=[1, 2, 3], rows=[["a"], ["B"], ["c"]]) == [1]
+    table.update.assert_not_called()
+
+
+def test_selection_of_removed_record_is_cleared(binding, table):
+    table.SelectedRows = [2]
+    assert binding.update(ids=[1, 2], rows=[["a"], ["b"]]) == []
+    table.update.assert_called_once_with(select_rows=[])
+
+
+def test_record_id(binding):
+    assert binding.record_id(1) == 2
+
+
+def test_update_records_version(binding):
+    binding.update(ids=[1], rows=[["a"]], version=4)
+    assert binding.version == 4
@@ -0,0 +1,128 @@
+import datetime as dt
+
+import pytest
+
+from ups_manifestor import tracing
+from ups_manifestor.tracing import PickupWatcher, Tracer
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    Tracer.enable(path)
+    yield path
+    Tracer.disable()
+
+
+def span(name, start, duration=0.0, status="ok", **attributes):
+    return {
+        "name": name,
+        "start": start,
+        "duration": duration,
+        "status": status,
+        "attributes": attributes,
+    }
+
+
+def test_span_is_recorded(trace_path):
+    with Tracer.span(tracing.DOWNLOAD_FILE, export_id=5) as attributes:
+        attributes["cached"] = True
+    (recorded,) = tracing.read_spans(trace_path)
+    assert recorded["name"] == tracing.DOWNLOAD_FILE
+    assert recorded["status"] == "ok"
+    assert recorded["duration"] >= 0
+    assert recorded["attributes"] == {"export_id": 5, "cached": True}
+
+
+def test_span_records_errors(trace_path):
+    with pytest.raises(ValueError):
+        with Tracer.span(tracing.CLOSE_SHIPMENT):
+            raise ValueError()
+    (recorded,) = tracing.read_spans(trace_path)
+    assert recorded["status"] == "ValueError"
+
+
+def test_nothing_is_recorded_when_disabled(tmp_path):
+    with Tracer.span(tracing.COMMIT_FILES):
+        pass
+    Tracer.event(tracing.EXPORT_REQUESTED)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def watched_file(tmp_path):
+    path = tmp_path / "commodities.csv"
+    path.write_text("contents")
+    return path
+
+
+def test_pickup_watcher_records_removed_files(trace_path, watched_file):
+    watcher = PickupWatcher([watched_file])
+    watcher.start([5], generation=3, committed_at=100.0)
+    watcher.check(3)
+    watched_file.unlink()
+    watcher.check(3)
+    watcher.check(3)
+    (recorded,) = tracing.read_spans(trace_path)
+    assert recorded["name"] == tracing.WORLDSHIP_PICKUP
+    assert recorded["status"] == "ok"
+    assert recorded["start"] == 100.0
+    assert recorded["attributes"] == {"export_ids": [5]}
+
+
+def test_pickup_watcher_records_superseded_files(trace_path, watched_file):
+    watcher = PickupWatcher([watched_file])
+    watcher.start([5], generation=3, committed_at=100.0)
+    watched_file.write_text("another station's contents")
+    watcher.check(4)
+    (recorded,) = tracing.read_spans(trace_path)
+    assert recorded["status"] == "superseded"
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert tracing.percentile(values, 0.5) == 50
+    assert tracing.percentile(values, 0.95) == 95
+    assert tracing.percentile([7], 0.95) == 7
+
+
+def test_time_to_manifest_of_closed_shipment():
+    spans = [
+        span(tracing.EXPORT_REQUESTED, 100.0, key="abc", shipment_id=1),
+        span(tracing.CLOSE_SHIPMENT, 101.0, 1.0, key="abc", export_id=5),
+        span(tracing.WORLDSHIP_PICKUP, 103.0, 20.0, export_ids=[5]),
+    ]
+    assert tracing.time_to_manifest(spans) == [(100.0, 23.0)]
+
+
+def test_time_to_manifest_uses_latest_request():
+    spans = [
+        span(tracing.EXPORT_REQUESTED, 100.0, export_ids=[5]),
+        span(tracing.EXPORT_REQUESTED, 110.0, export_ids=[5, 6]),
+        span(tracing.WORLDSHIP_PICKUP, 112.0, 8.0, export_ids=[5, 6]),
+        span(tracing.EXPORT_REQUESTED, 130.0, export_ids=[5]),
+    ]
+    assert tracing.time_to_manifest(spans) == [(110.0, 10.0)]
+
+
+def test_time_to_manifest_ignores_superseded_files():
+    spans = [
+        span(tracing.EXPORT_REQUESTED, 100.0, export_ids=[5]),
+        span(tracing.WORLDSHIP_PICKUP, 101.0, 8.0, "superseded", export_ids=[5]),
+    ]
+    assert tracing.time_to_manifest(spans) == []
+
+
+def test_summarise(trace_path):
+    start = dt.datetime(2024, 3, 1, 12).timestamp()
+    for duration in (1.0, 2.0, 3.0):
+        Tracer.record(tracing.DOWNLOAD_FILE, start, duration, "ok", {})
+    Tracer.record(tracing.EXPORT_REQUESTED, start, 0.0, "ok", {"export_ids": [5]})
+    Tracer.record(tracing.WORLDSHIP_PICKUP, start + 1, 9.0, "ok", {"export_ids": [5]})
+    lines = tracing.summarise(trace_path).splitlines()
+    assert lines[0].split() == ["day", "span", "count", "p50", "(s)", "p95", "(s)"]
+    rows = {line[12:32].strip(): line[32:].split() for line in lines[1:]}
+    assert all(line.startswith("2024-03-01") for line in lines[1:])
+    assert rows[tracing.DOWNLOAD_FILE] == ["3", "2.00", "3.00"]
+    assert rows[tracing.TIME_TO_MANIFEST] == ["1", "10.00", "10.00"]
+    assert tracing.EXPORT_REQUESTED not in rows
@@ -0,0 +1,187 @@
+"""Column-oriented analytics over the history of shipment exports."""
+
+import collections
+import datetime as dt
+import io
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .search import parse_date
+
+CREATED_AT = "created_at"
+PACKAGE_COUNT = "package_count"
+SHIPMENT_COUNT = "shipment_count"
+WEIGHT = "weight"
+VALUE = "value"
+DESTINATIONS = "destinations"
+
+NUMERIC_COLUMNS = {
+    PACKAGE_COUNT: "q",
+    SHIPMENT_COUNT: "q",
+    WEIGHT: "d",
+    VALUE: "d",
+}
+
+
+def to_number(value):
+    """Return value as a float, or 0 if it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def split_destinations(value):
+    """Return the destinations of an export."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+class ExportHistory:
+    """Export records held as columns of typed arrays, ordered by creation date.
+
+    Each numeric column has a running total, so the total over any range of
+    days is the difference of two entries and daily figures and rolling
+    windows take a bisection per day rather than a pass over the exports.
+    Destinations are dictionary encoded, with the codes of export i in
+    destination_codes[destination_offsets[i]:destination_offsets[i + 1]].
+    """
+
+    def __init__(self, records):
+        """Load the columns of records. Records without a creation date are skipped."""
+        dated = []
+        for record in records:
+            created_at = parse_date(record.get(CREATED_AT))
+            if created_at is not None:
+                dated.append((created_at, record))
+        dated.sort(key=lambda item: item[0])
+        self.created_at = array(
+            "d", (created_at.timestamp() for created_at, _ in dated)
+        )
+        self.days = array("l", (created_at.toordinal() for created_at, _ in dated))
+        self.columns = {}
+        for key, typecode in NUMERIC_COLUMNS.items():
+            convert = int if typecode == "q" else float
+            self.columns[key] = array(
+                typecode, (convert(to_number(record.get(key))) for _, record in dated)
+            )
+        self.totals = {
+            key: array(column.typecode, itertools.accumulate(column, initial=0))
+            for key, column in self.columns.items()
+        }
+        self.destination_names = []
+        codes = {}
+        self.destination_offsets = array("l", [0])
+        self.destination_codes = array("l")
+        for _, record in dated:
+            for destination in split_destinations(record.get(DESTINATIONS)):
+                if destination not in codes:
+                    codes[destination] = len(self.destination_names)
+                    self.destination_names.append(destination)
+                self.destination_codes.append(codes[destination])
+            self.destination_offsets.append(len(self.destination_codes))
+
+    def __len__(self):
+        """Return the number of exports."""
+        return len(self.days)
+
+    def first_day(self):
+        """Return the date of the first export, or None if there are none."""
+        return dt.date.fromordinal(self.days[0]) if self.days else None
+
+    def last_day(self):
+        """Return the date of the last export, or None if there are none."""
+        return dt.date.fromordinal(self.days[-1]) if self.days else None
+
+    def positions(self, start, end):
+        """Return the range of positions of exports created from start to end.
+
+        start and end are dates, both included.
+        """
+        return range(
+            bisect_left(self.days, start.toordinal()),
+            bisect_right(self.days, end.toordinal()),
+        )
+
+    def total(self, key, start, end):
+        """Return the total of the column key over exports from start to end."""
+        positions = self.positions(start, end)
+        totals = self.totals[key]
+        return totals[positions.stop] - totals[positions.start]
+
+    def count(self, start, end):
+        """Return the number of exports created from start to end."""
+        return len(self.positions(start, end))
+
+    def daily(self, key, start, end):
+        """Return [(date, total)] of the column key for each day from start to end."""
+        return self.rolling(key, 1, start, end)
+
+    def rolling(self, key, window, start, end):
+        """Return [(date, total)] of the column key over the window days to each date.
+
+        One entry is returned for each day from start to end, including days
+        without exports.
+        """
+        totals = self.totals[key]
+        results = []
+        for ordinal in range(start.toordinal(), end.toordinal() + 1):
+            stop = bisect_right(self.days, ordinal)
+            first = bisect_left(self.days, ordinal - window + 1, hi=stop)
+            results.append((dt.date.fromordinal(ordinal), totals[stop] - totals[first]))
+        return results
+
+    def destinations(self, start, end):
+        """Return [(destination, export count)] from start to end, most common first."""
+        positions = self.positions(start, end)
+        first = self.destination_offsets[positions.start]
+        stop = self.destination_offsets[positions.stop]
+        codes = self.destination_codes[first:stop]
+        return [
+            (self.destination_names[code], count)
+            for code, count in collections.Counter(codes).most_common()
+        ]
+
+
+def report(history, days=28, window=7, destination_count=10, end=None):
+    """Return a text report of the last days of history.
+
+    Lists daily exports, shipments, packages, weight and value with a rolling
+    total of packages over window days, then the most common destinations.
+    """
+    if not len(history):
+        return "No exports found."
+    end = end or history.last_day()
+    start = end - dt.timedelta(days=days - 1)
+    stream = io.StringIO()
+    stream.write(
+        f"{'day':<12}{'exports':>9}{'shipments':>11}{'packages':>10}"
+        f"{'weight':>10}{'value':>12}{f'{window}d packages':>15}\n"
+    )
+    rows = zip(
+        history.daily(SHIPMENT_COUNT, start, end),
+        history.daily(PACKAGE_COUNT, start, end),
+        history.daily(WEIGHT, start, end),
+        history.daily(VALUE, start, end),
+        history.rolling(PACKAGE_COUNT, window, start, end),
+    )
+    for (day, shipments), (_, packages), (_, weight), (_, value), (_, rolling) in rows:
+        stream.write(
+            f"{day.isoformat():<12}{history.count(day, day):>9}{shipments:>11}"
+            f"{packages:>10}{weight:>10.1f}{value:>12.2f}{rolling:>15}\n"
+        )
+    stream.write(
+        f"{'total':<12}{history.count(start, end):>9}"
+        f"{history.total(SHIPMENT_COUNT, start, end):>11}"
+        f"{history.total(PACKAGE_COUNT, start, end):>10}"
+        f"{history.total(WEIGHT, start, end):>10.1f}"
+        f"{history.total(VALUE, start, end):>12.2f}\n"
+    )
+    stream.write(f"\nTop destinations {start.isoformat()} to {end.isoformat()}:\n")
+    for destination, count in history.destinations(start, end)[:destination_count]:
+        stream.write(f"{count:>7}  {destination}\n")
+    return stream.getvalue()
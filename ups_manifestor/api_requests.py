@@ -1,13 +1,244 @@
 """HTTP requesters for the UPS Manifestor application."""
 
+import threading
+import time
+from contextlib import contextmanager
+
 import requests
 
 from . import exceptions
+from .cassettes import Cassette
 from .settings import Settings
 
+INTERACTIVE = "interactive"
+REFRESH = "refresh"
+BULK = "bulk"
+
+
+class TokenBucket:
+    """Limit the rate at which a resource, such as bandwidth, is used."""
+
+    def __init__(self, rate, capacity=None):
+        """Allow rate units per second, bursting up to capacity units."""
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """Add the tokens accumulated since the last refill."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def take(self, amount):
+        """Take amount tokens without waiting, borrowing from future refills."""
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+    def consume(self, amount, cancel_event=None):
+        """Wait until amount tokens are available and take them.
+
+        Returns False if cancel_event is set while waiting.
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+        return True
+
+
+class RequestScheduler:
+    """Admit HTTP requests by priority class.
+
+    Interactive requests, which the user is waiting for, have their own
+    concurrency limit and never queue behind background requests. Refresh
+    and bulk requests share background_limit slots, with waiting refreshes
+    admitted before bulk requests, and each class has its own limit too.
+    A token bucket limits the rate of all requests. Interactive requests
+    take their tokens without waiting, so they delay background requests
+    rather than being delayed by them.
+    """
+
+    LIMITS = {INTERACTIVE: 4, REFRESH: 2, BULK: 1}
+    BACKGROUND_LIMIT = 2
+
+    def __init__(self, limits=None, background_limit=None, rate=None, burst=None):
+        """Create a scheduler, allowing rate requests per second if given."""
+        self.limits = dict(self.LIMITS, **(limits or {}))
+        self.background_limit = background_limit or self.BACKGROUND_LIMIT
+        self.condition = threading.Condition()
+        self.active = {priority: 0 for priority in self.limits}
+        self.waiting = {priority: 0 for priority in self.limits}
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """Limit requests to rate per second, or remove the limit if rate is None."""
+        self.bucket = None if rate is None else TokenBucket(rate, burst)
+
+    def set_limit(self, priority, limit):
+        """Allow limit concurrent requests of priority.
+
+        The limit shared by background requests is raised to match if needed.
+        """
+        with self.condition:
+            self.limits[priority] = limit
+            if priority != INTERACTIVE:
+                self.background_limit = max(self.background_limit, limit)
+            self.condition.notify_all()
+
+    def can_start(self, priority):
+        """Return True if a request of priority may start now."""
+        if self.active[priority] >= self.limits[priority]:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        if self.active[REFRESH] + self.active[BULK] >= self.background_limit:
+            return False
+        if priority == BULK and self.waiting[REFRESH]:
+            return self.active[REFRESH] >= self.limits[REFRESH]
+        return True
+
+    def acquire(self, priority):
+        """Wait for a rate token and a slot for a request of priority."""
+        if self.bucket is not None:
+            if priority == INTERACTIVE:
+                self.bucket.take(1)
+            else:
+                self.bucket.consume(1)
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                self.condition.wait_for(lambda: self.can_start(priority))
+            finally:
+                self.waiting[priority] -= 1
+            self.active[priority] += 1
+
+    def release(self, priority):
+        """Free the slot of a finished request of priority."""
+        with self.condition:
+            self.active[priority] -= 1
+            self.condition.notify_all()
+
+    def hold(self, priority):
+        """Wait for and return a Slot for a request of priority.
+
+        Unlike slot, the slot is held until it is released.
+        """
+        if priority is not None:
+            self.acquire(priority)
+        return Slot(self, priority)
+
+    @contextmanager
+    def slot(self, priority):
+        """Hold a slot for a request of priority, None is not scheduled."""
+        if priority is None:
+            yield
+            return
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+
+class Slot:
+    """A slot held by a request until it is released."""
+
+    def __init__(self, scheduler, priority):
+        """Hold a slot of scheduler for a request of priority, None if unscheduled."""
+        self.scheduler = scheduler
+        self.priority = priority
+        self.lock = threading.Lock()
+        self.released = priority is None
+
+    def release(self):
+        """Free the slot, if it has not been freed already."""
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.scheduler.release(self.priority)
+
+
+class ScheduledResponse:
+    """A streamed response holding its request's slot until it is read or closed.
+
+    Attributes of the response are available on the wrapper, so it can be
+    used in place of the response.
+    """
+
+    def __init__(self, response, slot):
+        """Wrap response, releasing slot once it is consumed or closed."""
+        self.response = response
+        self.slot = slot
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        # A response dropped without being closed must not keep its slot.
+        self.slot.release()
+
+    def iter_content(self, *args, **kwargs):
+        """Yield the response body, releasing the slot once it is all read."""
+        yield from self.response.iter_content(*args, **kwargs)
+        self.slot.release()
+
+    def close(self):
+        """Close the response and release its slot."""
+        try:
+            self.response.close()
+        finally:
+            self.slot.release()
+
+
+def make_session(pool_size):
+    """Return a session keeping up to pool_size connections open per host."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+scheduler = RequestScheduler()
+# Connections are reused by every request. The pool holds enough connections
+# for the scheduler's limits and the change notification stream.
+session = make_session(pool_size=16)
+
 
 class BaseRequest:
-    """Base class for HTTP requests."""
+    """Base class for HTTP requests.
+
+    Requests are admitted by the scheduler according to their priority
+    class, PRIORITY unless another is given. Streamed responses hold their
+    slot until they are read or closed.
+    """
+
+    STREAM = False
+    PRIORITY = REFRESH
+
+    def __init__(self, priority=None):
+        """Make the request in the priority class, PRIORITY if not given."""
+        self.priority = priority or self.PRIORITY
 
     def make_url(self, path):
         """Return the request URL."""
@@ -22,13 +253,27 @@ class BaseRequest:
         url = self.make_url(self.PATH)
         data = self.request_data(*args, **kwargs)
         response = None
+        slot = scheduler.hold(self.priority)
         try:
-            response = requests.post(url, data)
+            response = self.post(url, data)
             response.raise_for_status()
         except Exception:
+            slot.release()
+            if response is not None:
+                response.close()
             raise exceptions.HTTPRequestError(url, response)
-        else:
+        if not self.STREAM:
+            slot.release()
             return response
+        return ScheduledResponse(response, slot)
+
+    def post(self, url, data):
+        """Send the request, through the active cassette if there is one."""
+        if Cassette.active is not None:
+            return Cassette.active.post(
+                url, data, send=lambda: session.post(url, data, stream=self.STREAM)
+            )
+        return session.post(url, data, stream=self.STREAM)
 
     def process_response(self, response, *args, **kwargs):
         """Return the response JSON."""
@@ -55,6 +300,9 @@ class ShipmentExportsRequest(BaseRequest):
 class BaseFileDownloadRequest(BaseRequest):
     """Base class for file download requests."""
 
+    STREAM = True
+    PRIORITY = INTERACTIVE
+
     def request_data(self, *args, **kwargs):
         """Return the request data."""
         data = super().request_data(*args, **kwargs)
@@ -78,13 +326,58 @@ class DownloadAddressFile(BaseFileDownloadRequest):
     PATH = "fba/api/download_address_file"
 
 
+class DownloadShippingFiles(BaseFileDownloadRequest):
+    """Request for both files of an export in one multipart response.
+
+    The parts are named COMMODITIES_PART and ADDRESS_PART. Servers without
+    the endpoint reply 404.
+    """
+
+    PATH = "fba/api/download_shipping_files"
+    COMMODITIES_PART = "commodities"
+    ADDRESS_PART = "address"
+
+
 class CloseShipment(BaseRequest):
     """Request to close open shipments."""
 
     PATH = "fba/api/close_shipment"
+    PRIORITY = INTERACTIVE
 
     def request_data(self, *args, **kwargs):
         """Return the request data."""
         data = super().request_data(*args, **kwargs)
         data["shipment_id"] = kwargs["shipment_id"]
+        if kwargs.get("idempotency_key") is not None:
+            data["idempotency_key"] = kwargs["idempotency_key"]
+        return data
+
+
+class ShipmentChangesRequest(BaseRequest):
+    """Request for a stream of shipment and export change notifications.
+
+    The server replies with Server-Sent Events. It may hold the response
+    open indefinitely or close it after a while (long-polling), in which case
+    the request is repeated with the ID of the last event received.
+    """
+
+    PATH = "fba/api/shipment_changes"
+    STREAM = True
+    # The response is held open, so it is not counted against any limit.
+    PRIORITY = None
+    TIMEOUT = (10, 60)
+
+    def request_data(self, *args, **kwargs):
+        """Return the request data."""
+        data = super().request_data(*args, **kwargs)
+        if kwargs.get("last_event_id") is not None:
+            data["last_event_id"] = kwargs["last_event_id"]
         return data
+
+    def post(self, url, data):
+        """Send the request with a read timeout, as the response is held open."""
+        return session.post(url, data, stream=self.STREAM, timeout=self.TIMEOUT)
+
+    def process_response(self, response, *args, **kwargs):
+        """Return the response object."""
+        return response
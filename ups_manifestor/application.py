@@ -1,47 +1,174 @@
 """The main application."""
 
+import threading
+import time
+
 import PySimpleGUI as sg
 
-from . import exceptions, models
-from .settings import Settings
+from . import (
+    events,
+    exceptions,
+    fingerprints,
+    journal,
+    models,
+    prefetch,
+    service,
+    subscription,
+    table_binding,
+    tracing,
+)
+from .diagnostics import Profiler, profiled
+from .settings import DEFAULT_LANE, Settings
+from .tracing import Tracer
 
 
 class Application:
     """The UPS Manifestor application."""
 
     TITLE = "UPS Manifestor"
+    EVENT_TIMEOUT = 100
+    FILE_CHECK_INTERVAL = 5
+    POLL_INTERVAL = 10
+    DISPATCH_REPORT_FILE_NAME = "dispatch.txt"
 
     CREATE_SHIPMENT_EXPORT = "Create Shipment Export"
     REPROCESSS_SHIPMENT = "Reprocess Shipment"
+    MERGE_EXPORTS = "Merge Exports"
     CURRENT_SHIPMENT_CANCEL = "current_shipment_cancel"
+    CURRENT_SHIPMENT_REFRESH = "current_shipment_refresh"
     CURRENT_SHIPMENT_TABLE = "current_shipment_table"
+    CURRENT_SHIPMENT_FILTER = "current_shipment_filter"
     SHIPMENT_EXPORT_TABLE = "shipment_export_table"
+    SHIPMENT_EXPORT_FILTER = "shipment_export_filter"
     SHIPMENT_EXPORT_CANCEL = "shipment_export_cancel"
+    SHIPMENT_EXPORT_REFRESH = "shipment_export_refresh"
     COMMODOTIES_FILE_STATUS = "comodities_file_status"
     ADDRESS_FILE_STATUS = "address_file_status"
-
-    def __init__(self):
-        """Initialise the application."""
-        self.initialise_models()
+    COMMODITIES_FILE_ORDERS = "comodities_file_orders"
+    ADDRESS_FILE_ORDERS = "address_file_orders"
+    CLOSE_JOURNAL_STATUS = "close_journal_status"
+    CLEAR_FAILED_CLOSES = "clear_failed_closes"
+    REPLICATION_STATUS = "replication_status"
+    LOADED_EXPORT_STATUS = "loaded_export_status"
+    STATUS = "status"
+    LANE = "lane"
+
+    def __init__(self, client=None):
+        """Initialise the application, using the sync service if client is given."""
+        if client is None:
+            self.initialise_models()
+        else:
+            self.initialise_remote_models(client)
+        self.initialise_close_journal()
         self.next_page = MainMenu
         self.current_page = MainMenu
+        self.jobs = events.JobQueue(
+            on_error=lambda error: self.show_status(f"Error: {error}")
+        )
+        self.dispatch_stats = events.DispatchStats()
+        self.change_subscriber = subscription.ChangeSubscriber(
+            on_change=lambda kind: self.jobs.post(self.records_changed, kind)
+        )
+        self.handlers = {
+            page: {**self.status_handlers(), **page.handlers()}
+            for page in (MainMenu, CurrentShipments, ShipmentExports)
+        }
         sg.theme(Settings.THEME)
         self.window = sg.Window(
             self.TITLE,
             layout=self.layout(),
             size=(Settings.WINDOW_WIDTH, Settings.WINDOW_HEIGHT),
         )
+        self.table_bindings = {
+            key: table_binding.TableBinding(self.window[key])
+            for key in (self.CURRENT_SHIPMENT_TABLE, self.SHIPMENT_EXPORT_TABLE)
+        }
+        self.file_check = None
+        self.journal_replayer.start()
+        self.change_subscriber.start()
+        self.jobs.schedule(self.FILE_CHECK_INTERVAL, self.check_shipping_files)
+        self.jobs.schedule(self.POLL_INTERVAL, self.poll_records)
         self.mainloop()
+        self.change_subscriber.stop()
         self.window.close()
+        if Profiler.enabled:
+            Profiler.write_report(
+                self.DISPATCH_REPORT_FILE_NAME, self.dispatch_stats.summary()
+            )
 
+    @profiled("initialise models")
     def initialise_models(self):
         """Load models."""
+        cache = prefetch.ExportFileCache(Settings.CACHE_DIRECTORY)
+        self.prefetcher = prefetch.Prefetcher(
+            cache,
+            count=Settings.PREFETCH_COUNT,
+            bytes_per_second=Settings.PREFETCH_BYTES_PER_SECOND,
+        )
         self.current_shipments = models.CurrentShipments()
-        self.shipment_exports = models.ShipmentExports()
-        self.shipment_file_manager = models.ShipmentFileManager()
+        self.shipment_exports = models.ShipmentExports(prefetcher=self.prefetcher)
+        fingerprint_index = fingerprints.FingerprintIndex(
+            Settings.FINGERPRINT_INDEX_PATH
+        )
+        self.lanes = {
+            name: Lane(
+                name,
+                models.ShipmentFileManager(
+                    cache=cache,
+                    staging_directory=lane["STAGING_DIRECTORY"],
+                    fingerprint_index=fingerprint_index,
+                    lane=lane,
+                ),
+            )
+            for name, lane in Settings.LANES.items()
+        }
+        self.lane = next(iter(self.lanes.values()))
         self.current_shipments.update()
         self.shipment_exports.update()
 
+    @profiled("initialise models")
+    def initialise_remote_models(self, client):
+        """Load models from the sync service."""
+        self.prefetcher = None
+        self.current_shipments = service.RemoteCurrentShipments(client)
+        self.shipment_exports = service.RemoteShipmentExports(client)
+        self.lane = Lane(DEFAULT_LANE, service.RemoteShipmentFileManager(client))
+        self.lanes = {self.lane.name: self.lane}
+        self.current_shipments.update()
+        self.shipment_exports.update()
+
+    def initialise_close_journal(self):
+        """Load the journal of shipments waiting to be closed."""
+        self.close_journal = journal.CloseJournal(Settings.CLOSE_JOURNAL_PATH)
+        self.close_journal_error = None
+        self.journal_replayer = journal.JournalReplayer(
+            self.close_journal,
+            close=self.current_shipments.close_shipment,
+            download=self.download_closed_export,
+            on_replayed=lambda error: self.jobs.post(
+                self.close_journal_replayed, error
+            ),
+        )
+
+    @property
+    def shipment_file_manager(self):
+        """Return the shipping files of the selected lane."""
+        return self.lane.shipment_file_manager
+
+    def download_closed_export(self, export_id, lane=None):
+        """Download the files of a closed shipment for the lane it was closed in.
+
+        Raises UnknownLaneError if lane is no longer in the settings.
+        """
+        if lane is None:
+            shipment_file_manager = self.shipment_file_manager
+        elif lane in self.lanes:
+            shipment_file_manager = self.lanes[lane].shipment_file_manager
+        else:
+            raise exceptions.UnknownLaneError(lane)
+        return shipment_file_manager.update_shipping_files(export_id)
+
+    @profiled("change page")
     def change_page(self):
         """Swap columns to change the page layout."""
         self.window[f"column-{self.current_page.name}"].update(visible=False)
@@ -51,13 +178,31 @@ class Application:
         self.current_page = self.next_page
 
     def mainloop(self):
-        """Process the main application loop."""
+        """Process window events, background results and scheduled jobs."""
         while True:
+            event, values = self.window.read(timeout=self.EVENT_TIMEOUT)
             try:
-                self.current_page.mainloop(self)
+                if event == sg.WIN_CLOSED:
+                    raise exceptions.CloseProgramRequest()
+                if event != sg.TIMEOUT_EVENT:
+                    self.dispatch(event, values)
+                self.jobs.run_pending()
             except exceptions.CloseProgramRequest:
                 return
-            self.change_page()
+            if self.next_page is not self.current_page:
+                self.change_page()
+
+    def dispatch(self, event, values):
+        """Pass an event to the current page's handler for it."""
+        start = time.perf_counter()
+        key = event[:2] if isinstance(event, tuple) else event
+        handler = self.handlers[self.current_page].get(key)
+        if handler is None:
+            return
+        handler_start = time.perf_counter()
+        handler(self, event, values)
+        handler_time = time.perf_counter() - handler_start
+        self.dispatch_stats.record(handler_start - start, handler_time)
 
     def update(self):
         """Run between page changes."""
@@ -66,6 +211,17 @@ class Application:
     def layout(self):
         """Return the application layout."""
         return [
+            [
+                sg.Text("Lane:", visible=len(self.lanes) > 1),
+                sg.Combo(
+                    list(self.lanes),
+                    default_value=self.lane.name,
+                    key=self.LANE,
+                    enable_events=True,
+                    readonly=True,
+                    visible=len(self.lanes) > 1,
+                ),
+            ],
             [
                 sg.Column(
                     MainMenu.layout(), visible=True, key=f"column-{MainMenu.name}"
@@ -81,58 +237,385 @@ class Application:
                     key=f"column-{ShipmentExports.name}",
                 ),
             ],
+            [
+                sg.Text("Loaded Export:"),
+                sg.Text(
+                    self.shipment_file_manager.get_loaded_export_status(),
+                    key=self.LOADED_EXPORT_STATUS,
+                    size=(80, 1),
+                ),
+            ],
             [
                 sg.Text("Comodities File:"),
                 sg.Text(
                     self.shipment_file_manager.get_commodities_file_status(),
                     key=self.COMMODOTIES_FILE_STATUS,
+                    size=(60, 1),
                 ),
+                sg.Button("Orders", key=self.COMMODITIES_FILE_ORDERS),
             ],
             [
                 sg.Text("Address File:"),
                 sg.Text(
                     self.shipment_file_manager.get_address_file_status(),
                     key=self.ADDRESS_FILE_STATUS,
+                    size=(60, 1),
+                ),
+                sg.Button("Orders", key=self.ADDRESS_FILE_ORDERS),
+            ],
+            [
+                sg.Text(
+                    self.get_close_journal_status(),
+                    key=self.CLOSE_JOURNAL_STATUS,
+                    size=(80, 1),
+                ),
+                sg.Button("Clear Rejected", key=self.CLEAR_FAILED_CLOSES),
+            ],
+            [
+                sg.Text(
+                    self.shipment_file_manager.get_replication_status(),
+                    key=self.REPLICATION_STATUS,
+                    size=(80, 1),
                 ),
             ],
+            [sg.Text("", key=self.STATUS, size=(80, 1))],
         ]
 
+    def show_status(self, message):
+        """Show message in the status bar, replacing the last one."""
+        self.window[self.STATUS].update(value=message)
+
+    @classmethod
+    def status_handlers(cls):
+        """Return handlers for the status bar, shown on every page."""
+        return {
+            cls.COMMODITIES_FILE_ORDERS: cls.show_file_orders,
+            cls.ADDRESS_FILE_ORDERS: cls.show_file_orders,
+            cls.LANE: cls.lane_changed,
+            cls.CLEAR_FAILED_CLOSES: cls.clear_failed_closes,
+        }
+
+    def lane_changed(self, event, values):
+        """Switch to the lane chosen in the lane selector."""
+        self.select_lane(values[event])
+
+    @profiled("change lane")
+    def select_lane(self, name):
+        """Switch to the shipping files and table filters of the lane name.
+
+        Shipments and exports are shared by every lane, so they are shown
+        again with the lane's filters without being reloaded.
+        """
+        if name == self.lane.name:
+            return
+        filters = (
+            (self.CURRENT_SHIPMENT_FILTER, self.current_shipments),
+            (self.SHIPMENT_EXPORT_FILTER, self.shipment_exports),
+        )
+        for key, model in filters:
+            self.lane.filters[key] = model.filter_text
+        self.lane = self.lanes[name]
+        for key, model in filters:
+            model.set_filter(self.lane.filters[key])
+            self.window[key].update(value=self.lane.filters[key])
+        if self.current_page is CurrentShipments:
+            self.show_current_shipments()
+        elif self.current_page is ShipmentExports:
+            self.show_shipment_exports()
+        self.update_shipment_file_status()
+
+    def show_file_orders(self, event, values):
+        """Show every order in a shipping file.
+
+        The status bar only summarises the files, the full list is read when
+        it is asked for.
+        """
+        if event == self.COMMODITIES_FILE_ORDERS:
+            title = "Comodities File Orders"
+            orders = self.shipment_file_manager.get_commodities_file_orders()
+        else:
+            title = "Address File Orders"
+            orders = self.shipment_file_manager.get_address_file_orders()
+        sg.popup_scrolled("\n".join(orders) or "No orders", title=title, size=(40, 20))
+
+    def check_shipping_files(self):
+        """Check the shipping files in the background on every poll.
+
+        Files may have been replaced by another station, edited by hand or
+        only have aged. The shipment directory may be slow or unavailable, so
+        it is only read off the GUI thread, and a check still running when
+        the next is due is left to finish.
+        """
+        if self.file_check is None or not self.file_check.is_alive():
+            self.file_check = threading.Thread(
+                target=self.read_shipping_files, name="file-check", daemon=True
+            )
+            self.file_check.start()
+        self.jobs.schedule(self.FILE_CHECK_INTERVAL, self.check_shipping_files)
+
+    def read_shipping_files(self):
+        """Pull the shipping files of every lane and post their status."""
+        shipment_file_manager = self.shipment_file_manager
+        try:
+            for lane in list(self.lanes.values()):
+                lane.shipment_file_manager.pull_shipping_files()
+                lane.shipment_file_manager.check_pickup()
+            status = self.read_shipment_file_status(shipment_file_manager)
+        except Exception as e:
+            self.jobs.post(self.show_status, f"Could not check shipping files: {e}")
+        else:
+            self.jobs.post(
+                self.show_shipment_file_status, shipment_file_manager, status
+            )
+
+    def read_shipment_file_status(self, shipment_file_manager):
+        """Return the status of shipping files, keyed by status bar element.
+
+        File summaries are cached by stat, so unchanged files are not re-read.
+        """
+        return {
+            self.COMMODOTIES_FILE_STATUS: (
+                shipment_file_manager.get_commodities_file_status()
+            ),
+            self.ADDRESS_FILE_STATUS: shipment_file_manager.get_address_file_status(),
+            self.LOADED_EXPORT_STATUS: (
+                shipment_file_manager.get_loaded_export_status()
+            ),
+            self.REPLICATION_STATUS: shipment_file_manager.get_replication_status(),
+        }
+
+    def show_shipment_file_status(self, shipment_file_manager, status):
+        """Show the status of shipping files, unless another lane is selected."""
+        if shipment_file_manager is not self.shipment_file_manager:
+            return
+        for key, value in status.items():
+            self.window[key].update(value=value)
+
     def update_shipment_file_status(self):
         """Update the display of the current shipment files."""
-        commodities_status_text = (
-            self.shipment_file_manager.get_commodities_file_status()
+        try:
+            status = self.read_shipment_file_status(self.shipment_file_manager)
+        except (OSError, exceptions.LockTimeout) as e:
+            self.show_status(f"Could not check shipping files: {e}")
+            return
+        self.show_shipment_file_status(self.shipment_file_manager, status)
+
+    def get_close_journal_status(self):
+        """Return a description of closes waiting to be sent."""
+        messages = []
+        pending_count = len(self.close_journal.pending())
+        if pending_count:
+            messages.append(f"{pending_count} shipment closes waiting to be sent.")
+        if self.close_journal.undownloaded():
+            messages.append("Waiting to download shipping files.")
+            for error in self.close_journal.download_errors()[-1:]:
+                messages.append(f"Last download failed: {error}")
+        failed_count = len(self.close_journal.failed())
+        if failed_count:
+            messages.append(f"{failed_count} shipment closes were rejected.")
+        if self.close_journal_error is not None:
+            messages.append(f"Error sending closes: {self.close_journal_error}")
+        return " ".join(messages)
+
+    def update_close_journal_status(self):
+        """Update the display of closes waiting to be sent."""
+        self.window[self.CLOSE_JOURNAL_STATUS].update(
+            value=self.get_close_journal_status()
         )
-        self.window[self.COMMODOTIES_FILE_STATUS].update(value=commodities_status_text)
-        address_status_text = self.shipment_file_manager.get_address_file_status()
-        self.window[self.ADDRESS_FILE_STATUS].update(value=address_status_text)
+
+    def close_journal_replayed(self, error):
+        """Show the result of replaying the close journal.
+
+        Errors are shown in the status bar rather than raised, as the
+        journal is replayed again later.
+        """
+        self.close_journal_error = error
+        self.invalidate_records()
+        self.update_close_journal_status()
+        self.update_shipment_file_status()
+
+    def clear_failed_closes(self, event, values):
+        """Forget the shipment closes rejected by the server."""
+        self.close_journal.clear_failed()
+        self.update_close_journal_status()
+
+    def invalidate_records(self):
+        """Mark shipments and exports as changed by a close."""
+        self.current_shipments.freshness.invalidate()
+        self.shipment_exports.freshness.invalidate()
+
+    def records_changed(self, kind):
+        """Mark shipments or exports as changed, updating them if displayed."""
+        if kind == subscription.SHIPMENTS:
+            self.current_shipments.freshness.invalidate()
+        else:
+            self.shipment_exports.freshness.invalidate()
+        if self.current_page is CurrentShipments:
+            self.refresh_current_shipments()
+        elif self.current_page is ShipmentExports:
+            self.refresh_shipment_exports()
+
+    def poll_records(self):
+        """Refresh the displayed records while change notifications are down.
+
+        Records are only updated once they are older than the model's TTL.
+        The server is often unreachable while notifications are down, so a
+        failed refresh is shown in the status bar and tried again next poll.
+        """
+        try:
+            if not self.change_subscriber.connected:
+                if self.current_page is CurrentShipments:
+                    self.refresh_current_shipments()
+                elif self.current_page is ShipmentExports:
+                    self.refresh_shipment_exports()
+        except (exceptions.HTTPRequestError, exceptions.ServiceError) as e:
+            self.show_status(f"Could not refresh records: {e}")
+        finally:
+            self.jobs.schedule(self.POLL_INTERVAL, self.poll_records)
+
+    def needs_update(self, model):
+        """Return True if the records of model may be out of date.
+
+        While change notifications are received records are only out of date
+        once invalidated, otherwise they also expire after the model's TTL.
+        """
+        if self.change_subscriber.connected:
+            return model.freshness.invalidated
+        return not model.freshness.is_fresh()
+
+    def refresh_current_shipments(self):
+        """Update the current shipments if they may have changed."""
+        if self.needs_update(self.current_shipments):
+            self.update_current_shipments()
 
     def update_current_shipments(self):
         """Update the current shipments page."""
         self.current_shipments.update()
-        shipment_table_data = self.current_shipments.get_display_rows()
-        self.window[self.CURRENT_SHIPMENT_TABLE].update(values=shipment_table_data)
-        if len(shipment_table_data) == 0:
-            self.window[self.CREATE_SHIPMENT_EXPORT].update(disabled=True)
+        self.show_current_shipments()
+
+    def show_current_shipments(self):
+        """Display the filtered and sorted current shipments."""
+        snapshot = self.current_shipments.snapshot
+        shipments = self.current_shipments.get_display_records(snapshot)
+        selection = self.table_bindings[self.CURRENT_SHIPMENT_TABLE].update(
+            ids=[shipment[self.current_shipments.ID] for shipment in shipments],
+            rows=self.current_shipments.get_display_rows(shipments),
+            version=snapshot.version,
+        )
+        self.window[self.CREATE_SHIPMENT_EXPORT].update(disabled=len(selection) != 1)
+
+    @profiled("filter current shipments")
+    def filter_current_shipments(self, filter_text):
+        """Show only current shipments matching filter_text."""
+        self.current_shipments.set_filter(filter_text)
+        self.show_current_shipments()
+
+    @profiled("sort current shipments")
+    def sort_current_shipments(self, column):
+        """Sort the current shipments table by a column."""
+        self.current_shipments.toggle_sort(self.current_shipments.shipment_keys[column])
+        self.show_current_shipments()
+
+    def refresh_shipment_exports(self):
+        """Update the shipment exports if they may have changed."""
+        if self.needs_update(self.shipment_exports):
+            self.update_shipment_exports()
 
     def update_shipment_exports(self):
         """Update the shipment exports page."""
         self.shipment_exports.update()
-        shipment_table_data = self.shipment_exports.get_display_rows()
-        self.window[self.SHIPMENT_EXPORT_TABLE].update(values=shipment_table_data)
-
+        self.show_shipment_exports()
+
+    def show_shipment_exports(self):
+        """Display the filtered and sorted shipment exports."""
+        snapshot = self.shipment_exports.snapshot
+        exports = self.shipment_exports.get_display_records(snapshot)
+        selection = self.table_bindings[self.SHIPMENT_EXPORT_TABLE].update(
+            ids=[export[self.shipment_exports.ID] for export in exports],
+            rows=self.shipment_exports.get_display_rows(exports),
+            version=snapshot.version,
+        )
+        self.window[self.REPROCESSS_SHIPMENT].update(disabled=len(selection) != 1)
+        self.window[self.MERGE_EXPORTS].update(disabled=len(selection) < 2)
+
+    @profiled("filter shipment exports")
+    def filter_shipment_exports(self, filter_text):
+        """Show only shipment exports matching filter_text."""
+        self.shipment_exports.set_filter(filter_text)
+        self.show_shipment_exports()
+
+    @profiled("sort shipment exports")
+    def sort_shipment_exports(self, column):
+        """Sort the shipment exports table by a column."""
+        self.shipment_exports.toggle_sort(self.shipment_exports.export_keys[column])
+        self.show_shipment_exports()
+
+    def cancel_prefetch(self):
+        """Stop prefetching to free bandwidth for a download the user is waiting on."""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+
+    @profiled("reprocess shipment")
     def update_shipping_files(self, export_index):
-        """Replace the shipping files with one selected on the shipment exports page."""
-        export = self.shipment_exports.exports[export_index]
-        export_id = export[self.shipment_exports.ID]
+        """Replace the shipping files with one selected on the shipment exports page.
+
+        The export is identified by the ID of the row on display, not its
+        position in the current snapshot, which may have been refreshed since.
+        """
+        export_id = self.table_bindings[self.SHIPMENT_EXPORT_TABLE].record_id(
+            export_index
+        )
+        self.cancel_prefetch()
+        Tracer.event(tracing.EXPORT_REQUESTED, export_ids=[export_id])
         self.shipment_file_manager.update_shipping_files(export_id=export_id)
 
+    @profiled("merge exports")
+    def merge_shipping_files(self, export_indexes):
+        """Replace the shipping files with the merged files of selected exports."""
+        binding = self.table_bindings[self.SHIPMENT_EXPORT_TABLE]
+        export_ids = [binding.record_id(index) for index in export_indexes]
+        self.cancel_prefetch()
+        Tracer.event(tracing.EXPORT_REQUESTED, export_ids=export_ids)
+        self.shipment_file_manager.merge_shipping_files(export_ids=export_ids)
+
+    @profiled("create shipment export")
     def close_shipment(self, shipment_index):
-        """Close open shipments and update the shipping files."""
-        shipment = self.current_shipments.shipments[shipment_index]
-        export_id = self.current_shipments.close_shipment(
-            shipment[self.current_shipments.ID]
+        """Queue a shipment to be closed and its shipping files downloaded.
+
+        The shipment is identified by the ID of the row on display.
+        """
+        shipment_id = self.table_bindings[self.CURRENT_SHIPMENT_TABLE].record_id(
+            shipment_index
         )
-        self.shipment_file_manager.update_shipping_files(export_id)
+        self.cancel_prefetch()
+        key = self.close_journal.submit(shipment_id, lane=self.lane.name)
+        Tracer.event(tracing.EXPORT_REQUESTED, key=key, shipment_id=shipment_id)
+        self.invalidate_records()
+        self.update_close_journal_status()
+        self.journal_replayer.wake()
+
+
+class Lane:
+    """The shipping files of a shipment lane and the filters used with it."""
+
+    def __init__(self, name, shipment_file_manager):
+        """Create the lane name using shipment_file_manager."""
+        self.name = name
+        self.shipment_file_manager = shipment_file_manager
+        self.filters = {
+            Application.CURRENT_SHIPMENT_FILTER: "",
+            Application.SHIPMENT_EXPORT_FILTER: "",
+        }
+
+
+def is_heading_click(event, table_key):
+    """Return True if event is a click on a heading of the table table_key."""
+    return (
+        isinstance(event, tuple)
+        and event[:2] == (table_key, sg.TABLE_CLICKED_INDICATOR)
+        and event[2][0] == -1
+        and event[2][1] is not None
+    )
 
 
 class ApplicationPage:
@@ -143,6 +626,11 @@ class ApplicationPage:
         """Run before page is diplayed."""
         pass
 
+    @classmethod
+    def handlers(cls):
+        """Return the page's event handlers, keyed by event."""
+        return {}
+
 
 class MainMenu(ApplicationPage):
     """Application main menu page."""
@@ -157,60 +645,93 @@ class MainMenu(ApplicationPage):
             [sg.Button(ShipmentExports.name)],
         ]
 
+    @classmethod
+    def handlers(cls):
+        """Return the page's event handlers, keyed by event."""
+        return {
+            CurrentShipments.name: cls.open_current_shipments,
+            ShipmentExports.name: cls.open_shipment_exports,
+        }
+
     @staticmethod
-    def mainloop(application):
-        """Process the main menu."""
-        while True:
-            event, _ = application.window.read()
-            if event == CurrentShipments.name:
-                application.next_page = CurrentShipments
-                break
-            if event == ShipmentExports.name:
-                application.next_page = ShipmentExports
-                break
-            if event == sg.WIN_CLOSED:
-                raise exceptions.CloseProgramRequest()
+    def open_current_shipments(application, event, values):
+        """Go to the current shipments page."""
+        application.next_page = CurrentShipments
+
+    @staticmethod
+    def open_shipment_exports(application, event, values):
+        """Go to the shipment exports page."""
+        application.next_page = ShipmentExports
 
 
-class CurrentShipments:
+class CurrentShipments(ApplicationPage):
     """The current shipments page."""
 
     name = "Current Shipments"
 
+    @classmethod
+    def handlers(cls):
+        """Return the page's event handlers, keyed by event."""
+        return {
+            Application.CURRENT_SHIPMENT_FILTER: cls.filter_changed,
+            (
+                Application.CURRENT_SHIPMENT_TABLE,
+                sg.TABLE_CLICKED_INDICATOR,
+            ): cls.table_clicked,
+            Application.CURRENT_SHIPMENT_TABLE: cls.selection_changed,
+            Application.CREATE_SHIPMENT_EXPORT: cls.create_shipment_export,
+            Application.CURRENT_SHIPMENT_REFRESH: cls.refresh,
+            Application.CURRENT_SHIPMENT_CANCEL: cls.cancel,
+        }
+
     @staticmethod
-    def mainloop(application):
-        """Process the current shipments page."""
-        while True:
-            event, values = application.window.read()
-            print(values)
-            if event == application.CURRENT_SHIPMENT_TABLE:
-                if len(values[application.CURRENT_SHIPMENT_TABLE]) == 1:
-                    application.window[application.CREATE_SHIPMENT_EXPORT].update(
-                        disabled=False
-                    )
-                else:
-                    application.window[application.CREATE_SHIPMENT_EXPORT].update(
-                        disabled=True
-                    )
-            if event == application.CREATE_SHIPMENT_EXPORT:
-                shipment_index = values[application.CURRENT_SHIPMENT_TABLE][0]
-                application.close_shipment(shipment_index=shipment_index)
-                application.next_page = MainMenu
-                break
-            if event == application.CURRENT_SHIPMENT_CANCEL:
-                application.next_page = MainMenu
-                break
-            if event == sg.WIN_CLOSED:
-                raise exceptions.CloseProgramRequest()
+    def filter_changed(application, event, values):
+        """Filter the table."""
+        application.filter_current_shipments(values[event])
+
+    @staticmethod
+    def table_clicked(application, event, values):
+        """Sort the table when a heading is clicked."""
+        if is_heading_click(event, application.CURRENT_SHIPMENT_TABLE):
+            application.sort_current_shipments(column=event[2][1])
+
+    @staticmethod
+    def selection_changed(application, event, values):
+        """Allow an export to be created when a single shipment is selected."""
+        application.window[application.CREATE_SHIPMENT_EXPORT].update(
+            disabled=len(values[event]) != 1
+        )
+
+    @staticmethod
+    def create_shipment_export(application, event, values):
+        """Close the selected shipment."""
+        shipment_index = values[application.CURRENT_SHIPMENT_TABLE][0]
+        application.close_shipment(shipment_index=shipment_index)
+        application.next_page = MainMenu
+
+    @staticmethod
+    def refresh(application, event, values):
+        """Reload the current shipments from the server."""
+        application.update_current_shipments()
+
+    @staticmethod
+    def cancel(application, event, values):
+        """Return to the main menu."""
+        application.next_page = MainMenu
 
     @classmethod
     def layout(cls):
         """Return the page layout."""
         return [
             [sg.Text(CurrentShipments.name)],
+            [
+                sg.Text("Filter:"),
+                sg.Input(key=Application.CURRENT_SHIPMENT_FILTER, enable_events=True),
+            ],
             [cls.create_table()],
             [
                 sg.Button(Application.CREATE_SHIPMENT_EXPORT, disabled=True),
+                sg.Button("Refresh", key=Application.CURRENT_SHIPMENT_REFRESH),
                 sg.Button("Cancel", key=Application.CURRENT_SHIPMENT_CANCEL),
             ],
         ]
@@ -235,53 +756,96 @@ class CurrentShipments:
             num_rows=22,
             key=Application.CURRENT_SHIPMENT_TABLE,
             enable_events=True,
+            enable_click_events=True,
             justification="left",
         )
 
     @staticmethod
     def update(application):
         """Update the current shipment list."""
-        application.update_current_shipments()
+        application.refresh_current_shipments()
 
 
-class ShipmentExports:
+class ShipmentExports(ApplicationPage):
     """The Shipment Exports page."""
 
     name = "Shipment Exports"
 
+    @classmethod
+    def handlers(cls):
+        """Return the page's event handlers, keyed by event."""
+        return {
+            Application.SHIPMENT_EXPORT_FILTER: cls.filter_changed,
+            (
+                Application.SHIPMENT_EXPORT_TABLE,
+                sg.TABLE_CLICKED_INDICATOR,
+            ): cls.table_clicked,
+            Application.SHIPMENT_EXPORT_TABLE: cls.selection_changed,
+            Application.REPROCESSS_SHIPMENT: cls.reprocess_shipment,
+            Application.MERGE_EXPORTS: cls.merge_exports,
+            Application.SHIPMENT_EXPORT_REFRESH: cls.refresh,
+            Application.SHIPMENT_EXPORT_CANCEL: cls.cancel,
+        }
+
     @staticmethod
-    def mainloop(application):
-        """Process the shipment exports page."""
-        while True:
-            event, values = application.window.read()
-            if event == application.SHIPMENT_EXPORT_TABLE:
-                if len(values[application.SHIPMENT_EXPORT_TABLE]) == 1:
-                    application.window[application.REPROCESSS_SHIPMENT].update(
-                        disabled=False
-                    )
-                else:
-                    application.window[application.REPROCESSS_SHIPMENT].update(
-                        disabled=True
-                    )
-            if event == application.SHIPMENT_EXPORT_CANCEL:
-                application.next_page = MainMenu
-                break
-            if event == application.REPROCESSS_SHIPMENT:
-                export_index = values[application.SHIPMENT_EXPORT_TABLE][0]
-                application.update_shipping_files(export_index=export_index)
-                application.next_page = MainMenu
-                break
-            if event == sg.WIN_CLOSED:
-                raise exceptions.CloseProgramRequest()
+    def filter_changed(application, event, values):
+        """Filter the table."""
+        application.filter_shipment_exports(values[event])
+
+    @staticmethod
+    def table_clicked(application, event, values):
+        """Sort the table when a heading is clicked."""
+        if is_heading_click(event, application.SHIPMENT_EXPORT_TABLE):
+            application.sort_shipment_exports(column=event[2][1])
+
+    @staticmethod
+    def selection_changed(application, event, values):
+        """Allow reprocessing one export or merging several."""
+        application.window[application.REPROCESSS_SHIPMENT].update(
+            disabled=len(values[event]) != 1
+        )
+        application.window[application.MERGE_EXPORTS].update(
+            disabled=len(values[event]) < 2
+        )
+
+    @staticmethod
+    def reprocess_shipment(application, event, values):
+        """Replace the shipping files with the selected export."""
+        export_index = values[application.SHIPMENT_EXPORT_TABLE][0]
+        application.update_shipping_files(export_index=export_index)
+        application.next_page = MainMenu
+
+    @staticmethod
+    def merge_exports(application, event, values):
+        """Replace the shipping files with the merged selected exports."""
+        export_indexes = values[application.SHIPMENT_EXPORT_TABLE]
+        application.merge_shipping_files(export_indexes=export_indexes)
+        application.next_page = MainMenu
+
+    @staticmethod
+    def refresh(application, event, values):
+        """Reload the shipment exports from the server."""
+        application.update_shipment_exports()
+
+    @staticmethod
+    def cancel(application, event, values):
+        """Return to the main menu."""
+        application.next_page = MainMenu
 
     @classmethod
     def layout(cls):
         """Return the page layout."""
         return [
             [sg.Text(CurrentShipments.name)],
+            [
+                sg.Text("Filter:"),
+                sg.Input(key=Application.SHIPMENT_EXPORT_FILTER, enable_events=True),
+            ],
             [cls.create_table()],
             [
                 sg.Button(Application.REPROCESSS_SHIPMENT, disabled=True),
+                sg.Button(Application.MERGE_EXPORTS, disabled=True),
+                sg.Button("Refresh", key=Application.SHIPMENT_EXPORT_REFRESH),
                 sg.Button("Cancel", key=Application.SHIPMENT_EXPORT_CANCEL),
             ],
         ]
@@ -305,13 +869,14 @@ class ShipmentExports:
             num_rows=22,
             key=Application.SHIPMENT_EXPORT_TABLE,
             enable_events=True,
+            enable_click_events=True,
             justification="left",
         )
 
     @staticmethod
     def update(application):
         """Update the shipment exports list."""
-        application.update_shipment_exports()
+        application.refresh_shipment_exports()
 
 
 class ErrorWindow:
@@ -0,0 +1,232 @@
+"""Download the shipping files of many past exports into an archive."""
+
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from . import api_requests, models
+from .download import DownloadEngine
+from .search import parse_date
+
+MANIFEST_FILE_NAME = "backfill.jsonl"
+
+FILE_NAMES = {
+    api_requests.DownloadShipmentFile: "commodities.csv",
+    api_requests.DownloadAddressFile: "address.csv",
+}
+
+
+def select_exports(exports, export_ids=None, start=None, end=None):
+    """Return the IDs of exports, oldest first.
+
+    exports are records from ShipmentExports. Only exports in export_ids,
+    if given, and created from the date start to the date end, both
+    included, are selected. Exports without a creation date are only
+    selected if no dates are given. exports may only list recent exports,
+    so export_ids not in it are treated as exports without a creation date.
+    """
+    selected = []
+    listed = set()
+    for export in exports:
+        export_id = export[models.ShipmentExports.ID]
+        listed.add(export_id)
+        if export_ids is not None and export_id not in export_ids:
+            continue
+        created_at = parse_date(export.get("created_at"))
+        if start is not None or end is not None:
+            if created_at is None:
+                continue
+            if start is not None and created_at.date() < start:
+                continue
+            if end is not None and created_at.date() > end:
+                continue
+        selected.append((created_at.timestamp() if created_at else 0, export_id))
+    if export_ids is not None and start is None and end is None:
+        selected.extend(
+            (0, export_id)
+            for export_id in dict.fromkeys(export_ids)
+            if export_id not in listed
+        )
+    return [export_id for _, export_id in sorted(selected, key=lambda item: item[0])]
+
+
+class BackfillResult:
+    """The exports downloaded, skipped and failed by a backfill."""
+
+    def __init__(self):
+        """Create an empty result."""
+        self.downloaded = []
+        self.skipped = []
+        self.failed = {}
+        self.byte_count = 0
+        self.seconds = 0.0
+
+    @property
+    def exports_per_second(self):
+        """Return the rate exports were downloaded at."""
+        return len(self.downloaded) / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        """Return the rate files were downloaded at."""
+        return self.byte_count / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        """Return a description of the result."""
+        lines = [
+            f"Downloaded {len(self.downloaded)} exports "
+            f"({self.byte_count / 1e6:.1f} MB) in {self.seconds:.1f}s: "
+            f"{self.exports_per_second:.1f} exports/s, "
+            f"{self.bytes_per_second / 1e6:.2f} MB/s."
+        ]
+        if self.skipped:
+            lines.append(f"Skipped {len(self.skipped)} exports already downloaded.")
+        if self.failed:
+            lines.append(f"{len(self.failed)} exports failed:")
+            for export_id, error in self.failed.items():
+                lines.append(f"  {export_id}: {error}")
+        return "\n".join(lines)
+
+
+class Backfill:
+    """Download the files of exports into an archive directory.
+
+    Each export's files are written to a directory named after its ID and
+    recorded in a manifest once both are complete, so an interrupted run
+    resumes where it stopped and exports already archived are skipped.
+    Downloads are made by a bounded pool of workers as bulk requests, so an
+    application in the same process keeps priority over them.
+    """
+
+    WORKERS = 4
+
+    def __init__(self, archive_directory, workers=WORKERS, cache=None):
+        """Archive to archive_directory, copying files from cache if given."""
+        self.archive_directory = Path(archive_directory)
+        self.manifest_path = self.archive_directory / MANIFEST_FILE_NAME
+        self.workers = workers
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.completed = self.load_manifest()
+
+    def load_manifest(self):
+        """Return the IDs of exports recorded in the manifest.
+
+        Lines that cannot be read, such as one cut short by an interrupted
+        run, are ignored and their exports downloaded again. A line left
+        without its ending is ended, so the next record starts a line of
+        its own.
+        """
+        completed = set()
+        if not self.manifest_path.is_file():
+            return completed
+        with open(self.manifest_path, "r") as f:
+            text = f.read()
+        for line in text.splitlines():
+            try:
+                completed.add(json.loads(line)["export_id"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        if text and not text.endswith("\n"):
+            with open(self.manifest_path, "a") as f:
+                f.write("\n")
+        return completed
+
+    def export_directory(self, export_id):
+        """Return the directory the files of an export are archived in."""
+        return self.archive_directory / str(export_id)
+
+    def run(self, export_ids, on_progress=None):
+        """Archive the files of export_ids and return a BackfillResult.
+
+        on_progress, if given, is called as on_progress(export_id, error)
+        as each export finishes, with error None if it was downloaded. An
+        export failing for any reason is recorded in the result and the
+        others carry on.
+        """
+        result = BackfillResult()
+        pending = []
+        for export_id in dict.fromkeys(export_ids):
+            if export_id in self.completed:
+                result.skipped.append(export_id)
+            else:
+                pending.append(export_id)
+        self.archive_directory.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.fetch, export_id): export_id
+                for export_id in pending
+            }
+            for future in as_completed(futures):
+                export_id = futures[future]
+                try:
+                    result.byte_count += future.result()
+                except Exception as e:
+                    result.failed[export_id] = str(e)
+                    error = e
+                else:
+                    result.downloaded.append(export_id)
+                    error = None
+                if on_progress is not None:
+                    on_progress(export_id, error)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def fetch(self, export_id):
+        """Archive the files of an export and return the bytes downloaded."""
+        directory = self.export_directory(export_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        byte_count = 0
+        for request_class, file_name in FILE_NAMES.items():
+            path = directory / file_name
+            partial_path = path.with_name(f".{file_name}.part")
+            try:
+                byte_count += self.download(export_id, request_class, partial_path)
+                os.replace(partial_path, path)
+            finally:
+                partial_path.unlink(missing_ok=True)
+        self.record(export_id, byte_count)
+        return byte_count
+
+    def download(self, export_id, request_class, path):
+        """Write a file of an export to path and return its size."""
+        if self.cache is not None:
+            cached_path = self.cache.get(export_id, request_class)
+            if cached_path is not None:
+                shutil.copyfile(cached_path, path)
+                return path.stat().st_size
+        response = request_class(priority=api_requests.BULK).request(
+            export_id=export_id
+        )
+        try:
+            return self.engine().download(response, path).byte_count
+        finally:
+            response.close()
+
+    def engine(self):
+        """Return the download engine of the current worker."""
+        if not hasattr(self.local, "engine"):
+            self.local.engine = DownloadEngine()
+        return self.local.engine
+
+    def record(self, export_id, byte_count):
+        """Add a completed export to the manifest."""
+        with self.lock:
+            with open(self.manifest_path, "a") as f:
+                f.write(
+                    json.dumps(
+                        {
+                            "export_id": export_id,
+                            "bytes": byte_count,
+                            "completed_at": time.time(),
+                        }
+                    )
+                    + "\n"
+                )
+            self.completed.add(export_id)
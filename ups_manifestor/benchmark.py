@@ -0,0 +1,110 @@
+"""Benchmark writing a downloaded file with and without the download engine.
+
+The same body is written to disk by the iter_content loop previously used
+for downloads and by the download engine, reading from an in-memory
+response so only the cost of the client is measured. Run with::
+
+    python -m ups_manifestor.benchmark --size 50 --repeat 5
+"""
+
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+import urllib3
+
+from .download import DownloadEngine
+
+ITER_CONTENT = "iter_content"
+ENGINE = "engine"
+
+ROW = b'"ORDER-0000001","Commodity description",2,1.50,"GB","6109100010"\r\n'
+
+
+def make_body(size):
+    """Return a body of about size bytes of shipping file rows."""
+    return ROW * (size // len(ROW) + 1)
+
+
+def make_response(body):
+    """Return a streamed response of body, read from memory."""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(body), preload_content=False, status=200
+    )
+    return response
+
+
+def iter_content_download(response, path):
+    """Write response to path a chunk at a time, as downloads used to."""
+    with open(path, "wb") as file:
+        for chunk in response.iter_content(chunk_size=8192):
+            file.write(chunk)
+        file.flush()
+
+
+def time_download(download, body, path, repeat):
+    """Return the best (seconds, CPU seconds) of repeat downloads of body."""
+    timings = []
+    for _ in range(repeat):
+        response = make_response(body)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        download(response, path)
+        timings.append((time.perf_counter() - start, time.process_time() - cpu_start))
+    return min(timings)
+
+
+def run(size, repeat=5):
+    """Return {method: (seconds, CPU seconds)} for downloads of size bytes."""
+    body = make_body(size)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "shipping_file.csv"
+        return {
+            ITER_CONTENT: time_download(iter_content_download, body, path, repeat),
+            ENGINE: time_download(DownloadEngine().download, body, path, repeat),
+        }
+
+
+def format_results(results, size):
+    """Return a text table of benchmark results."""
+    stream = io.StringIO()
+    stream.write(f"{'method':<14}{'seconds':>10}{'cpu seconds':>13}{'MB/s':>10}\n")
+    for method, (seconds, cpu_seconds) in results.items():
+        rate = size / seconds / 1e6 if seconds else float("inf")
+        stream.write(f"{method:<14}{seconds:>10.3f}{cpu_seconds:>13.3f}{rate:>10.0f}\n")
+    return stream.getvalue()
+
+
+def parse_args(argv):
+    """Return parsed command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare the download engine with the iter_content loop."
+    )
+    parser.add_argument(
+        "--size",
+        type=float,
+        default=50,
+        help="megabytes downloaded (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="downloads per method, the best is reported (default: %(default)s)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    args = parse_args(argv)
+    size = int(args.size * 1e6)
+    print(format_results(run(size, repeat=args.repeat), size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Record and replay HTTP traffic for reproducible tests and benchmarks."""
+
+import base64
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+REDACTED = "REDACTED"
+
+# Request fields generated afresh for every request, which are recorded but
+# not used to match a request to a recording.
+VOLATILE_FIELDS = ("idempotency_key",)
+
+
+class CassetteError(Exception):
+    """Raised when a request cannot be replayed from a cassette."""
+
+    pass
+
+
+class ReplayResponse:
+    """A response replayed from a cassette."""
+
+    def __init__(self, interaction, speed=None):
+        """Replay interaction, scaling recorded delays by 1 / speed."""
+        self.url = interaction["url"]
+        self.status_code = interaction["status_code"]
+        self.headers = requests.structures.CaseInsensitiveDict(interaction["headers"])
+        self.chunks = [
+            (offset, base64.b64decode(chunk)) for offset, chunk in interaction["chunks"]
+        ]
+        self.speed = speed
+        self.started_at = time.monotonic()
+
+    def wait_until(self, offset):
+        """Sleep until offset seconds, as recorded, after the request started."""
+        if not self.speed:
+            return
+        delay = self.started_at + offset / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def content(self):
+        """Return the whole response body."""
+        return b"".join(chunk for _, chunk in self.chunks)
+
+    def json(self):
+        """Return the response body decoded as JSON."""
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        """Yield the response body at the recorded rate."""
+        buffer = b""
+        for offset, chunk in self.chunks:
+            self.wait_until(offset)
+            buffer += chunk
+            while len(buffer) >= chunk_size:
+                yield buffer[:chunk_size]
+                buffer = buffer[chunk_size:]
+        if buffer:
+            yield buffer
+
+    def raise_for_status(self):
+        """Raise requests.HTTPError if the recorded status was an error."""
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for {self.url}")
+
+    def close(self):
+        """Release the response."""
+        pass
+
+
+class Cassette:
+    """A file of recorded HTTP request and response pairs.
+
+    While a cassette is in use requests made by api_requests are recorded to
+    it or, when replaying, answered from it without touching the network.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+    RECORD_CHUNK_SIZE = 8192
+
+    active = None
+
+    def __init__(self, path, mode=REPLAY, speed=None):
+        """Open the cassette at path.
+
+        When replaying, recorded delays are divided by speed, so speed=1
+        replays at the recorded rate and speed=None replays without delays.
+        """
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self.interactions = []
+        if mode == self.REPLAY:
+            with open(self.path, "r") as f:
+                self.interactions = json.load(f)["interactions"]
+        self.unplayed = deque(self.interactions)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def use(self):
+        """Route requests through the cassette in the enclosed block."""
+        Cassette.active = self
+        try:
+            yield self
+        finally:
+            Cassette.active = None
+            if self.mode == self.RECORD:
+                self.save()
+
+    def save(self):
+        """Write the recorded interactions to the cassette file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"interactions": self.interactions}, f, indent=1)
+
+    @staticmethod
+    def redact(data):
+        """Return request data without the API token."""
+        return {
+            key: REDACTED if key == "token" else value for key, value in data.items()
+        }
+
+    @staticmethod
+    def request_key(url, data):
+        """Return the values used to match a request to a recording."""
+        data = {
+            key: value
+            for key, value in Cassette.redact(data).items()
+            if key not in VOLATILE_FIELDS
+        }
+        return urlsplit(url).path, json.dumps(data, sort_keys=True)
+
+    def post(self, url, data, send):
+        """Return the response to a request, calling send when recording."""
+        if self.mode == self.RECORD:
+            return self.record(url, data, send)
+        return self.replay(url, data)
+
+    def record(self, url, data, send):
+        """Make a request with send and record it."""
+        started_at = time.monotonic()
+        response = send()
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size=self.RECORD_CHUNK_SIZE):
+                offset = time.monotonic() - started_at
+                chunks.append((offset, base64.b64encode(chunk).decode()))
+        finally:
+            response.close()
+        interaction = {
+            "url": url,
+            "data": self.redact(data),
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "chunks": chunks or [(time.monotonic() - started_at, "")],
+        }
+        with self.lock:
+            self.interactions.append(interaction)
+        return ReplayResponse(interaction)
+
+    def replay(self, url, data):
+        """Return the next recorded response matching the request."""
+        key = self.request_key(url, data)
+        with self.lock:
+            for interaction in self.unplayed:
+                if self.request_key(interaction["url"], interaction["data"]) == key:
+                    self.unplayed.remove(interaction)
+                    break
+            else:
+                raise CassetteError(
+                    f"No recorded response for {key[0]} in {self.path}."
+                )
+        response = ReplayResponse(interaction, speed=self.speed)
+        response.wait_until(response.chunks[0][0])
+        return response
@@ -0,0 +1,162 @@
+"""Diagnostic profiling for the UPS Manifestor application."""
+
+import cProfile
+import functools
+import io
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Profiler:
+    """Capture CPU and memory profiles of user actions."""
+
+    HOTSPOT_COUNT = 20
+    MEMORY_STAT_COUNT = 10
+    TRACEBACK_FRAMES = 10
+    SUMMARY_FILE_NAME = "summary.txt"
+
+    enabled = False
+    directory = None
+    action_count = 0
+    # Each thread counts the actions it is nested in, and only one action is
+    # profiled at a time, by the thread that began it, as a second profiler
+    # cannot be enabled while one is running.
+    local = threading.local()
+    lock = threading.Lock()
+    profiling_thread = None
+
+    @classmethod
+    def enable(cls, directory):
+        """Start writing a profile for every user action to directory."""
+        cls.directory = Path(directory)
+        cls.directory.mkdir(parents=True, exist_ok=True)
+        cls.action_count = 0
+        cls.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(cls.TRACEBACK_FRAMES)
+
+    @classmethod
+    def disable(cls):
+        """Stop profiling."""
+        cls.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @classmethod
+    def depth(cls):
+        """Return the number of actions the current thread is nested in."""
+        return getattr(cls.local, "depth", 0)
+
+    @classmethod
+    @contextmanager
+    def profile(cls, label):
+        """Profile the enclosed block as a user action named label.
+
+        Blocks nested inside an action being profiled are included in the
+        profile of the outer action. Actions begun on other threads while an
+        action is profiled are not profiled.
+        """
+        depth = cls.depth()
+        cls.local.depth = depth + 1
+        try:
+            if not cls.enabled or depth > 0 or not cls.begin_action():
+                yield
+                return
+            try:
+                profiler = cProfile.Profile()
+                tracemalloc.reset_peak()
+                start_snapshot = tracemalloc.take_snapshot()
+                start_time = time.perf_counter()
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    elapsed = time.perf_counter() - start_time
+                    end_snapshot = tracemalloc.take_snapshot()
+                    _, peak_memory = tracemalloc.get_traced_memory()
+                    cls.write_profile(
+                        label,
+                        profiler,
+                        start_snapshot,
+                        end_snapshot,
+                        elapsed,
+                        peak_memory,
+                    )
+            finally:
+                cls.end_action()
+        finally:
+            cls.local.depth = depth
+
+    @classmethod
+    def begin_action(cls):
+        """Return True if the current thread may profile a new action."""
+        with cls.lock:
+            if cls.profiling_thread is not None:
+                return False
+            cls.profiling_thread = threading.get_ident()
+            cls.action_count += 1
+            return True
+
+    @classmethod
+    def end_action(cls):
+        """Let any thread profile the next action."""
+        with cls.lock:
+            cls.profiling_thread = None
+
+    @classmethod
+    def write_report(cls, file_name, text):
+        """Write a diagnostic report to the diagnostics directory."""
+        with open(cls.directory / file_name, "w") as f:
+            f.write(text)
+
+    @classmethod
+    def write_profile(
+        cls, label, profiler, start_snapshot, end_snapshot, elapsed, peak_memory
+    ):
+        """Write the profile and memory snapshot of an action."""
+        name = f"{cls.action_count:04d}-{re.sub(r'[^A-Za-z0-9]+', '_', label)}"
+        profiler.dump_stats(cls.directory / f"{name}.pstats")
+        end_snapshot.dump(str(cls.directory / f"{name}.snapshot"))
+        stream = io.StringIO()
+        stream.write(f"=== {name}: {elapsed:.3f}s, peak memory {peak_memory} B\n")
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(cls.HOTSPOT_COUNT)
+        stream.write("Memory allocated during action:\n")
+        memory_stats = end_snapshot.compare_to(start_snapshot, "lineno")
+        for memory_stat in memory_stats[: cls.MEMORY_STAT_COUNT]:
+            stream.write(f"    {memory_stat}\n")
+        with open(cls.directory / cls.SUMMARY_FILE_NAME, "a") as f:
+            f.write(stream.getvalue())
+
+
+def profiled(label):
+    """Decorate a function to be profiled as the user action label."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Profiler.profile(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summarise(directory, count=Profiler.HOTSPOT_COUNT):
+    """Return the top hotspots across every profile in directory."""
+    paths = sorted(Path(directory).glob("*.pstats"))
+    if not paths:
+        return f"No profiles found in {directory}."
+    stream = io.StringIO()
+    stream.write(f"{len(paths)} profiled actions in {directory}\n")
+    stats = pstats.Stats(*(str(path) for path in paths), stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(count)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(count)
+    return stream.getvalue()
@@ -0,0 +1,207 @@
+"""Download response bodies into files through reusable buffers."""
+
+import io
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from . import multipart
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+
+# Reads that fill their buffer faster than this grow the chunk size, reads
+# slower than SLOW_READ_SECONDS shrink it.
+FAST_READ_SECONDS = 0.01
+SLOW_READ_SECONDS = 0.25
+
+IDENTITY_ENCODINGS = ("", "identity")
+
+
+def can_read_into(response):
+    """Return True if the raw body of response can be read with readinto.
+
+    Compressed bodies are decoded by iter_content and cannot be.
+    """
+    raw = getattr(response, "raw", None)
+    if not isinstance(raw, io.IOBase):
+        return False
+    encoding = response.headers.get("Content-Encoding", "")
+    return encoding.strip().lower() in IDENTITY_ENCODINGS
+
+
+def write_all(file, buffers):
+    """Write every byte of buffers to the unbuffered file.
+
+    A single vectored write is used where the platform has one.
+    """
+    buffers = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while buffers:
+        if hasattr(os, "writev"):
+            written = os.writev(file.fileno(), buffers)
+        else:
+            written = file.write(buffers[0])
+        while buffers and written >= len(buffers[0]):
+            written -= len(buffers.pop(0))
+        if written:
+            buffers[0] = buffers[0][written:]
+
+
+class VectoredWriter:
+    """Collect writes to an unbuffered file and make them in vectored writes.
+
+    Written data is kept by reference, not copied, until size bytes are
+    waiting.
+    """
+
+    def __init__(self, file, size=MAX_CHUNK_SIZE):
+        """Write to the unbuffered file in writes of about size bytes."""
+        self.file = file
+        self.size = size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, data):
+        """Write data, which must not be changed until it is flushed."""
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Write all waiting data to the file."""
+        write_all(self.file, self.pending)
+        self.pending = []
+        self.pending_size = 0
+
+
+class DownloadStats:
+    """The size and duration of a download."""
+
+    def __init__(self, byte_count, seconds):
+        """Record that byte_count bytes were downloaded in seconds."""
+        self.byte_count = byte_count
+        self.seconds = seconds
+
+    @property
+    def bytes_per_second(self):
+        """Return the download rate."""
+        if self.seconds <= 0:
+            return float(self.byte_count)
+        return self.byte_count / self.seconds
+
+
+class DownloadEngine:
+    """Stream response bodies to files through preallocated buffers.
+
+    The body is read with readinto into buffers that are reused for every
+    download, and each set of filled buffers is written with one vectored
+    write. urllib3 still reads each chunk as a bytes object and copies it
+    into the buffer, so reads are not copy free; what the engine saves is
+    the write per chunk and the fixed chunk size of iter_content. The
+    size of each read adapts to the observed throughput, doubling while
+    reads fill their buffer quickly and halving when they are slow.
+    Responses that cannot be read this way, such as compressed or replayed
+    ones, are copied from iter_content. Multipart responses are read the
+    same way and each part written with vectored writes.
+    """
+
+    BUFFER_COUNT = 4
+    INITIAL_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, buffer_count=BUFFER_COUNT):
+        """Allocate buffer_count buffers of the largest chunk size."""
+        self.buffers = [
+            memoryview(bytearray(MAX_CHUNK_SIZE)) for _ in range(buffer_count)
+        ]
+        self.chunk_size = self.INITIAL_CHUNK_SIZE
+        self.lock = threading.Lock()
+
+    def download(self, response, path):
+        """Write the body of response to path and return its DownloadStats."""
+        with self.lock:
+            start = time.perf_counter()
+            with open(path, "wb", buffering=0) as file:
+                if can_read_into(response):
+                    byte_count = self.read_into(response.raw, file)
+                else:
+                    byte_count = self.copy_chunks(response, file)
+            return DownloadStats(byte_count, time.perf_counter() - start)
+
+    def download_parts(self, response, open_part):
+        """Write the parts of a multipart response to files.
+
+        open_part is called with the headers of each part and returns the
+        path to write its body to, or None to skip it. Returns the names of
+        the parts in the body.
+        """
+        boundary = multipart.get_boundary(response.headers.get("Content-Type"))
+        with self.lock, ExitStack() as files:
+
+            def open_writer(headers):
+                path = open_part(headers)
+                if path is None:
+                    return None
+                file = files.enter_context(open(path, "wb", buffering=0))
+                writer = VectoredWriter(file)
+                files.callback(writer.flush)
+                return writer
+
+            return multipart.demultiplex(
+                self.iter_chunks(response), boundary, open_writer
+            )
+
+    def iter_chunks(self, response):
+        """Yield the body of response, read into the buffers where possible.
+
+        A chunk read into a buffer is only valid until the buffer is reused,
+        after every other buffer has been.
+        """
+        if not can_read_into(response):
+            yield from response.iter_content(chunk_size=self.chunk_size)
+            return
+        index = 0
+        while True:
+            buffer = self.buffers[index][: self.chunk_size]
+            started = time.perf_counter()
+            count = response.raw.readinto(buffer)
+            if not count:
+                return
+            self.adapt(count == len(buffer), time.perf_counter() - started)
+            yield buffer[:count]
+            index = (index + 1) % len(self.buffers)
+
+    def read_into(self, raw, file):
+        """Copy raw to file through the buffers and return the bytes copied."""
+        byte_count = 0
+        filled = []
+        while True:
+            buffer = self.buffers[len(filled)][: self.chunk_size]
+            started = time.perf_counter()
+            count = raw.readinto(buffer)
+            if not count:
+                break
+            self.adapt(count == len(buffer), time.perf_counter() - started)
+            filled.append(buffer[:count])
+            byte_count += count
+            if len(filled) == len(self.buffers):
+                write_all(file, filled)
+                filled = []
+        write_all(file, filled)
+        return byte_count
+
+    def copy_chunks(self, response, file):
+        """Copy the iter_content chunks of response to file."""
+        byte_count = 0
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            write_all(file, [chunk])
+            byte_count += len(chunk)
+        return byte_count
+
+    def adapt(self, filled, seconds):
+        """Resize the next read after one that took seconds."""
+        if filled and seconds < FAST_READ_SECONDS:
+            self.chunk_size = min(self.chunk_size * 2, MAX_CHUNK_SIZE)
+        elif seconds > SLOW_READ_SECONDS:
+            self.chunk_size = max(self.chunk_size // 2, MIN_CHUNK_SIZE)
@@ -0,0 +1,96 @@
+"""Event loop support for the UPS Manifestor application."""
+
+import heapq
+import itertools
+import logging
+import queue
+import time
+
+from . import exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Callbacks to run on the GUI thread.
+
+    Background threads post their results here and timers are scheduled
+    here, the application's event loop runs them between window events.
+    A callback that raises does not stop the others, its error is logged
+    and passed to on_error if given.
+    """
+
+    def __init__(self, on_error=None):
+        """Create empty queues."""
+        self.on_error = on_error
+        self.posted = queue.Queue()
+        self.scheduled = []
+        self.sequence = itertools.count()
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the GUI thread. Safe to call from any thread."""
+        self.posted.put((callback, args))
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) on the GUI thread after delay seconds."""
+        due = time.monotonic() + delay
+        heapq.heappush(self.scheduled, (due, next(self.sequence), callback, args))
+
+    def run_pending(self):
+        """Run posted callbacks and scheduled callbacks that are due."""
+        while True:
+            try:
+                callback, args = self.posted.get_nowait()
+            except queue.Empty:
+                break
+            self.run(callback, args)
+        now = time.monotonic()
+        while self.scheduled and self.scheduled[0][0] <= now:
+            _, _, callback, args = heapq.heappop(self.scheduled)
+            self.run(callback, args)
+
+    def run(self, callback, args):
+        """Run callback(*args), reporting rather than raising its errors.
+
+        CloseProgramRequest is raised, as it ends the event loop.
+        """
+        try:
+            callback(*args)
+        except exceptions.CloseProgramRequest:
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed.", getattr(callback, "__name__", callback))
+            if self.on_error is not None:
+                self.on_error(e)
+
+
+class DispatchStats:
+    """Measure the time taken to dispatch and handle window events."""
+
+    def __init__(self):
+        """Start with no recorded events."""
+        self.count = 0
+        self.total_overhead = 0.0
+        self.max_overhead = 0.0
+        self.total_handler_time = 0.0
+        self.max_handler_time = 0.0
+
+    def record(self, overhead, handler_time):
+        """Record the dispatch overhead and handler time of an event in seconds."""
+        self.count += 1
+        self.total_overhead += overhead
+        self.max_overhead = max(self.max_overhead, overhead)
+        self.total_handler_time += handler_time
+        self.max_handler_time = max(self.max_handler_time, handler_time)
+
+    def summary(self):
+        """Return a description of the recorded dispatch times."""
+        if self.count == 0:
+            return "No events dispatched."
+        return (
+            f"{self.count} events dispatched.\n"
+            f"Dispatch overhead: mean {self.total_overhead / self.count * 1e6:.1f}us, "
+            f"max {self.max_overhead * 1e6:.1f}us.\n"
+            f"Handler time: mean {self.total_handler_time / self.count * 1e3:.2f}ms, "
+            f"max {self.max_handler_time * 1e3:.2f}ms.\n"
+        )
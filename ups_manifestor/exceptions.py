@@ -10,9 +10,58 @@ class CloseProgramRequest(Exception):
 class HTTPRequestError(Exception):
     """Raised when an HTTP request fails."""
 
+    # Client errors that may succeed when the request is made again, once
+    # the client is authorised again or no longer throttled.
+    RETRYABLE_STATUS_CODES = (401, 408, 429)
+
     def __init__(self, url, response):
         """Initialise self."""
+        self.url = url
+        self.status_code = None if response is None else response.status_code
         message = f"Error making request to {url}."
         if response is not None:
             message = f"{message} Status {response.status_code}."
         super().__init__(message)
+
+    @property
+    def is_client_error(self):
+        """Return True if the server rejected the request as invalid."""
+        return self.status_code is not None and 400 <= self.status_code < 500
+
+    @property
+    def is_retryable(self):
+        """Return True if the request may succeed if it is made again."""
+        return (
+            not self.is_client_error or self.status_code in self.RETRYABLE_STATUS_CODES
+        )
+
+
+class LockTimeout(Exception):
+    """Raised when a shared directory stays locked by another station."""
+
+    def __init__(self, lock_path):
+        """Initialise self."""
+        super().__init__(f"Timed out waiting for lock {lock_path}.")
+
+
+class LockError(Exception):
+    """Raised when a stale lock cannot be broken safely."""
+
+    def __init__(self, lock_path, error):
+        """Initialise self."""
+        super().__init__(f"Could not break stale lock {lock_path}: {error}")
+
+
+class UnknownLaneError(Exception):
+    """Raised when a shipment lane is not in the settings."""
+
+    def __init__(self, lane):
+        """Initialise self."""
+        self.lane = lane
+        super().__init__(f"Unknown shipment lane {lane!r}.")
+
+
+class ServiceError(Exception):
+    """Raised when the sync service cannot complete a request."""
+
+    pass
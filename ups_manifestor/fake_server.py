@@ -0,0 +1,301 @@
+"""Local stand-in for the shipment API, for tests and load testing.
+
+The fake server keeps open shipments and exports in memory and implements
+every endpoint used by the application, including the change notification
+stream, over plain HTTP on a local port.
+"""
+
+import csv
+import datetime as dt
+import io
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from . import multipart, subscription
+
+
+class FakeServerState:
+    """Shipments, exports and change events held by the fake server."""
+
+    def __init__(self, token):
+        """Create an empty state accepting requests authenticated with token."""
+        self.token = token
+        self.condition = threading.Condition()
+        self.shipments = {}
+        self.exports = {}
+        self.files = {}
+        self.closed = {}
+        self.events = []
+        self.export_ids = itertools.count(1)
+        self.request_counts = {}
+
+    def add_shipment(self, shipment):
+        """Open a shipment."""
+        with self.condition:
+            self.shipments[shipment["id"]] = dict(shipment)
+            self.publish(subscription.SHIPMENTS)
+
+    def close_shipment(self, shipment_id, idempotency_key=None):
+        """Close a shipment and return the ID of its export."""
+        with self.condition:
+            if idempotency_key is not None and idempotency_key in self.closed:
+                return self.closed[idempotency_key]
+            shipment = self.shipments.pop(shipment_id)
+            export_id = next(self.export_ids)
+            self.exports[export_id] = {
+                "id": export_id,
+                "description": shipment.get("description", ""),
+                "order_numbers": shipment.get("order_number", ""),
+                "destinations": shipment.get("destination", ""),
+                "package_count": shipment.get("package_count", 0),
+                "shipment_count": 1,
+                "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+            }
+            self.files[export_id] = self.make_files(shipment)
+            if idempotency_key is not None:
+                self.closed[idempotency_key] = export_id
+            self.publish(subscription.SHIPMENTS)
+            self.publish(subscription.EXPORTS)
+            return export_id
+
+    def make_files(self, shipment):
+        """Return the commodities and address files of a closed shipment."""
+        order_number = shipment.get("order_number", "")
+        commodities = io.StringIO()
+        writer = csv.writer(commodities)
+        writer.writerow(["Order Number", "Description", "Quantity", "Value"])
+        writer.writerow(
+            [order_number, shipment.get("description", ""), 1, shipment.get("value")]
+        )
+        writer.writerow(["END"])
+        address = io.StringIO()
+        writer = csv.writer(address)
+        writer.writerow([f"Column {i}" for i in range(18)])
+        writer.writerow([shipment.get("destination", "")] * 17 + [order_number])
+        return (commodities.getvalue().encode(), address.getvalue().encode())
+
+    def publish(self, kind):
+        """Notify subscribers that kind of record has changed."""
+        with self.condition:
+            self.events.append(kind)
+            self.condition.notify_all()
+
+    def events_after(self, last_event_id, timeout):
+        """Wait up to timeout for events after last_event_id.
+
+        Returns (event_id, kind) pairs.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events) > last_event_id, timeout)
+            return list(enumerate(self.events, start=1))[last_event_id:]
+
+    def count_request(self, path):
+        """Record a request to path."""
+        with self.condition:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    """Handle requests to the fake server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+        pass
+
+    @property
+    def state(self):
+        """Return the fake server state."""
+        return self.server.state
+
+    def do_POST(self):
+        """Route a request to its endpoint."""
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf8"))
+        data = {key: values[0] for key, values in form.items()}
+        path = self.path.strip("/")
+        self.state.count_request(path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if data.get("token") != self.state.token:
+            return self.send_error(403)
+        routes = {
+            "fba/api/current_shipments": self.current_shipments,
+            "fba/api/shipment_exports": self.shipment_exports,
+            "fba/api/close_shipment": self.close_shipment,
+            "fba/api/download_shipment_file": self.download_shipment_file,
+            "fba/api/download_address_file": self.download_address_file,
+            "fba/api/download_shipping_files": self.download_shipping_files,
+            "fba/api/shipment_changes": self.shipment_changes,
+        }
+        if path not in routes or (
+            path == "fba/api/download_shipping_files"
+            and not self.server.bundled_downloads
+        ):
+            return self.send_error(404)
+        routes[path](data)
+
+    def send_body(self, body, content_type):
+        """Send a complete response."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data):
+        """Send a JSON response."""
+        self.send_body(json.dumps(data).encode(), "application/json")
+
+    def current_shipments(self, data):
+        """Send the open shipments."""
+        with self.state.condition:
+            shipments = list(self.state.shipments.values())
+        self.send_json({"shipments": shipments})
+
+    def shipment_exports(self, data):
+        """Send the exports, newest first."""
+        with self.state.condition:
+            exports = list(reversed(self.state.exports.values()))
+        self.send_json({"exports": exports})
+
+    def close_shipment(self, data):
+        """Close a shipment."""
+        try:
+            export_id = self.state.close_shipment(
+                int(data["shipment_id"]), data.get("idempotency_key")
+            )
+        except (KeyError, ValueError):
+            return self.send_error(400)
+        self.send_json({"export_id": export_id})
+
+    def download_file(self, data, index):
+        """Send one of the files of an export."""
+        try:
+            body = self.state.files[int(data["export_id"])][index]
+        except (KeyError, ValueError):
+            return self.send_error(404)
+        self.send_body(body, "text/csv")
+
+    def download_shipment_file(self, data):
+        """Send the commodities file of an export."""
+        self.download_file(data, 0)
+
+    def download_address_file(self, data):
+        """Send the address file of an export."""
+        self.download_file(data, 1)
+
+    def download_shipping_files(self, data):
+        """Send both files of an export as a multipart response."""
+        try:
+            commodities, address = self.state.files[int(data["export_id"])]
+        except (KeyError, ValueError):
+            return self.send_error(404)
+        boundary = "shipping-files-boundary"
+        body = multipart.encode(
+            [
+                ("commodities", "text/csv", commodities),
+                ("address", "text/csv", address),
+            ],
+            boundary,
+        )
+        self.send_body(body, f"multipart/mixed; boundary={boundary}")
+
+    def shipment_changes(self, data):
+        """Stream change notifications as Server-Sent Events."""
+        try:
+            last_event_id = int(data.get("last_event_id", 0))
+        except ValueError:
+            return self.send_error(400)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        deadline = time.monotonic() + self.server.hold_seconds
+        try:
+            while time.monotonic() < deadline and not self.server.stopping:
+                events = self.state.events_after(
+                    last_event_id, self.server.heartbeat_seconds
+                )
+                for event_id, kind in events:
+                    self.write_chunk(
+                        f"id: {event_id}\nevent: {kind}\ndata: {{}}\n\n".encode()
+                    )
+                    last_event_id = event_id
+                if not events:
+                    self.write_chunk(b": heartbeat\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def write_chunk(self, data):
+        """Send part of a chunked response, an empty chunk ends the response."""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Serve the shipment API from memory on a background thread."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        token="TOKEN",
+        hold_seconds=30,
+        heartbeat_seconds=1,
+        latency=0,
+        bundled_downloads=True,
+    ):
+        """Listen on host and port, 0 picks a free port.
+
+        Change notification responses are held open for hold_seconds, with a
+        heartbeat comment every heartbeat_seconds. Every request is delayed by
+        latency seconds. The bundled download endpoint is only served if
+        bundled_downloads is True.
+        """
+        super().__init__((host, port), FakeRequestHandler)
+        self.state = FakeServerState(token)
+        self.hold_seconds = hold_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.latency = latency
+        self.bundled_downloads = bundled_downloads
+        self.stopping = False
+        self.thread = threading.Thread(
+            target=self.serve_forever, name="fake-server", daemon=True
+        )
+
+    @property
+    def domain(self):
+        """Return the host and port to use as the DOMAIN setting."""
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        """Start serving in the background."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.stopping = True
+        with self.state.condition:
+            self.state.condition.notify_all()
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
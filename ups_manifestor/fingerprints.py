@@ -0,0 +1,190 @@
+"""Index of the content hashes of downloaded shipping files."""
+
+import collections
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .replication import file_hash
+
+RECORD_KEYS = {"export_ids", "hashes"}
+
+
+class FingerprintIndex:
+    """Map content hashes of downloaded shipping files to their exports.
+
+    Each committed pair of files is recorded in a JSON lines file, so the
+    export loaded in the shipment directory can be identified, and files
+    edited by hand or written by something else noticed, without parsing
+    them. Only the last MAX_RECORDS records are kept. Files committed by
+    other stations are identified by the fingerprint published beside the
+    generation of a shared directory. Hashes of files on disk are cached by
+    modification time and size, so checking the loaded files again only
+    costs a stat of each.
+    """
+
+    MAX_RECORDS = 500
+
+    def __init__(self, path):
+        """Load the index at path.
+
+        Records that cannot be read, such as one torn by a crash while it was
+        appended, are skipped and the index rewritten without them.
+        """
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.records = collections.deque(maxlen=self.MAX_RECORDS)
+        self.line_count = 0
+        self.export_ids = {}
+        self.shared = {}
+        self.hashes = {}
+        if self.path.is_file():
+            with open(self.path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    self.line_count += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and RECORD_KEYS <= record.keys():
+                        self.records.append(record)
+            self.rebuild()
+            if self.line_count > len(self.records):
+                self.compact()
+
+    def apply(self, record):
+        """Add a record to the in-memory index."""
+        for digest in record["hashes"]:
+            self.export_ids[digest] = tuple(record["export_ids"])
+
+    def rebuild(self):
+        """Rebuild the in-memory index from the records kept."""
+        self.export_ids = {}
+        for record in self.records:
+            self.apply(record)
+
+    def compact(self):
+        """Rewrite the index file with only the records kept."""
+        partial_path = self.path.with_name(self.path.name + ".part")
+        with open(partial_path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(partial_path, self.path)
+        self.line_count = len(self.records)
+
+    def record(self, export_ids, paths):
+        """Record the files at paths as downloaded for export_ids.
+
+        Returns the record, to be published with the files.
+        """
+        record = {
+            "export_ids": list(export_ids),
+            "hashes": [file_hash(path) for path in paths],
+            "recorded_at": time.time(),
+        }
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self.line_count += 1
+            if len(self.records) == self.MAX_RECORDS:
+                self.records.append(record)
+                self.rebuild()
+            else:
+                self.records.append(record)
+                self.apply(record)
+            if self.line_count >= 2 * self.MAX_RECORDS:
+                self.compact()
+        return record
+
+    def load_shared(self, path):
+        """Identify files by the fingerprint published at path.
+
+        path is the fingerprint file of a shared directory, which is only
+        read again once it changes.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.shared.pop(path, None)
+            return
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            if path in self.shared and self.shared[path][0] == signature:
+                return
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            # The fingerprint is being replaced, it is read on the next check.
+            return
+        export_ids = tuple(record["export_ids"])
+        with self.lock:
+            self.shared[path] = (
+                signature,
+                {digest: export_ids for digest in record["hashes"]},
+            )
+
+    def hash_file(self, path):
+        """Return the hash of the file at path, or None if it is missing."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            cached = self.hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digest = file_hash(path)
+        with self.lock:
+            self.hashes[path] = (signature, digest)
+        return digest
+
+    def identify(self, path):
+        """Return the export IDs the file at path was downloaded for.
+
+        Returns None if the file is missing and an empty tuple if it was not
+        downloaded by this station or a loaded shared directory, or has been
+        changed since.
+        """
+        digest = self.hash_file(path)
+        if digest is None:
+            return None
+        with self.lock:
+            if digest in self.export_ids:
+                return self.export_ids[digest]
+            for _, export_ids in self.shared.values():
+                if digest in export_ids:
+                    return export_ids[digest]
+            return ()
+
+
+def describe_exports(export_ids):
+    """Return a description of the export or merged exports export_ids."""
+    if len(export_ids) == 1:
+        return f"Export {export_ids[0]}"
+    return "Merged exports " + ", ".join(str(i) for i in export_ids)
+
+
+def loaded_export_status(index, paths):
+    """Return a description of the export the shipping files at paths belong to."""
+    identified = [index.identify(path) for path in paths]
+    if all(export_ids is None for export_ids in identified):
+        return "No shipping files"
+    known = {export_ids for export_ids in identified if export_ids}
+    if not known:
+        return "Not downloaded by any station"
+    if len(known) > 1:
+        return "Files from different exports: " + "; ".join(
+            describe_exports(export_ids) for export_ids in sorted(known)
+        )
+    (export_ids,) = known
+    if len(identified) == identified.count(export_ids):
+        return describe_exports(export_ids)
+    return f"{describe_exports(export_ids)}, changed since download"
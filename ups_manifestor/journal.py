@@ -0,0 +1,257 @@
+"""Durable journal of shipment close requests."""
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from . import exceptions
+
+
+class CloseJournal:
+    """Write-ahead journal of requests to close shipments.
+
+    Closes are written to the journal before being sent, each with an
+    idempotency key, so they can be accepted while the server is unreachable
+    and replayed in order later.
+    """
+
+    SUBMITTED = "submitted"
+    CLOSED = "closed"
+    DOWNLOADED = "downloaded"
+    FAILED = "failed"
+    # Closes rejected by the server are shown for this many seconds, unless
+    # cleared first.
+    FAILED_RETENTION = 7 * 24 * 60 * 60
+
+    def __init__(self, path):
+        """Load the journal at path.
+
+        A record that cannot be read, such as one torn by a crash while it
+        was appended, is skipped and the journal rewritten without it.
+        """
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.entries = {}
+        if self.path.is_file():
+            damaged = False
+            with open(self.path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        self.apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        damaged = True
+            if damaged or self.failed() or self.entries_in_state(self.DOWNLOADED):
+                self.compact()
+
+    def apply(self, record):
+        """Update the in-memory state with a journal record."""
+        key = record["key"]
+        if key in self.entries:
+            self.entries[key].update(record)
+        elif "shipment_id" in record:
+            # A new submission, or a whole entry kept by compact.
+            self.entries[key] = dict(record)
+
+    def write(self, record):
+        """Append a record to the journal and flush it to disk."""
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.apply(record)
+
+    def submit(self, shipment_id, lane=None):
+        """Journal a request to close a shipment and return its idempotency key.
+
+        If lane is given the shipping files are downloaded for that shipment
+        lane.
+        """
+        with self.lock:
+            for entry in self.pending():
+                if entry["shipment_id"] == shipment_id:
+                    return entry["key"]
+            key = uuid.uuid4().hex
+            record = {
+                "key": key,
+                "state": self.SUBMITTED,
+                "shipment_id": shipment_id,
+                "submitted_at": time.time(),
+            }
+            if lane is not None:
+                record["lane"] = lane
+            self.write(record)
+            return key
+
+    def entries_in_state(self, state):
+        """Return journal entries in state, oldest first."""
+        with self.lock:
+            return [entry for entry in self.entries.values() if entry["state"] == state]
+
+    def pending(self):
+        """Return the closes that have not been sent, oldest first."""
+        return self.entries_in_state(self.SUBMITTED)
+
+    def undownloaded(self):
+        """Return the closes whose files have not been downloaded, oldest first."""
+        return self.entries_in_state(self.CLOSED)
+
+    def failed(self):
+        """Return the closes rejected by the server."""
+        return self.entries_in_state(self.FAILED)
+
+    def is_empty(self):
+        """Return True if there is no outstanding work in the journal."""
+        return not self.pending() and not self.undownloaded()
+
+    def replay(self, close, download):
+        """Send outstanding closes in order, then download their files.
+
+        close is called as close(shipment_id, idempotency_key=key) and returns
+        an export ID, download is called with that export ID and, for closes
+        submitted with a lane, lane=lane. Replay stops at
+        the first error that may succeed on retry. A download for a lane that
+        is no longer set up fails the entry, one that fails for any other
+        reason is retried on the next replay, with its error kept on the
+        entry. Returns True if no work remains.
+        """
+        for entry in self.pending():
+            try:
+                export_id = close(entry["shipment_id"], idempotency_key=entry["key"])
+            except exceptions.HTTPRequestError as e:
+                if e.is_retryable:
+                    return False
+                self.write(
+                    {
+                        "key": entry["key"],
+                        "state": self.FAILED,
+                        "error": str(e),
+                        "failed_at": time.time(),
+                    }
+                )
+                continue
+            except exceptions.ServiceError:
+                return False
+            self.write(
+                {"key": entry["key"], "state": self.CLOSED, "export_id": export_id}
+            )
+        for entry in self.undownloaded():
+            try:
+                if "lane" in entry:
+                    download(entry["export_id"], lane=entry["lane"])
+                else:
+                    download(entry["export_id"])
+            except exceptions.UnknownLaneError as e:
+                self.write(
+                    {
+                        "key": entry["key"],
+                        "state": self.FAILED,
+                        "error": str(e),
+                        "failed_at": time.time(),
+                    }
+                )
+                continue
+            except Exception as e:
+                if entry.get("error") != str(e):
+                    self.write(
+                        {"key": entry["key"], "state": self.CLOSED, "error": str(e)}
+                    )
+                return False
+            self.write({"key": entry["key"], "state": self.DOWNLOADED})
+        self.compact()
+        return True
+
+    def download_errors(self):
+        """Return the errors of the last attempts to download closed exports."""
+        return [entry["error"] for entry in self.undownloaded() if "error" in entry]
+
+    def clear_failed(self):
+        """Forget the closes rejected by the server."""
+        with self.lock:
+            self.rewrite(
+                entry
+                for entry in self.entries.values()
+                if entry["state"] != self.FAILED
+            )
+
+    def compact(self):
+        """Remove completed entries and expired rejections from the journal."""
+        expires_at = time.time() - self.FAILED_RETENTION
+        with self.lock:
+            self.rewrite(
+                entry
+                for entry in self.entries.values()
+                if entry["state"] != self.DOWNLOADED
+                and not (
+                    entry["state"] == self.FAILED
+                    and entry.get("failed_at", entry["submitted_at"]) < expires_at
+                )
+            )
+
+    def rewrite(self, entries):
+        """Replace the journal with entries."""
+        with self.lock:
+            entries = list(entries)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial_path = self.path.with_name(self.path.name + ".part")
+            with open(partial_path, "w") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(partial_path, self.path)
+            self.entries = {entry["key"]: entry for entry in entries}
+
+
+class JournalReplayer:
+    """Replay a close journal on a background thread."""
+
+    RETRY_INTERVAL = 30
+
+    def __init__(self, journal, close, download, on_replayed=None):
+        """Replay journal with close and download.
+
+        on_replayed is called after each replay with the unexpected exception
+        that stopped the replay, or None.
+        """
+        self.journal = journal
+        self.close = close
+        self.download = download
+        self.on_replayed = on_replayed
+        self.wake_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="close-journal", daemon=True
+        )
+
+    def start(self):
+        """Start replaying in the background."""
+        self.thread.start()
+
+    def wake(self):
+        """Replay now instead of waiting for the next retry."""
+        self.wake_event.set()
+
+    def run(self):
+        """Replay whenever woken or the retry interval passes."""
+        while True:
+            self.wake_event.clear()
+            self.replay_once()
+            self.wake_event.wait(self.RETRY_INTERVAL)
+
+    def replay_once(self):
+        """Replay the journal if it has outstanding work."""
+        if self.journal.is_empty():
+            return
+        error = None
+        try:
+            self.journal.replay(self.close, self.download)
+        except Exception as e:
+            error = e
+        if self.on_replayed is not None:
+            self.on_replayed(error)
@@ -0,0 +1,321 @@
+"""Load test a fleet of stations sharing a shipment directory.
+
+Each simulated station runs in its own process and drives the models and
+API requests used by the application, listing shipments and exports,
+closing shipments, downloading shipping files into the shared directory and
+reading file status, against a local fake server. Run with::
+
+    python -m ups_manifestor.loadtest --stations 1,10,30 --duration 20
+"""
+
+import argparse
+import io
+import multiprocessing
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from . import exceptions, models
+from .fake_server import FakeServer
+from .settings import Settings
+from .tracing import percentile
+
+LIST = "list"
+CLOSE = "close"
+DOWNLOAD = "download"
+STATUS = "status"
+
+OPERATION_WEIGHTS = {LIST: 4, STATUS: 3, CLOSE: 1.5, DOWNLOAD: 1.5}
+
+# Shipment IDs are allocated in blocks so each station closes only its own.
+STATION_ID_BLOCK = 1_000_000
+
+CONTENTION = "contention"
+HTTP = "http"
+OTHER = "other"
+
+
+def station_shipments(station, count):
+    """Return count open shipments belonging to station."""
+    return [
+        {
+            "id": station * STATION_ID_BLOCK + number,
+            "description": f"Station {station} shipment {number}",
+            "order_number": f"LT-{station}-{number}",
+            "destination": random.choice(["UK", "Germany", "France", "Spain"]),
+            "user": f"station{station}",
+            "package_count": random.randint(1, 10),
+            "weight": random.randint(1, 50),
+            "value": f"{random.uniform(5, 500):.2f}",
+        }
+        for number in range(count)
+    ]
+
+
+def classify_error(error):
+    """Return the kind of failure error is."""
+    if isinstance(error, (exceptions.LockTimeout, exceptions.LockError, OSError)):
+        return CONTENTION
+    if isinstance(error, exceptions.HTTPRequestError):
+        return HTTP
+    return OTHER
+
+
+class Station:
+    """A headless client using the application's models."""
+
+    def __init__(self, number):
+        """Create the models of station number."""
+        self.number = number
+        self.current_shipments = models.CurrentShipments()
+        self.shipment_exports = models.ShipmentExports()
+        self.shipment_file_manager = models.ShipmentFileManager()
+
+    def list(self):
+        """Reload open shipments and exports."""
+        self.current_shipments.update()
+        self.shipment_exports.update()
+
+    def close(self):
+        """Close one of this station's open shipments."""
+        own_shipments = [
+            shipment
+            for shipment in self.current_shipments.shipments
+            if shipment["id"] // STATION_ID_BLOCK == self.number
+        ]
+        if not own_shipments:
+            return False
+        self.current_shipments.close_shipment(
+            own_shipments[0]["id"], idempotency_key=uuid.uuid4().hex
+        )
+        self.current_shipments.update()
+        return True
+
+    def download(self):
+        """Replace the shared shipping files with the newest export."""
+        if not self.shipment_exports.exports:
+            return False
+        export_id = self.shipment_exports.exports[0][models.ShipmentExports.ID]
+        self.shipment_file_manager.update_shipping_files(export_id)
+        return True
+
+    def status(self):
+        """Read the status of the shared shipping files.
+
+        A file that exists but cannot be read is a torn read by another
+        station and is raised as an OSError.
+        """
+        self.shipment_file_manager.read_generation()
+        for status in (
+            self.shipment_file_manager.get_commodities_file_status(),
+            self.shipment_file_manager.get_address_file_status(),
+        ):
+            if status == "Invalid":
+                raise OSError("Shipping file could not be read.")
+        return True
+
+    def run(self, duration, think_time):
+        """Run random operations for duration seconds.
+
+        Returns a list of (operation, seconds taken, error kind or None).
+        """
+        operations = {
+            LIST: self.list,
+            CLOSE: self.close,
+            DOWNLOAD: self.download,
+            STATUS: self.status,
+        }
+        names = list(OPERATION_WEIGHTS)
+        weights = list(OPERATION_WEIGHTS.values())
+        samples = []
+        self.list()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            error = None
+            try:
+                performed = operations[name]()
+            except Exception as e:
+                performed = True
+                error = classify_error(e)
+            if performed is not False:
+                samples.append((name, time.perf_counter() - start, error))
+            time.sleep(random.uniform(0, 2 * think_time))
+        return samples
+
+
+def run_station(number, settings, duration, think_time, results):
+    """Run a station in a child process and put its samples on results."""
+    for key, value in settings.items():
+        setattr(Settings, key, value)
+    try:
+        results.put((number, Station(number).run(duration, think_time)))
+    except Exception as e:
+        results.put((number, [(LIST, 0.0, classify_error(e))]))
+
+
+def run_round(server, station_count, shipment_directory, duration, think_time):
+    """Run station_count stations at once and return their samples."""
+    settings = {
+        "PROTOCOL": "http",
+        "DOMAIN": server.domain,
+        "TOKEN": server.state.token,
+        "SHIPMENT_DIRECTORY": str(shipment_directory),
+        "COMMODITIES_FILE_NAME": "commodities.csv",
+        "ADDRESS_FILE_NAME": "address.csv",
+        "BUNDLED_DOWNLOADS": True,
+    }
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=run_station,
+            args=(number, settings, duration, think_time, results),
+            daemon=True,
+        )
+        for number in range(station_count)
+    ]
+    for process in processes:
+        process.start()
+    samples = []
+    for _ in processes:
+        samples.extend(results.get(timeout=duration + 120)[1])
+    for process in processes:
+        process.join()
+    return samples
+
+
+def summarise_round(station_count, samples, duration):
+    """Return a dict of the throughput, latencies and errors of a round."""
+    summary = {
+        "stations": station_count,
+        "operations": len(samples),
+        "throughput": len(samples) / duration,
+        "errors": {CONTENTION: 0, HTTP: 0, OTHER: 0},
+        "latency": {},
+    }
+    for name, _, error in samples:
+        if error is not None:
+            summary["errors"][error] += 1
+    for name in OPERATION_WEIGHTS:
+        durations = [seconds for op, seconds, error in samples if op == name]
+        if durations:
+            summary["latency"][name] = (
+                percentile(durations, 0.5),
+                percentile(durations, 0.95),
+                percentile(durations, 0.99),
+            )
+    return summary
+
+
+def format_summaries(summaries):
+    """Return a text table of round summaries."""
+    stream = io.StringIO()
+    stream.write(
+        f"{'stations':>8}{'ops':>8}{'ops/s':>9}{'contention':>12}{'http':>6}"
+        f"{'other':>7}  latency p50/p95/p99 (ms)\n"
+    )
+    for summary in summaries:
+        errors = summary["errors"]
+        latencies = "  ".join(
+            f"{name} {p50 * 1000:.0f}/{p95 * 1000:.0f}/{p99 * 1000:.0f}"
+            for name, (p50, p95, p99) in summary["latency"].items()
+        )
+        stream.write(
+            f"{summary['stations']:>8}{summary['operations']:>8}"
+            f"{summary['throughput']:>9.1f}{errors[CONTENTION]:>12}"
+            f"{errors[HTTP]:>6}{errors[OTHER]:>7}  {latencies}\n"
+        )
+    return stream.getvalue()
+
+
+def run(
+    station_counts,
+    duration=10,
+    think_time=0.05,
+    shipments=200,
+    latency=0,
+    shipment_directory=None,
+):
+    """Run a round for each of station_counts and return their summaries.
+
+    Each round uses a fresh fake server and, unless shipment_directory is
+    given, a fresh temporary shipment directory.
+    """
+    summaries = []
+    for station_count in station_counts:
+        with FakeServer(latency=latency) as server:
+            for station in range(station_count):
+                for shipment in station_shipments(station, shipments):
+                    server.state.add_shipment(shipment)
+            with tempfile.TemporaryDirectory() as temporary_directory:
+                directory = Path(shipment_directory or temporary_directory)
+                samples = run_round(
+                    server, station_count, directory, duration, think_time
+                )
+        summaries.append(summarise_round(station_count, samples, duration))
+    return summaries
+
+
+def parse_args(argv):
+    """Return parsed command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Load test a fleet of stations against a fake server."
+    )
+    parser.add_argument(
+        "--stations",
+        default="1,5,10,30",
+        help="comma separated station counts to run a round with (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="seconds each round runs for (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.05,
+        help="mean seconds a station waits between operations (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shipments",
+        type=int,
+        default=200,
+        help="open shipments per station (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="seconds the fake server delays each request (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shipment-directory",
+        metavar="DIRECTORY",
+        help="shared directory to use, such as a network share (default: a temporary "
+        "directory)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the load test and print the results."""
+    args = parse_args(argv)
+    summaries = run(
+        [int(count) for count in args.stations.split(",")],
+        duration=args.duration,
+        think_time=args.think_time,
+        shipments=args.shipments,
+        latency=args.latency,
+        shipment_directory=args.shipment_directory,
+    )
+    print(format_summaries(summaries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Coordination between stations sharing a shipment directory."""
+
+import json
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+
+from . import exceptions
+
+
+class DirectoryLock:
+    """Advisory lease lock on a directory shared between stations.
+
+    The lock is a file created exclusively in the directory. A lock older
+    than LEASE_SECONDS is assumed to belong to a station that crashed and is
+    broken. Ages are measured by the clock of the directory's file system,
+    which stamps the lock file, so stations with skewed clocks agree on them.
+    The directory also holds a generation counter which is incremented every
+    time files are committed under the lock, and the fingerprint of the files
+    committed as that generation.
+    """
+
+    LOCK_FILE_NAME = ".ups_manifestor.lock"
+    CLOCK_FILE_NAME = ".ups_manifestor.clock"
+    GENERATION_FILE_NAME = ".ups_manifestor.generation"
+    FINGERPRINT_FILE_NAME = ".ups_manifestor.fingerprint"
+    LEASE_SECONDS = 30
+    TIMEOUT = 10
+    RETRY_INTERVAL = 0.05
+
+    def __init__(self, directory):
+        """Lock directory."""
+        self.directory = Path(directory)
+        self.lock_path = self.directory / self.LOCK_FILE_NAME
+        self.generation_path = self.directory / self.GENERATION_FILE_NAME
+        self.fingerprint_path = self.directory / self.FINGERPRINT_FILE_NAME
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.clock_offset = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def acquire(self):
+        """Wait for and take the lock."""
+        deadline = time.monotonic() + self.TIMEOUT
+        # The clocks may have drifted since the lock was last taken.
+        self.clock_offset = None
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self.break_if_stale()
+                if time.monotonic() > deadline:
+                    raise exceptions.LockTimeout(self.lock_path)
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            with os.fdopen(fd, "w") as f:
+                json.dump({"owner": self.owner, "acquired_at": time.time()}, f)
+            return
+
+    def read_lock(self):
+        """Return the contents of the lock file, or None if it is not locked."""
+        try:
+            with open(self.lock_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # The lock is being written, or was abandoned part way through.
+            try:
+                return {"owner": None, "acquired_at": self.lock_path.stat().st_mtime}
+            except FileNotFoundError:
+                return None
+
+    def directory_time(self):
+        """Return the current time by the clock of the directory's file system."""
+        clock_path = self.directory / f"{self.CLOCK_FILE_NAME}.{uuid.uuid4().hex}"
+        clock_path.touch()
+        try:
+            return clock_path.stat().st_mtime
+        finally:
+            clock_path.unlink(missing_ok=True)
+
+    def lock_age(self):
+        """Return the seconds since the lock was taken, or None if it is not."""
+        try:
+            modified_at = self.lock_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if self.clock_offset is None:
+            self.clock_offset = self.directory_time() - time.time()
+        return time.time() + self.clock_offset - modified_at
+
+    def break_if_stale(self):
+        """Remove the lock if its lease has expired.
+
+        Raises LockError if the lock of another station was moved aside while
+        breaking it and cannot be put back.
+        """
+        age = self.lock_age()
+        if age is None or age < self.LEASE_SECONDS:
+            return
+        lock = self.read_lock()
+        if lock is None:
+            return
+        stale_path = self.lock_path.with_name(
+            f"{self.LOCK_FILE_NAME}.{uuid.uuid4().hex}"
+        )
+        try:
+            # Renaming is atomic, so only one station can break the lock.
+            os.replace(self.lock_path, stale_path)
+        except FileNotFoundError:
+            return
+        try:
+            with open(stale_path, "r") as f:
+                broken_lock = json.load(f)
+        except ValueError:
+            broken_lock = lock
+        try:
+            if broken_lock["owner"] != lock["owner"]:
+                # Another station broke the stale lock and took a new one first.
+                try:
+                    os.link(stale_path, self.lock_path)
+                except FileExistsError:
+                    # The directory is locked again, so the lock is not lost.
+                    pass
+                except OSError as e:
+                    raise exceptions.LockError(self.lock_path, e)
+        finally:
+            stale_path.unlink(missing_ok=True)
+
+    def release(self):
+        """Release the lock if it is still held by this station."""
+        lock = self.read_lock()
+        if lock is not None and lock["owner"] == self.owner:
+            self.lock_path.unlink(missing_ok=True)
+
+    def read_generation(self):
+        """Return the number of times files have been committed."""
+        try:
+            return int(self.generation_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def increment_generation(self, fingerprint=None):
+        """Increment the generation counter and return the new generation.
+
+        fingerprint, if given, is the FingerprintIndex record of the files
+        committed as the new generation. Must only be called while holding
+        the lock.
+        """
+        generation = self.read_generation() + 1
+        if fingerprint is None:
+            self.fingerprint_path.unlink(missing_ok=True)
+        else:
+            self.write_atomically(
+                self.fingerprint_path,
+                json.dumps({**fingerprint, "generation": generation}),
+            )
+        self.write_atomically(self.generation_path, str(generation))
+        return generation
+
+    @staticmethod
+    def write_atomically(path, text):
+        """Replace the file at path with text."""
+        partial_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+        partial_path.write_text(text)
+        os.replace(partial_path, path)
@@ -0,0 +1,194 @@
+"""Streaming merge of the shipping files of several exports."""
+
+import codecs
+import collections
+import csv
+import queue
+import threading
+
+# Latin-1 maps every byte to a character, so rows are copied byte for byte
+# whatever encoding the server uses.
+ENCODING = "latin-1"
+
+
+class SourceStream:
+    """Read chunks of a file on a background thread into a bounded buffer.
+
+    Several sources can be downloading at once while they are merged one
+    after another, memory use is limited to buffer_size chunks per source.
+    A source given the previous source is only opened once that one has
+    been.
+    """
+
+    END = object()
+
+    def __init__(self, open_chunks, buffer_size=16, previous=None):
+        """Read the chunks returned by calling open_chunks."""
+        self.open_chunks = open_chunks
+        self.previous = previous
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.opened = threading.Event()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="merge-source", daemon=True
+        )
+
+    def start(self):
+        """Start reading in the background."""
+        self.thread.start()
+
+    def run(self):
+        """Read chunks into the buffer until the source is exhausted or cancelled."""
+        try:
+            if not self.wait_for_previous():
+                return
+            try:
+                chunks = self.open_chunks()
+            finally:
+                self.opened.set()
+            for chunk in chunks:
+                if not self.put(chunk):
+                    return
+        except Exception as e:
+            self.put(e)
+            return
+        self.put(self.END)
+
+    def wait_for_previous(self):
+        """Wait for the previous source to be opened, returning False if cancelled."""
+        while self.previous is not None and not self.previous.opened.wait(0.1):
+            if self.cancelled.is_set():
+                return False
+        return True
+
+    def put(self, item):
+        """Wait for space in the buffer, returning False if cancelled."""
+        while not self.cancelled.is_set():
+            try:
+                self.buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def cancel(self):
+        """Stop reading."""
+        self.cancelled.set()
+
+    def __iter__(self):
+        """Yield the chunks of the source, raising any error reading it."""
+        while True:
+            item = self.buffer.get()
+            if item is self.END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def read_chunks(path, chunk_size=8192):
+    """Yield the contents of the file at path in chunks of bytes."""
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def iter_lines(chunks, encoding=ENCODING):
+    """Yield lines, with line endings, from an iterable of bytes."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(lines):
+    """Yield (text, row) for each CSV record in lines.
+
+    text is the record exactly as it appears in lines, ending with a line
+    ending, and row its parsed fields. A record spans several lines when a
+    quoted field contains line endings.
+    """
+    line_ending = "\r\n"
+    text = ""
+    for line in lines:
+        text += line
+        # Quotes are balanced at the end of a record, as escaped quotes come
+        # in pairs.
+        if text.count('"') % 2:
+            continue
+        if text.endswith("\r\n"):
+            line_ending = "\r\n"
+        elif text.endswith("\n"):
+            line_ending = "\n"
+        else:
+            text += line_ending
+        yield text, next(csv.reader([text]), [])
+        text = ""
+    if text:
+        yield text, next(csv.reader([text]), [])
+
+
+def merge_csv(sources, target, order_number_column, start_row, end_row):
+    """Merge CSV sources into target, a text file.
+
+    sources is a list of iterables of bytes. The first start_row rows are a
+    header written once, from the first source. If end_row is negative the
+    last -end_row rows are a trailer written once, from the last source. Rows
+    for an order number are taken from the first source containing it.
+    Rows are written as they appear in the sources, keeping their quoting and
+    line endings. Returns the number of data rows written.
+    """
+    trailer_length = -end_row if end_row else 0
+    order_sources = {}
+    trailer = []
+    row_count = 0
+    for source_index, source in enumerate(sources):
+        # Rows are held back until it is known they are not part of the trailer.
+        held_rows = collections.deque()
+        for row_number, (text, row) in enumerate(iter_records(iter_lines(source))):
+            if row_number < start_row:
+                if source_index == 0:
+                    target.write(text)
+                continue
+            held_rows.append((text, row))
+            if len(held_rows) <= trailer_length:
+                continue
+            text, row = held_rows.popleft()
+            order_number = (
+                row[order_number_column] if len(row) > order_number_column else None
+            )
+            if order_sources.setdefault(order_number, source_index) == source_index:
+                target.write(text)
+                row_count += 1
+        trailer = [text for text, _ in held_rows]
+    target.writelines(trailer)
+    return row_count
+
+
+def merge_files(open_sources, target_path, order_number_column, start_row, end_row):
+    """Merge the files opened by open_sources into target_path.
+
+    open_sources is a list of callables each returning an iterable of bytes.
+    Sources are opened in order, each once the one before it has been, and
+    then download at once. A download keeps its request slot until it is
+    read, so opening in order means the source being merged always has its
+    slot and is never left waiting for one held by a later source whose
+    buffer is full.
+    """
+    streams = []
+    for open_chunks in open_sources:
+        previous = streams[-1] if streams else None
+        streams.append(SourceStream(open_chunks, previous=previous))
+    for stream in streams:
+        stream.start()
+    try:
+        with open(target_path, "w", encoding=ENCODING, newline="") as target:
+            return merge_csv(streams, target, order_number_column, start_row, end_row)
+    finally:
+        for stream in streams:
+            stream.cancel()
@@ -1,13 +1,152 @@
 """Models for the UPS Manifestor application."""
 
 import csv
+import functools
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from types import MappingProxyType
 
-from . import api_requests
+from . import (
+    api_requests,
+    download,
+    exceptions,
+    fingerprints,
+    locking,
+    merge,
+    multipart,
+    replication,
+    search,
+    tracing,
+)
+from .diagnostics import profiled
 from .settings import Settings
 
 
-class CurrentShipments:
+class Snapshot:
+    """An immutable, versioned copy of a model's records.
+
+    Snapshots are never modified once published, so they can be read from
+    any thread without locking.
+    """
+
+    ID = "id"
+
+    def __init__(self, version, records, search_keys, date_keys=()):
+        """Freeze records as version."""
+        self.version = version
+        self.records = tuple(MappingProxyType(dict(record)) for record in records)
+        self.index = search.RecordIndex(self.records, search_keys, date_keys)
+        self.records_by_id = {record.get(self.ID): record for record in self.records}
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, record_id):
+        """Return the record with record_id, or None if it is not in the snapshot."""
+        return self.records_by_id.get(record_id)
+
+
+class FreshnessPolicy:
+    """Decide when a model's records are old enough to be fetched again.
+
+    Records are fresh for ttl seconds after they are loaded, unless they are
+    invalidated first, for example by a local write.
+    """
+
+    def __init__(self, ttl):
+        """Keep records for ttl seconds."""
+        self.ttl = ttl
+        self.loaded_at = None
+
+    def loaded(self):
+        """Record that the records have just been loaded."""
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Mark the records as out of date."""
+        self.loaded_at = None
+
+    @property
+    def invalidated(self):
+        """Return True if the records have been invalidated or never loaded."""
+        return self.loaded_at is None
+
+    def is_fresh(self):
+        """Return True if the records were loaded less than ttl seconds ago."""
+        return (
+            self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+        )
+
+
+class SearchableRecords:
+    """Base class for models displayed in a filterable, sortable table.
+
+    Records are published as Snapshots. Updating the records replaces the
+    current snapshot with a new version rather than changing it. How long
+    records stay fresh is read from the setting named by TTL_SETTING.
+    """
+
+    search_keys = ()
+    date_keys = ()
+    TTL_SETTING = None
+
+    def __init__(self):
+        """Set up an empty snapshot."""
+        self.write_lock = threading.Lock()
+        self.snapshot = Snapshot(0, [], self.search_keys, self.date_keys)
+        ttl = getattr(Settings, self.TTL_SETTING) if self.TTL_SETTING else None
+        self.freshness = FreshnessPolicy(ttl or 0)
+        self.filter_text = ""
+        self.sort_by = None
+        self.sort_reverse = False
+
+    @property
+    def version(self):
+        """Return the version of the current snapshot."""
+        return self.snapshot.version
+
+    def set_records(self, records):
+        """Publish a new snapshot of records."""
+        with self.write_lock:
+            self.snapshot = Snapshot(
+                self.snapshot.version + 1, records, self.search_keys, self.date_keys
+            )
+            self.freshness.loaded()
+
+    def get(self, record_id):
+        """Return the record with record_id from the current snapshot, or None."""
+        return self.snapshot.get(record_id)
+
+    def set_filter(self, filter_text):
+        """Show only records matching filter_text."""
+        self.filter_text = filter_text
+
+    def toggle_sort(self, key):
+        """Sort by key, reversing the order if already sorted by key."""
+        if self.sort_by == key:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_by = key
+            self.sort_reverse = False
+
+    def get_display_records(self, snapshot=None):
+        """Return the filtered and sorted records of snapshot in display order.
+
+        The current snapshot is used if snapshot is not given.
+        """
+        if snapshot is None:
+            snapshot = self.snapshot
+        return snapshot.index.select(
+            self.filter_text, sort_by=self.sort_by, reverse=self.sort_reverse
+        )
+
+
+class CurrentShipments(SearchableRecords):
     """Manages currently open shipments."""
 
     ID = "id"
@@ -27,26 +166,50 @@ class CurrentShipments:
         VALUE,
         ORDER_NUMBER,
     )
+    search_keys = (DESCRIPTION, ORDER_NUMBER, DESTINATION, USER)
+    TTL_SETTING = "SHIPMENTS_TTL"
+
+    @property
+    def shipments(self):
+        """Return the currently open shipments."""
+        return self.snapshot.records
+
+    @shipments.setter
+    def shipments(self, shipments):
+        self.set_records(shipments)
 
+    @profiled("update current shipments")
     def update(self):
         """Get currently open shipments from the server."""
         data = api_requests.CurrentShipmentsRequest().request()
         self.shipments = data["shipments"]
 
-    def get_display_rows(self):
-        """Return contents for the table display."""
+    def get_display_rows(self, records=None):
+        """Return contents for the table display, of records if given."""
+        if records is None:
+            records = self.get_display_records()
         return [
-            [shipment.get(col) for col in self.shipment_keys]
-            for shipment in self.shipments
+            [shipment.get(col) for col in self.shipment_keys] for shipment in records
         ]
 
-    def close_shipment(self, shipment_id):
-        """Close all currently open shipments and return the ID of the created export."""
-        data = api_requests.CloseShipment().request(shipment_id=shipment_id)
+    @profiled("close shipment")
+    def close_shipment(self, shipment_id, idempotency_key=None):
+        """Close all currently open shipments and return the ID of the created export.
+
+        Repeated requests with the same idempotency_key close the shipment once.
+        """
+        with tracing.Tracer.span(
+            tracing.CLOSE_SHIPMENT, shipment_id=shipment_id, key=idempotency_key
+        ) as span:
+            data = api_requests.CloseShipment().request(
+                shipment_id=shipment_id, idempotency_key=idempotency_key
+            )
+            span["export_id"] = data["export_id"]
+        self.freshness.invalidate()
         return data["export_id"]
 
 
-class ShipmentExports:
+class ShipmentExports(SearchableRecords):
     """Manages existing shipment exports."""
 
     ID = "id"
@@ -65,17 +228,80 @@ class ShipmentExports:
         CREATED_AT,
         ORDER_NUMBERS,
     )
+    search_keys = (DESCRIPTION, ORDER_NUMBERS, DESTINATIONS, CREATED_AT)
+    date_keys = (CREATED_AT,)
+    TTL_SETTING = "EXPORTS_TTL"
+
+    def __init__(self, prefetcher=None):
+        """Prefetch the files of the newest exports with prefetcher, if given."""
+        super().__init__()
+        self.prefetcher = prefetcher
+
+    @property
+    def exports(self):
+        """Return the shipment exports."""
+        return self.snapshot.records
 
+    @exports.setter
+    def exports(self, exports):
+        self.set_records(exports)
+
+    @profiled("update shipment exports")
     def update(self):
         """Update the list of shipment exports."""
         data = api_requests.ShipmentExportsRequest().request()
         self.exports = data["exports"]
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(export[self.ID] for export in self.exports)
 
-    def get_display_rows(self):
-        """Return contents for the table display."""
-        return [
-            [export.get(col) for col in self.export_keys] for export in self.exports
-        ]
+    def get_display_rows(self, records=None):
+        """Return contents for the table display, of records if given."""
+        if records is None:
+            records = self.get_display_records()
+        return [[export.get(col) for col in self.export_keys] for export in records]
+
+
+def format_age(seconds):
+    """Return a short description of an age of seconds."""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "updated just now"
+    if minutes < 60:
+        return f"updated {minutes} min ago"
+    hours = minutes // 60
+    if hours < 48:
+        return f"updated {hours} h ago"
+    return f"updated {hours // 24} days ago"
+
+
+def plural(count, noun):
+    """Return count and noun, pluralised if count is not one."""
+    return f"{count} {noun}" if count == 1 else f"{count} {noun}s"
+
+
+class FileSummary:
+    """The number and range of orders, row count and age of a shipping file."""
+
+    def __init__(self, order_ids, row_count, modified_at):
+        """Summarise a file of row_count rows with sorted, distinct order_ids."""
+        self.order_count = len(order_ids)
+        self.first_order = order_ids[0] if order_ids else None
+        self.last_order = order_ids[-1] if order_ids else None
+        self.row_count = row_count
+        self.modified_at = modified_at
+
+    def describe(self, now=None):
+        """Return the summary as text, with the age of the file at now."""
+        now = time.time() if now is None else now
+        orders = plural(self.order_count, "order")
+        if self.order_count == 1:
+            orders = f"{orders} ({self.first_order})"
+        elif self.order_count > 1:
+            orders = f"{orders} ({self.first_order} to {self.last_order})"
+        return (
+            f"{orders}, {plural(self.row_count, 'row')}, "
+            f"{format_age(now - self.modified_at)}"
+        )
 
 
 class ShipmentFileManager:
@@ -88,33 +314,105 @@ class ShipmentFileManager:
     ADDRESS_START_ROW = 1
     ADDRESS_END_ROW = None
 
-    def __init__(self):
-        """Get file paths."""
-        self.shipment_directory = Path(Settings.SHIPMENT_DIRECTORY)
-        self.commodities_file_path = (
-            self.shipment_directory / Settings.COMMODITIES_FILE_NAME
+    def __init__(
+        self, cache=None, staging_directory=None, fingerprint_index=None, lane=None
+    ):
+        """Get file paths, using files from cache when available.
+
+        If staging_directory is given files are downloaded and read there and
+        copied to the shipment directory in the background. Downloaded files
+        are recorded in fingerprint_index, if given, to identify the loaded
+        export. lane is a dict of the settings of a shipment lane, overriding
+        the shipment directory and file names in Settings.
+        """
+        lane = lane or {}
+        self.cache = cache
+        self.fingerprint_index = fingerprint_index
+        self.bundled_downloads = bool(Settings.BUNDLED_DOWNLOADS)
+        self.shipment_directory = Path(
+            lane.get("SHIPMENT_DIRECTORY", Settings.SHIPMENT_DIRECTORY)
+        )
+        self.commodities_file_path = self.shipment_directory / lane.get(
+            "COMMODITIES_FILE_NAME", Settings.COMMODITIES_FILE_NAME
+        )
+        self.address_file_path = self.shipment_directory / lane.get(
+            "ADDRESS_FILE_NAME", Settings.ADDRESS_FILE_NAME
         )
-        self.address_file_path = self.shipment_directory / Settings.ADDRESS_FILE_NAME
+        self.lock = locking.DirectoryLock(self.shipment_directory)
+        self.download_engine = download.DownloadEngine()
+        if staging_directory is None:
+            self.staging_directory = None
+            self.replicator = None
+            self.local_commodities_file_path = self.commodities_file_path
+            self.local_address_file_path = self.address_file_path
+        else:
+            self.staging_directory = Path(staging_directory)
+            self.staging_directory.mkdir(parents=True, exist_ok=True)
+            self.replicator = replication.WriteBehindReplicator(
+                self.lock, on_replicated=self.set_local_generation
+            )
+            self.local_commodities_file_path = (
+                self.staging_directory / self.commodities_file_path.name
+            )
+            self.local_address_file_path = (
+                self.staging_directory / self.address_file_path.name
+            )
+        self.local_generation = None
+        self.pickup_watcher = tracing.PickupWatcher(
+            [self.commodities_file_path, self.address_file_path]
+        )
+        self.replicating_export_ids = None
+        self.file_summaries = {}
 
+    @profiled("get file status")
     def get_file_status(self, file_path, order_number_column, start_row, end_row):
-        """Return a string representation of the status of a file."""
+        """Return a short summary of the orders in a file.
+
+        The summary is the same length however many orders the file has, use
+        get_file_orders for the full list.
+        """
         if not file_path.is_file():
             return "Missing"
         else:
             try:
-                data = self.read_csv(file_path)
-                order_ids = [
-                    row[order_number_column] for row in data[start_row:end_row]
-                ]
-                order_ids = sorted(list(set(order_ids)))
-                return ", ".join(order_ids)
+                return self.get_file_summary(
+                    file_path, order_number_column, start_row, end_row
+                ).describe()
             except Exception:
                 return "Invalid"
 
+    def get_file_summary(self, file_path, order_number_column, start_row, end_row):
+        """Return the FileSummary of a file, reading it only if it has changed."""
+        stat = file_path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self.file_summaries.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        row_count, order_ids = self.read_order_ids(
+            file_path, order_number_column, start_row, end_row
+        )
+        summary = FileSummary(order_ids, row_count, stat.st_mtime)
+        self.file_summaries[file_path] = (signature, summary)
+        return summary
+
+    def read_order_ids(self, file_path, order_number_column, start_row, end_row):
+        """Return the row count and sorted, distinct order numbers of a file."""
+        rows = self.read_csv(file_path)[start_row:end_row]
+        return len(rows), sorted({row[order_number_column] for row in rows})
+
+    def get_file_orders(self, file_path, order_number_column, start_row, end_row):
+        """Return every order number in a file, or [] if it cannot be read."""
+        try:
+            return self.read_order_ids(
+                file_path, order_number_column, start_row, end_row
+            )[1]
+        except Exception:
+            return []
+
     def get_commodities_file_status(self):
         """Return a string representation of the comodities file."""
         return self.get_file_status(
-            self.commodities_file_path,
+            self.local_commodities_file_path,
             self.COMMODITIES_ORDER_NUMBER_COLUMN,
             self.COMMODITIES_START_ROW,
             self.COMMODITES_END_ROW,
@@ -123,12 +421,40 @@ class ShipmentFileManager:
     def get_address_file_status(self):
         """Return a string representation of the address file."""
         return self.get_file_status(
-            self.address_file_path,
+            self.local_address_file_path,
+            self.ADDRESS_ORDER_NUMBER_COLUMN,
+            self.ADDRESS_START_ROW,
+            self.ADDRESS_END_ROW,
+        )
+
+    def get_commodities_file_orders(self):
+        """Return every order number in the comodities file."""
+        return self.get_file_orders(
+            self.local_commodities_file_path,
+            self.COMMODITIES_ORDER_NUMBER_COLUMN,
+            self.COMMODITIES_START_ROW,
+            self.COMMODITES_END_ROW,
+        )
+
+    def get_address_file_orders(self):
+        """Return every order number in the address file."""
+        return self.get_file_orders(
+            self.local_address_file_path,
             self.ADDRESS_ORDER_NUMBER_COLUMN,
             self.ADDRESS_START_ROW,
             self.ADDRESS_END_ROW,
         )
 
+    def get_loaded_export_status(self):
+        """Return a description of the export the current files belong to."""
+        if self.fingerprint_index is None:
+            return ""
+        self.fingerprint_index.load_shared(self.lock.fingerprint_path)
+        return fingerprints.loaded_export_status(
+            self.fingerprint_index,
+            [self.local_commodities_file_path, self.local_address_file_path],
+        )
+
     def read_csv(self, path):
         """Return the contents of a .csv file."""
         with open(path, "r") as f:
@@ -136,31 +462,317 @@ class ShipmentFileManager:
             data = list(reader)
         return data
 
+    def read_generation(self):
+        """Return the generation of the shipping files in the shipment directory."""
+        return self.lock.read_generation()
+
+    def staging_path(self, path):
+        """Return a unique temporary path to download a replacement for path."""
+        return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    def set_local_generation(self, generation):
+        """Record the generation of the shipment directory the local files match."""
+        self.local_generation = generation
+        if self.replicating_export_ids is not None:
+            self.pickup_watcher.start(
+                self.replicating_export_ids, generation, time.time()
+            )
+            self.replicating_export_ids = None
+
+    def check_pickup(self):
+        """Trace WorldShip picking up the last committed shipping files."""
+        self.pickup_watcher.check(self.read_generation())
+
+    def get_replication_status(self):
+        """Return a description of files waiting to be copied to the share."""
+        if self.replicator is None or not self.replicator.pending:
+            return ""
+        if self.replicator.error is not None:
+            return (
+                "Copying files to the shipment directory failed, retrying: "
+                f"{self.replicator.error}"
+            )
+        return "Copying files to the shipment directory."
+
+    @profiled("update shipping files")
     def update_shipping_files(self, export_id):
-        """Replace the current shipping files."""
-        self.update_comodities_file(export_id=export_id)
-        self.update_address_file(export_id=export_id)
+        """Replace the current shipping files.
+
+        Both files are downloaded beside the current local files and the
+        shipment directory is only locked while they are renamed into place.
+        When staging locally the files are ready as soon as they are
+        downloaded and None is returned, as the generation they will be
+        committed as is not yet known.
+        """
+        staged_files = self.stage_shipping_files()
+        try:
+            self.download_shipping_files(
+                export_id,
+                staged_files[self.local_commodities_file_path],
+                staged_files[self.local_address_file_path],
+            )
+            return self.commit_shipping_files(staged_files, [export_id])
+        finally:
+            for staged_path in staged_files.values():
+                staged_path.unlink(missing_ok=True)
 
-    def update_comodities_file(self, export_id):
-        """Replace the comodities file."""
+    @profiled("merge shipping files")
+    def merge_shipping_files(self, export_ids):
+        """Replace the current shipping files with the merged files of exports.
+
+        The files of every export are streamed at once and merged without
+        being held in memory. Rows for an order in more than one export are
+        taken from the first export in export_ids. Returns as
+        update_shipping_files.
+        """
+        staged_files = self.stage_shipping_files()
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(
+                        self.merge_file,
+                        export_ids,
+                        api_requests.DownloadShipmentFile,
+                        staged_files[self.local_commodities_file_path],
+                        self.COMMODITIES_ORDER_NUMBER_COLUMN,
+                        self.COMMODITIES_START_ROW,
+                        self.COMMODITES_END_ROW,
+                    ),
+                    executor.submit(
+                        self.merge_file,
+                        export_ids,
+                        api_requests.DownloadAddressFile,
+                        staged_files[self.local_address_file_path],
+                        self.ADDRESS_ORDER_NUMBER_COLUMN,
+                        self.ADDRESS_START_ROW,
+                        self.ADDRESS_END_ROW,
+                    ),
+                ]
+                for future in futures:
+                    future.result()
+            return self.commit_shipping_files(staged_files, export_ids)
+        finally:
+            for staged_path in staged_files.values():
+                staged_path.unlink(missing_ok=True)
+
+    def merge_file(
+        self,
+        export_ids,
+        request_class,
+        target_path,
+        order_number_column,
+        start_row,
+        end_row,
+    ):
+        """Merge one of the files of several exports into target_path."""
+        with tracing.Tracer.span(
+            tracing.DOWNLOAD_FILE,
+            export_ids=list(export_ids),
+            file=request_class.PATH,
+            merged=True,
+        ):
+            merge.merge_files(
+                [
+                    functools.partial(self.open_file, export_id, request_class)
+                    for export_id in export_ids
+                ],
+                target_path,
+                order_number_column,
+                start_row,
+                end_row,
+            )
+
+    def stage_shipping_files(self):
+        """Return unique temporary paths to write replacement shipping files to.
+
+        The paths are keyed by the local path of the file they replace.
+        """
+        return {
+            self.local_commodities_file_path: self.staging_path(
+                self.local_commodities_file_path
+            ),
+            self.local_address_file_path: self.staging_path(
+                self.local_address_file_path
+            ),
+        }
+
+    def commit_shipping_files(self, staged_files, export_ids):
+        """Move staged shipping files for export_ids into place.
+
+        Returns the new generation, or None if the files are waiting to be
+        replicated. WorldShip picking up the files is watched for once they
+        are in the shipment directory.
+        """
+        fingerprint = None
+        if self.fingerprint_index is not None:
+            fingerprint = self.fingerprint_index.record(
+                export_ids, staged_files.values()
+            )
+        with tracing.Tracer.span(
+            tracing.COMMIT_FILES, export_ids=list(export_ids)
+        ) as span:
+            if self.replicator is None:
+                generation = self.commit_files(staged_files, fingerprint)
+                span["generation"] = generation
+                self.pickup_watcher.start(export_ids, generation, time.time())
+                return generation
+            self.replicating_export_ids = list(export_ids)
+            self.commit_local_files(staged_files, fingerprint)
+            return None
+
+    def open_file(self, export_id, request_class):
+        """Return an iterable of the contents of a file, from the cache if possible."""
+        if self.cache is not None:
+            cached_path = self.cache.get(export_id, request_class)
+            if cached_path is not None:
+                return merge.read_chunks(cached_path)
+        response = request_class().request(export_id=export_id)
+        return self.read_response(response)
+
+    @staticmethod
+    def read_response(response):
+        """Yield the body of a streamed response, closing it when done."""
+        try:
+            yield from response.iter_content(chunk_size=8192)
+        finally:
+            response.close()
+
+    def commit_local_files(self, staged_files, fingerprint=None):
+        """Move staged files into the staging directory and queue replication.
+
+        fingerprint, if given, is published with the files once replicated.
+        """
+        outbox_files = {}
+        for local_path, staged_path in staged_files.items():
+            outbox_path = self.staging_path(local_path)
+            shutil.copyfile(staged_path, outbox_path)
+            outbox_files[self.shipment_directory / local_path.name] = outbox_path
+        for local_path, staged_path in staged_files.items():
+            os.replace(staged_path, local_path)
+        self.replicator.submit(outbox_files, fingerprint=fingerprint)
+
+    def pull_shipping_files(self):
+        """Copy files committed by other stations into the staging directory.
+
+        Does nothing while local files are waiting to be replicated, as they
+        are newer than the files in the shipment directory.
+        """
+        if self.replicator is None or self.replicator.pending:
+            return
+        generation = self.read_generation()
+        if generation == self.local_generation:
+            return
+        with self.lock:
+            for shared_path, local_path in (
+                (self.commodities_file_path, self.local_commodities_file_path),
+                (self.address_file_path, self.local_address_file_path),
+            ):
+                if not shared_path.is_file():
+                    local_path.unlink(missing_ok=True)
+                    continue
+                staged_path = self.staging_path(local_path)
+                try:
+                    shutil.copyfile(shared_path, staged_path)
+                    os.replace(staged_path, local_path)
+                finally:
+                    staged_path.unlink(missing_ok=True)
+            self.local_generation = self.read_generation()
+
+    @profiled("commit shipping files")
+    def commit_files(self, staged_files, fingerprint=None):
+        """Move staged files into place and return the new generation.
+
+        staged_files maps each target path to the path of its replacement.
+        fingerprint, if given, is published as the fingerprint of the files.
+        """
+        with self.lock:
+            for target_path, staged_path in staged_files.items():
+                os.replace(staged_path, target_path)
+            return self.lock.increment_generation(fingerprint)
+
+    def download_shipping_files(self, export_id, commodities_path, address_path):
+        """Download both files of an export.
+
+        Uncached files are downloaded in a single bundled request. If the
+        server does not have the bundled endpoint each file is requested
+        separately, as are all later downloads.
+        """
+        if self.bundled_downloads and not self.is_cached(export_id):
+            try:
+                return self.download_bundle(export_id, commodities_path, address_path)
+            except exceptions.HTTPRequestError as e:
+                if e.status_code != 404:
+                    raise
+                self.bundled_downloads = False
+        self.update_comodities_file(export_id=export_id, target_path=commodities_path)
+        self.update_address_file(export_id=export_id, target_path=address_path)
+
+    def is_cached(self, export_id):
+        """Return True if both files of an export are cached."""
+        return self.cache is not None and all(
+            self.cache.get(export_id, request_class) is not None
+            for request_class in (
+                api_requests.DownloadShipmentFile,
+                api_requests.DownloadAddressFile,
+            )
+        )
+
+    @profiled("download bundle")
+    def download_bundle(self, export_id, commodities_path, address_path):
+        """Download both files of an export in one multipart response."""
+        request_class = api_requests.DownloadShippingFiles
+        paths = {
+            request_class.COMMODITIES_PART: commodities_path,
+            request_class.ADDRESS_PART: address_path,
+        }
+        with tracing.Tracer.span(
+            tracing.DOWNLOAD_FILE, export_id=export_id, file=request_class.PATH
+        ):
+            response = request_class().request(export_id=export_id)
+            try:
+                names = self.download_engine.download_parts(
+                    response, lambda headers: paths.get(multipart.part_name(headers))
+                )
+            finally:
+                response.close()
+        missing = set(paths) - set(names)
+        if missing:
+            raise multipart.MultipartError(
+                f"Bundled download is missing {', '.join(sorted(missing))}."
+            )
+
+    def update_comodities_file(self, export_id, target_path=None):
+        """Replace the comodities file, or write it to target_path."""
         self.update_file(
             export_id=export_id,
             request_class=api_requests.DownloadShipmentFile,
-            target_path=self.commodities_file_path,
+            target_path=target_path or self.commodities_file_path,
         )
 
-    def update_address_file(self, export_id):
-        """Replace the address file."""
+    def update_address_file(self, export_id, target_path=None):
+        """Replace the address file, or write it to target_path."""
         self.update_file(
             export_id=export_id,
             request_class=api_requests.DownloadAddressFile,
-            target_path=self.address_file_path,
+            target_path=target_path or self.address_file_path,
         )
 
+    @profiled("download file")
     def update_file(self, export_id, request_class, target_path):
         """Download a .csv file and save it to target path."""
-        response = request_class().request(export_id=export_id)
-        with open(target_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-            file.flush()
+        with tracing.Tracer.span(
+            tracing.DOWNLOAD_FILE, export_id=export_id, file=request_class.PATH
+        ) as span:
+            if self.cache is not None:
+                cached_path = self.cache.get(export_id, request_class)
+                if cached_path is not None:
+                    span["cached"] = True
+                    shutil.copyfile(cached_path, target_path)
+                    return
+            response = request_class().request(export_id=export_id)
+            try:
+                stats = self.download_engine.download(response, target_path)
+            finally:
+                response.close()
+            span["bytes"] = stats.byte_count
+            span["bytes_per_second"] = round(stats.bytes_per_second)
@@ -0,0 +1,105 @@
+"""Streaming encoding and decoding of multipart response bodies."""
+
+import re
+
+BOUNDARY_PATTERN = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+NAME_PATTERN = re.compile(r'name="([^"]*)"', re.IGNORECASE)
+
+PREAMBLE = "preamble"
+DELIMITER = "delimiter"
+HEADERS = "headers"
+BODY = "body"
+END = "end"
+
+
+class MultipartError(Exception):
+    """Raised when a multipart body is malformed or incomplete."""
+
+    pass
+
+
+def get_boundary(content_type):
+    """Return the boundary of a multipart Content-Type header."""
+    match = BOUNDARY_PATTERN.search(content_type or "")
+    if match is None:
+        raise MultipartError(f"No multipart boundary in {content_type!r}.")
+    return match.group(1)
+
+
+def parse_headers(block):
+    """Return the headers of a part, keyed by lower case name."""
+    headers = {}
+    for line in block.decode("latin-1").split("\r\n"):
+        name, separator, value = line.partition(":")
+        if separator:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def part_name(headers):
+    """Return the name given to a part in its Content-Disposition header."""
+    match = NAME_PATTERN.search(headers.get("content-disposition", ""))
+    return None if match is None else match.group(1)
+
+
+def encode(parts, boundary):
+    """Return a multipart body of parts, a list of (name, content type, body)."""
+    body = b""
+    for name, content_type, content in parts:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: attachment; name="{name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("latin-1")
+        body += content + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode("latin-1")
+
+
+def demultiplex(chunks, boundary, open_part):
+    """Write the parts of a multipart body to files as it is received.
+
+    chunks is an iterable of bytes. open_part is called with the headers of
+    each part and returns a file to write its body to, or None to skip it.
+    Only a delimiter's length of data is held back at a time, so parts of
+    any size are streamed. Returns the names of the parts in the body.
+    """
+    # The first delimiter may be at the very start, with no line break before it.
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    buffer = b"\r\n"
+    state = PREAMBLE
+    target = None
+    names = []
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            if state in (PREAMBLE, BODY):
+                position = buffer.find(delimiter)
+                if position == -1:
+                    keep = len(delimiter) - 1
+                    if len(buffer) > keep:
+                        if target is not None:
+                            target.write(buffer[:-keep])
+                        buffer = buffer[-keep:]
+                    break
+                if target is not None:
+                    target.write(buffer[:position])
+                buffer = buffer[position + len(delimiter) :]
+                state = DELIMITER
+            elif state == DELIMITER:
+                if len(buffer) < 2:
+                    break
+                state = END if buffer.startswith(b"--") else HEADERS
+            elif state == HEADERS:
+                position = buffer.find(b"\r\n\r\n")
+                if position == -1:
+                    break
+                headers = parse_headers(buffer[2:position])
+                buffer = buffer[position + 4 :]
+                names.append(part_name(headers))
+                target = open_part(headers)
+                state = BODY
+            else:
+                return names
+    if state != END:
+        raise MultipartError("Multipart body ended before its closing delimiter.")
+    return names
@@ -0,0 +1,138 @@
+"""Background prefetching of shipment export files."""
+
+import os
+import threading
+from pathlib import Path
+
+import requests
+
+from . import api_requests, exceptions
+from .api_requests import TokenBucket
+
+
+class PrefetchCancelled(Exception):
+    """Raised inside a prefetch thread when the prefetch is cancelled."""
+
+    pass
+
+
+class ExportFileCache:
+    """Local cache of downloaded shipment export files."""
+
+    PARTIAL_SUFFIX = ".part"
+
+    def __init__(self, directory):
+        """Use directory to store cached files."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, export_id, request_class):
+        """Return the cache path of the file downloaded by request_class."""
+        file_type = request_class.PATH.rsplit("/", 1)[-1]
+        return self.directory / f"{export_id}-{file_type}.csv"
+
+    def get(self, export_id, request_class):
+        """Return the path of a cached file or None if it is not cached."""
+        path = self.path(export_id, request_class)
+        if path.is_file():
+            return path
+        return None
+
+    def store(self, export_id, request_class, chunks):
+        """Write chunks to the cache, replacing the file only once complete."""
+        path = self.path(export_id, request_class)
+        partial_path = path.with_name(path.name + self.PARTIAL_SUFFIX)
+        try:
+            with open(partial_path, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(partial_path, path)
+        finally:
+            partial_path.unlink(missing_ok=True)
+        return path
+
+    def prune(self, keep_export_ids):
+        """Remove cached files for exports not in keep_export_ids."""
+        keep = {str(export_id) for export_id in keep_export_ids}
+        for path in self.directory.iterdir():
+            if path.name.split("-", 1)[0] not in keep:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    # The file may still be open in a cancelled prefetch.
+                    pass
+
+
+class Prefetcher:
+    """Download the files of recent exports in the background."""
+
+    CHUNK_SIZE = 8192
+    request_classes = (
+        api_requests.DownloadShipmentFile,
+        api_requests.DownloadAddressFile,
+    )
+
+    def __init__(self, cache, count, bytes_per_second):
+        """Prefetch count exports into cache at no more than bytes_per_second."""
+        self.cache = cache
+        self.count = count
+        self.bucket = TokenBucket(bytes_per_second)
+        self.cancel_event = threading.Event()
+        self.thread = None
+
+    def prefetch(self, export_ids):
+        """Cancel any running prefetch and start prefetching export_ids."""
+        self.cancel()
+        export_ids = list(export_ids)[: self.count]
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(export_ids, self.cancel_event),
+            name="prefetch",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def cancel(self):
+        """Stop the running prefetch without waiting for it to finish."""
+        self.cancel_event.set()
+
+    def run(self, export_ids, cancel_event):
+        """Download any uncached files for export_ids."""
+        try:
+            self.cache.prune(export_ids)
+            for export_id in export_ids:
+                for request_class in self.request_classes:
+                    if cancel_event.is_set():
+                        return
+                    if self.cache.get(export_id, request_class) is None:
+                        self.fetch(export_id, request_class, cancel_event)
+        except PrefetchCancelled:
+            return
+
+    def fetch(self, export_id, request_class, cancel_event):
+        """Download a single file into the cache."""
+        try:
+            response = request_class(priority=api_requests.BULK).request(
+                export_id=export_id
+            )
+        except exceptions.HTTPRequestError:
+            return
+        try:
+            self.cache.store(
+                export_id, request_class, self.throttle(response, cancel_event)
+            )
+        except (requests.RequestException, OSError):
+            # Prefetching is speculative, the file will be downloaded on demand.
+            return
+        finally:
+            response.close()
+
+    def throttle(self, response, cancel_event):
+        """Yield the response content at the capped rate."""
+        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+            if cancel_event.is_set():
+                raise PrefetchCancelled()
+            if not self.bucket.consume(len(chunk), cancel_event):
+                raise PrefetchCancelled()
+            yield chunk
@@ -0,0 +1,132 @@
+"""Asynchronous replication of shipping files to a shared shipment directory."""
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+
+def file_hash(path):
+    """Return the SHA-256 digest of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ReplicationError(Exception):
+    """Raised when a copied file does not match its source."""
+
+    pass
+
+
+class WriteBehindReplicator:
+    """Copy committed shipping files to the shipment directory in the background.
+
+    Only the most recently submitted set of files is replicated, a newer
+    submission replaces one that has not been copied yet. The fingerprint
+    submitted with the files is published beside the generation they are
+    committed as.
+    """
+
+    RETRY_INTERVALS = (1, 2, 5, 10, 30)
+
+    def __init__(self, lock, on_replicated=None):
+        """Commit files under lock, calling on_replicated with each new generation."""
+        self.lock = lock
+        self.on_replicated = on_replicated
+        self.condition = threading.Condition()
+        self.pending_files = None
+        self.pending_fingerprint = None
+        self.copying = False
+        self.error = None
+        self.thread = None
+
+    @property
+    def pending(self):
+        """Return True if files are waiting to be replicated."""
+        with self.condition:
+            return self.pending_files is not None or self.copying
+
+    def submit(self, files, fingerprint=None):
+        """Replicate files, a dict of target paths to local source paths.
+
+        fingerprint, if given, is the FingerprintIndex record of the files.
+        """
+        with self.condition:
+            if self.pending_files is not None:
+                self.discard(self.pending_files)
+            self.pending_files = files
+            self.pending_fingerprint = fingerprint
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="write-behind", daemon=True
+                )
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        """Replicate submitted files, retrying until they are copied."""
+        failures = 0
+        while True:
+            with self.condition:
+                while self.pending_files is None:
+                    self.condition.wait()
+                files = self.pending_files
+                fingerprint = self.pending_fingerprint
+                self.pending_files = None
+                self.copying = True
+            try:
+                generation = self.replicate(files, fingerprint)
+            except Exception as e:
+                with self.condition:
+                    self.copying = False
+                    self.error = e
+                    if self.pending_files is None:
+                        self.pending_files = files
+                        self.pending_fingerprint = fingerprint
+                    else:
+                        self.discard(files)
+                    delay = self.RETRY_INTERVALS[
+                        min(failures, len(self.RETRY_INTERVALS) - 1)
+                    ]
+                    failures += 1
+                    self.condition.wait(delay)
+                continue
+            failures = 0
+            self.discard(files)
+            if self.on_replicated is not None:
+                self.on_replicated(generation)
+            with self.condition:
+                self.copying = False
+                self.error = None
+
+    def replicate(self, files, fingerprint=None):
+        """Copy files, verify them and move them into place together."""
+        copies = {}
+        try:
+            for target_path, source_path in files.items():
+                copy_path = target_path.with_name(
+                    f".{target_path.name}.{uuid.uuid4().hex}.tmp"
+                )
+                copies[target_path] = copy_path
+                shutil.copyfile(source_path, copy_path)
+                if file_hash(copy_path) != file_hash(source_path):
+                    raise ReplicationError(f"Copy of {source_path} is corrupt.")
+            with self.lock:
+                for target_path, copy_path in copies.items():
+                    os.replace(copy_path, target_path)
+                return self.lock.increment_generation(fingerprint)
+        finally:
+            self.discard(copies)
+
+    @staticmethod
+    def discard(files):
+        """Delete the source files of a replication."""
+        for path in files.values():
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
@@ -0,0 +1,287 @@
+"""In-memory search indexes for the UPS Manifestor application."""
+
+import datetime as dt
+import re
+import threading
+from bisect import bisect_left
+from itertools import compress
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+DATE_FORMATS = (
+    "%d %b %Y %H:%M",
+    "%d %b %Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+)
+
+
+def tokenize(value):
+    """Return the lower case search tokens contained in value."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(item) for item in value)
+    return TOKEN_PATTERN.findall(str(value).lower())
+
+
+class DateParser:
+    """Parse dates, trying the last matching format first.
+
+    Failed attempts are slow and the dates of a column share one format, so
+    each parser remembers the format that matched last. A parser is not
+    shared between threads.
+    """
+
+    def __init__(self, formats=DATE_FORMATS):
+        """Parse date strings in ISO format or one of formats."""
+        self.formats = list(formats)
+
+    def parse(self, value):
+        """Return value as a naive datetime.datetime, or None if not a date."""
+        if isinstance(value, dt.datetime):
+            date = value
+        elif isinstance(value, dt.date):
+            date = dt.datetime.combine(value, dt.time())
+        elif isinstance(value, str):
+            date = self.parse_string(value.strip())
+            if date is None:
+                return None
+        else:
+            return None
+        if date.tzinfo is not None:
+            date = date.astimezone(dt.timezone.utc).replace(tzinfo=None)
+        return date
+
+    def parse_string(self, text):
+        """Return the datetime.datetime in text, or None if there is none."""
+        try:
+            return dt.datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        for date_format in self.formats:
+            try:
+                date = dt.datetime.strptime(text, date_format)
+            except ValueError:
+                continue
+            if date_format != self.formats[0]:
+                self.formats.remove(date_format)
+                self.formats.insert(0, date_format)
+            return date
+        return None
+
+
+_local = threading.local()
+
+
+def parse_date(value):
+    """Return value as a naive datetime.datetime, or None if it is not a date."""
+    if not hasattr(_local, "date_parser"):
+        _local.date_parser = DateParser()
+    return _local.date_parser.parse(value)
+
+
+def sort_key(value):
+    """Return a key for sorting mixed column values."""
+    if value is None:
+        return (3, "")
+    if isinstance(value, (int, float)):
+        return (0, value)
+    try:
+        return (0, float(value))
+    except (TypeError, ValueError):
+        return (2, str(value).lower())
+
+
+def date_sort_key(value, date_parser=None):
+    """Return a key for sorting date column values chronologically."""
+    date = parse_date(value) if date_parser is None else date_parser.parse(value)
+    if date is None:
+        return sort_key(value)
+    return (1, date)
+
+
+class Ordering:
+    """The records of an index in one order, with the masks of their matches.
+
+    A mask has a byte for each record in the order, 1 if it matches, so
+    intersecting masks and selecting the records they match runs in C rather
+    than per record.
+    """
+
+    def __init__(self, records, ranks=None):
+        """Order records, at ranks[position] for each index position if given."""
+        self.records = records
+        self.ranks = ranks
+        self.prefix_masks = {}
+        # The query and matches are replaced together so that concurrent
+        # readers never see a query with another query's matches.
+        self.last_search = (None, None)
+
+
+class RecordIndex:
+    """Inverted token index and cached sort orders over a list of records."""
+
+    # Prefixes matched by this fraction of the records are masked when an
+    # order is built, as marking their records is the slowest step of a
+    # search and they are what is typed first.
+    LARGE_PREFIX_FRACTION = 0.25
+    LARGE_PREFIX_MINIMUM = 1000
+
+    def __init__(self, records, text_keys, date_keys=()):
+        """Index records on text_keys, sorting date_keys chronologically."""
+        self.records = records
+        self.text_keys = text_keys
+        self.date_keys = date_keys
+        postings = {}
+        for position, record in enumerate(records):
+            for key in text_keys:
+                for token in tokenize(record.get(key)):
+                    postings.setdefault(token, set()).add(position)
+        # Postings are concatenated in token order so that the records matching
+        # a prefix are a single contiguous slice of self.positions.
+        self.tokens = sorted(postings)
+        self.offsets = [0]
+        self.positions = []
+        for token in self.tokens:
+            self.positions.extend(postings[token])
+            self.offsets.append(len(self.positions))
+        self.large_prefixes = self.find_large_prefixes()
+        self._orderings = {None: self.make_ordering(records)}
+        # Dates are parsed and sorted up front as they are slow to parse.
+        for key in date_keys:
+            self.ordering(key)
+
+    def __len__(self):
+        return len(self.records)
+
+    def find_large_prefixes(self):
+        """Return {prefix: (start, end)} for the prefixes matching many records.
+
+        The tokens from start to end are the ones starting with prefix.
+        """
+        threshold = max(
+            self.LARGE_PREFIX_MINIMUM, len(self.records) * self.LARGE_PREFIX_FRACTION
+        )
+        large_prefixes = {}
+        # The tokens starting with a prefix of a length are contiguous, and a
+        # prefix only matches many records if its shorter prefixes do.
+        groups = [(0, len(self.tokens))]
+        length = 1
+        while groups:
+            large_groups = []
+            for group_start, group_end in groups:
+                start = group_start
+                while start < group_end:
+                    if len(self.tokens[start]) < length:
+                        start += 1
+                        continue
+                    prefix = self.tokens[start][:length]
+                    end = bisect_left(
+                        self.tokens, prefix + "\uffff", lo=start, hi=group_end
+                    )
+                    if self.offsets[end] - self.offsets[start] >= threshold:
+                        large_prefixes[prefix] = (start, end)
+                        large_groups.append((start, end))
+                    start = end
+            groups = large_groups
+            length += 1
+        return large_prefixes
+
+    def make_ordering(self, records, ranks=None):
+        """Return an Ordering of records with the masks of the large prefixes."""
+        ordering = Ordering(records, ranks)
+        for prefix, (start, end) in self.large_prefixes.items():
+            ordering.prefix_masks[prefix] = self.mask(start, end, ranks)
+        return ordering
+
+    def mask(self, start, end, ranks=None):
+        """Return the mask of records with tokens from start to end.
+
+        The mask is in the order of ranks if given, else of self.records.
+        """
+        mask = bytearray(len(self.records))
+        positions = self.positions[self.offsets[start] : self.offsets[end]]
+        if ranks is not None:
+            positions = map(ranks.__getitem__, positions)
+        for position in positions:
+            mask[position] = 1
+        return bytes(mask)
+
+    def prefix_matches(self, prefix, ordering=None):
+        """Return the mask of records with a token starting with prefix."""
+        if ordering is None:
+            ordering = self._orderings[None]
+        if prefix in ordering.prefix_masks:
+            return ordering.prefix_masks[prefix]
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + "\uffff", lo=start)
+        return self.mask(start, end, ordering.ranks)
+
+    def search(self, query, ordering=None):
+        """Return the mask of records matching every word of query.
+
+        The mask is in the order of ordering if given, else of self.records.
+        """
+        if ordering is None:
+            ordering = self._orderings[None]
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return None
+        query = " ".join(query_tokens)
+        last_query, last_matches = ordering.last_search
+        if query == last_query:
+            return last_matches
+        if last_query is not None and query.startswith(last_query):
+            # While typing, narrow the previous result instead of starting over.
+            candidates = last_matches
+            query_tokens = query_tokens[len(tokenize(last_query)) - 1 :]
+        else:
+            candidates = None
+        for token in query_tokens:
+            matches = self.prefix_matches(token, ordering)
+            candidates = (
+                matches if candidates is None else intersect(candidates, matches)
+            )
+            if 1 not in candidates:
+                break
+        ordering.last_search = (query, candidates)
+        return candidates
+
+    def ordering(self, key):
+        """Return the Ordering of the records sorted by key."""
+        if key not in self._orderings:
+            if key in self.date_keys:
+                date_parser = DateParser()
+                sort_keys = [
+                    date_sort_key(record.get(key), date_parser)
+                    for record in self.records
+                ]
+            else:
+                sort_keys = [sort_key(record.get(key)) for record in self.records]
+            order = sorted(range(len(self.records)), key=sort_keys.__getitem__)
+            ranks = [0] * len(order)
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+            records = [self.records[position] for position in order]
+            self._orderings[key] = self.make_ordering(records, ranks)
+        return self._orderings[key]
+
+    def select(self, query="", sort_by=None, reverse=False):
+        """Return the records matching query, sorted by the sort_by key."""
+        ordering = self.ordering(sort_by)
+        matches = self.search(query, ordering)
+        if matches is None:
+            selected = list(ordering.records)
+        else:
+            selected = list(compress(ordering.records, matches))
+        if reverse:
+            selected.reverse()
+        return selected
+
+
+def intersect(mask, other):
+    """Return the mask of records in both mask and other."""
+    return (int.from_bytes(mask, "little") & int.from_bytes(other, "little")).to_bytes(
+        len(mask), "little"
+    )
@@ -0,0 +1,287 @@
+"""Background sync service for the UPS Manifestor application.
+
+The service owns the HTTP transport, the models and the shipping files. The
+GUI and the command line talk to it over a local socket, so slow requests and
+file writes run in a separate process and its state survives GUI restarts.
+"""
+
+import threading
+from multiprocessing.connection import Client, Listener
+
+from . import exceptions, fingerprints, models, prefetch
+from .settings import Settings
+
+
+def service_address():
+    """Return the address of the sync service."""
+    return (Settings.SERVICE_HOST, Settings.SERVICE_PORT)
+
+
+def service_authkey():
+    """Return the key used to authenticate connections to the sync service."""
+    return Settings.TOKEN.encode()
+
+
+class SyncService:
+    """Serve model and shipping file operations to local clients."""
+
+    def __init__(self, address=None):
+        """Create the models and listen on address."""
+        cache = prefetch.ExportFileCache(Settings.CACHE_DIRECTORY)
+        self.prefetcher = prefetch.Prefetcher(
+            cache,
+            count=Settings.PREFETCH_COUNT,
+            bytes_per_second=Settings.PREFETCH_BYTES_PER_SECOND,
+        )
+        self.current_shipments = models.CurrentShipments()
+        self.shipment_exports = models.ShipmentExports(prefetcher=self.prefetcher)
+        self.shipment_file_manager = models.ShipmentFileManager(
+            cache=cache,
+            staging_directory=Settings.STAGING_DIRECTORY,
+            fingerprint_index=fingerprints.FingerprintIndex(
+                Settings.FINGERPRINT_INDEX_PATH
+            ),
+        )
+        # Each model is refreshed by one client at a time, so clients asking
+        # together share one request, while other commands carry on.
+        self.refresh_locks = {
+            self.current_shipments: threading.Lock(),
+            self.shipment_exports: threading.Lock(),
+        }
+        self.commands = {
+            "current_shipments": self.get_current_shipments,
+            "shipment_exports": self.get_shipment_exports,
+            "close_shipment": self.close_shipment,
+            "update_shipping_files": self.update_shipping_files,
+            "merge_shipping_files": self.merge_shipping_files,
+            "commodities_file_status": (
+                self.shipment_file_manager.get_commodities_file_status
+            ),
+            "address_file_status": self.shipment_file_manager.get_address_file_status,
+            "commodities_file_orders": (
+                self.shipment_file_manager.get_commodities_file_orders
+            ),
+            "address_file_orders": self.shipment_file_manager.get_address_file_orders,
+            "file_generation": self.shipment_file_manager.read_generation,
+            "pull_shipping_files": self.shipment_file_manager.pull_shipping_files,
+            "replication_status": (self.shipment_file_manager.get_replication_status),
+            "check_pickup": self.shipment_file_manager.check_pickup,
+            "loaded_export_status": (
+                self.shipment_file_manager.get_loaded_export_status
+            ),
+        }
+        self.listener = Listener(
+            address or service_address(), authkey=service_authkey()
+        )
+
+    @property
+    def address(self):
+        """Return the address the service is listening on."""
+        return self.listener.address
+
+    def serve_forever(self):
+        """Accept client connections until the listener is closed."""
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self.handle, args=(connection,), daemon=True
+            ).start()
+
+    def close(self):
+        """Stop accepting connections."""
+        self.prefetcher.cancel()
+        self.listener.close()
+
+    def handle(self, connection):
+        """Process commands from a client until it disconnects."""
+        with connection:
+            while True:
+                try:
+                    command, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                connection.send(self.dispatch(command, kwargs))
+
+    def dispatch(self, command, kwargs):
+        """Run a command and return a reply for the client."""
+        if command not in self.commands:
+            return ("error", f"Unknown command {command!r}.")
+        try:
+            return ("ok", self.commands[command](**kwargs))
+        except Exception as e:
+            return ("error", str(e))
+
+    def refresh(self, model, refresh=False):
+        """Update the records of model unless they are still fresh.
+
+        With refresh True the records are updated even if they are fresh.
+        """
+        if refresh:
+            model.freshness.invalidate()
+        if model.freshness.is_fresh():
+            return
+        with self.refresh_locks[model]:
+            # Another client may have updated the records while this one waited.
+            if not model.freshness.is_fresh():
+                model.update()
+
+    def get_current_shipments(self, refresh=False):
+        """Return the currently open shipments, updated if no longer fresh."""
+        self.refresh(self.current_shipments, refresh=refresh)
+        return [dict(shipment) for shipment in self.current_shipments.shipments]
+
+    def get_shipment_exports(self, refresh=False):
+        """Return the recent shipment exports, updated if no longer fresh."""
+        self.refresh(self.shipment_exports, refresh=refresh)
+        return [dict(export) for export in self.shipment_exports.exports]
+
+    def close_shipment(self, shipment_id, idempotency_key=None):
+        """Close a shipment and return the ID of the created export."""
+        self.prefetcher.cancel()
+        export_id = self.current_shipments.close_shipment(
+            shipment_id, idempotency_key=idempotency_key
+        )
+        self.shipment_exports.freshness.invalidate()
+        return export_id
+
+    def update_shipping_files(self, export_id):
+        """Replace the shipping files with those of an export."""
+        self.prefetcher.cancel()
+        return self.shipment_file_manager.update_shipping_files(export_id)
+
+    def merge_shipping_files(self, export_ids):
+        """Replace the shipping files with the merged files of several exports."""
+        self.prefetcher.cancel()
+        return self.shipment_file_manager.merge_shipping_files(export_ids)
+
+
+class ServiceClient:
+    """Connection to a running sync service."""
+
+    def __init__(self, address=None):
+        """Connect to the sync service at address."""
+        self.lock = threading.Lock()
+        try:
+            self.connection = Client(
+                address or service_address(), authkey=service_authkey()
+            )
+        except OSError as e:
+            raise exceptions.ServiceError(f"Sync service is not running: {e}")
+
+    def call(self, command, **kwargs):
+        """Run command on the service and return the result."""
+        with self.lock:
+            try:
+                self.connection.send((command, kwargs))
+                status, result = self.connection.recv()
+            except (EOFError, OSError) as e:
+                raise exceptions.ServiceError(f"Lost connection to sync service: {e}")
+        if status == "error":
+            raise exceptions.ServiceError(result)
+        return result
+
+    def close(self):
+        """Close the connection."""
+        self.connection.close()
+
+
+class RemoteCurrentShipments(models.CurrentShipments):
+    """Current shipments provided by the sync service."""
+
+    def __init__(self, client):
+        """Use client to reach the sync service."""
+        super().__init__()
+        self.client = client
+
+    def update(self):
+        """Get currently open shipments from the sync service.
+
+        Shipments invalidated here, for example by a change notification,
+        are also updated by the service rather than served from its cache.
+        """
+        self.shipments = self.client.call(
+            "current_shipments", refresh=self.freshness.invalidated
+        )
+
+    def close_shipment(self, shipment_id, idempotency_key=None):
+        """Close a shipment and return the ID of the created export."""
+        return self.client.call(
+            "close_shipment", shipment_id=shipment_id, idempotency_key=idempotency_key
+        )
+
+
+class RemoteShipmentExports(models.ShipmentExports):
+    """Shipment exports provided by the sync service."""
+
+    def __init__(self, client):
+        """Use client to reach the sync service."""
+        super().__init__()
+        self.client = client
+
+    def update(self):
+        """Get the list of shipment exports from the sync service.
+
+        Exports invalidated here are also updated by the service.
+        """
+        self.exports = self.client.call(
+            "shipment_exports", refresh=self.freshness.invalidated
+        )
+
+
+class RemoteShipmentFileManager:
+    """Shipping files managed by the sync service.
+
+    Only the methods of ShipmentFileManager used by the application are
+    provided, each made by the service.
+    """
+
+    def __init__(self, client):
+        """Use client to reach the sync service."""
+        self.client = client
+
+    def get_commodities_file_status(self):
+        """Return a string representation of the comodities file."""
+        return self.client.call("commodities_file_status")
+
+    def get_address_file_status(self):
+        """Return a string representation of the address file."""
+        return self.client.call("address_file_status")
+
+    def get_commodities_file_orders(self):
+        """Return every order number in the comodities file."""
+        return self.client.call("commodities_file_orders")
+
+    def get_address_file_orders(self):
+        """Return every order number in the address file."""
+        return self.client.call("address_file_orders")
+
+    def read_generation(self):
+        """Return the generation of the shipping files in the shipment directory."""
+        return self.client.call("file_generation")
+
+    def get_replication_status(self):
+        """Return a description of files waiting to be copied to the share."""
+        return self.client.call("replication_status")
+
+    def get_loaded_export_status(self):
+        """Return a description of the export the current files belong to."""
+        return self.client.call("loaded_export_status")
+
+    def pull_shipping_files(self):
+        """Copy files committed by other stations into the staging directory."""
+        return self.client.call("pull_shipping_files")
+
+    def check_pickup(self):
+        """Trace WorldShip picking up the last committed shipping files."""
+        return self.client.call("check_pickup")
+
+    def update_shipping_files(self, export_id):
+        """Replace the current shipping files."""
+        return self.client.call("update_shipping_files", export_id=export_id)
+
+    def merge_shipping_files(self, export_ids):
+        """Replace the current shipping files with the merged files of exports."""
+        return self.client.call("merge_shipping_files", export_ids=list(export_ids))
@@ -4,6 +4,14 @@ from pathlib import Path
 
 import toml
 
+DEFAULT_LANE = "Default"
+LANE_KEYS = (
+    "SHIPMENT_DIRECTORY",
+    "COMMODITIES_FILE_NAME",
+    "ADDRESS_FILE_NAME",
+    "STAGING_DIRECTORY",
+)
+
 
 class Settings:
     """Class for managing application settings."""
@@ -17,6 +25,20 @@ class Settings:
     WINDOW_WIDTH = None
     WINDOW_HEIGHT = None
     THEME = None
+    CACHE_DIRECTORY = None
+    PREFETCH_COUNT = None
+    PREFETCH_BYTES_PER_SECOND = None
+    SERVICE_HOST = None
+    SERVICE_PORT = None
+    CLOSE_JOURNAL_PATH = None
+    STAGING_DIRECTORY = None
+    TRACE_PATH = None
+    FINGERPRINT_INDEX_PATH = None
+    REQUESTS_PER_SECOND = None
+    SHIPMENTS_TTL = None
+    BUNDLED_DOWNLOADS = None
+    EXPORTS_TTL = None
+    LANES = None
 
     settings_file_path = Path.cwd() / "settings.toml"
 
@@ -34,3 +56,43 @@ class Settings:
         cls.WINDOW_WIDTH = SETTINGS["WINDOW_WIDTH"]
         cls.WINDOW_HEIGHT = SETTINGS["WINDOW_HEIGHT"]
         cls.THEME = SETTINGS["THEME"]
+        cls.CACHE_DIRECTORY = SETTINGS.get("CACHE_DIRECTORY", str(Path.cwd() / "cache"))
+        cls.PREFETCH_COUNT = SETTINGS.get("PREFETCH_COUNT", 3)
+        cls.PREFETCH_BYTES_PER_SECOND = SETTINGS.get(
+            "PREFETCH_BYTES_PER_SECOND", 256 * 1024
+        )
+        cls.SERVICE_HOST = SETTINGS.get("SERVICE_HOST", "127.0.0.1")
+        cls.SERVICE_PORT = SETTINGS.get("SERVICE_PORT", 47800)
+        cls.CLOSE_JOURNAL_PATH = SETTINGS.get(
+            "CLOSE_JOURNAL_PATH", str(Path.cwd() / "close_journal.jsonl")
+        )
+        cls.STAGING_DIRECTORY = SETTINGS.get("STAGING_DIRECTORY") or None
+        cls.LANES = cls.load_lanes(SETTINGS.get("LANES"))
+        cls.BUNDLED_DOWNLOADS = SETTINGS.get("BUNDLED_DOWNLOADS", True)
+        cls.SHIPMENTS_TTL = SETTINGS.get("SHIPMENTS_TTL", 30)
+        cls.EXPORTS_TTL = SETTINGS.get("EXPORTS_TTL", 60)
+        cls.REQUESTS_PER_SECOND = SETTINGS.get("REQUESTS_PER_SECOND", 10)
+        cls.FINGERPRINT_INDEX_PATH = SETTINGS.get(
+            "FINGERPRINT_INDEX_PATH", str(Path.cwd() / "fingerprints.jsonl")
+        )
+        cls.TRACE_PATH = SETTINGS.get("TRACE_PATH", str(Path.cwd() / "traces.jsonl"))
+
+    @classmethod
+    def load_lanes(cls, lanes):
+        """Return the settings of each shipment lane, keyed by lane name.
+
+        A lane takes any of LANE_KEYS it does not set from the top level
+        settings, except that when there are several lanes each is staged
+        in its own subdirectory of STAGING_DIRECTORY. Without lanes there is
+        one lane using the top level settings.
+        """
+        lanes = lanes or {DEFAULT_LANE: {}}
+        loaded = {}
+        for name, lane in lanes.items():
+            settings = {key: lane.get(key, getattr(cls, key)) for key in LANE_KEYS}
+            staging_directory = settings["STAGING_DIRECTORY"] or None
+            if staging_directory and len(lanes) > 1 and "STAGING_DIRECTORY" not in lane:
+                staging_directory = str(Path(staging_directory) / name)
+            settings["STAGING_DIRECTORY"] = staging_directory
+            loaded[name] = settings
+        return loaded
@@ -0,0 +1,129 @@
+"""Push notification of changes to shipments and exports."""
+
+import threading
+import time
+
+from . import api_requests, exceptions
+
+SHIPMENTS = "shipments"
+EXPORTS = "exports"
+
+
+class ChangeEvent:
+    """A Server-Sent Event."""
+
+    def __init__(self, id, event, data):
+        """Create an event of type event."""
+        self.id = id
+        self.event = event
+        self.data = data
+
+
+def parse_events(lines):
+    """Yield a ChangeEvent for each event in lines of a Server-Sent Events stream."""
+    event_id = None
+    event_type = "message"
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf8")
+        if line == "":
+            if data:
+                yield ChangeEvent(id=event_id, event=event_type, data="\n".join(data))
+            event_type = "message"
+            data = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            event_type = value
+        elif field == "data":
+            data.append(value)
+
+
+class ChangeSubscriber:
+    """Listen for change notifications on a background thread.
+
+    on_change is called with SHIPMENTS or EXPORTS when that list changes on
+    the server. It is called with both on the first connection and after a
+    connection fails, as changes may have been missed. Reconnecting after the
+    server closes a response resumes from the last event received. While not
+    connected the lists should be polled instead.
+    """
+
+    RECONNECT_INTERVALS = (1, 2, 5, 10, 30)
+
+    def __init__(self, on_change):
+        """Call on_change with the kind of record that changed."""
+        self.on_change = on_change
+        self.last_event_id = None
+        self.connected = False
+        self.supported = True
+        self.resync = True
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="change-subscriber", daemon=True
+        )
+
+    def start(self):
+        """Start listening in the background."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop reconnecting once the current connection ends."""
+        self.stop_event.set()
+
+    def run(self):
+        """Listen for changes, reconnecting when the connection is lost."""
+        failures = 0
+        while not self.stop_event.is_set():
+            connected_at = time.monotonic()
+            try:
+                self.listen()
+            except exceptions.HTTPRequestError as e:
+                if e.is_client_error:
+                    # The server does not provide change notifications.
+                    self.supported = False
+                    return
+                failures += 1
+                self.resync = True
+            except Exception:
+                failures += 1
+                self.resync = True
+            else:
+                failures = 0
+            finally:
+                self.connected = False
+            if failures:
+                delay = self.RECONNECT_INTERVALS[
+                    min(failures - 1, len(self.RECONNECT_INTERVALS) - 1)
+                ]
+            else:
+                # Do not reconnect in a tight loop to a server that closes
+                # responses immediately.
+                delay = self.RECONNECT_INTERVALS[0] - (time.monotonic() - connected_at)
+            self.stop_event.wait(max(delay, 0))
+
+    def listen(self):
+        """Receive change notifications until the server closes the response."""
+        response = api_requests.ShipmentChangesRequest().request(
+            last_event_id=self.last_event_id
+        )
+        with response:
+            self.connected = True
+            if self.resync:
+                self.resync = False
+                self.on_change(SHIPMENTS)
+                self.on_change(EXPORTS)
+            for event in parse_events(response.iter_lines()):
+                if event.id is not None:
+                    self.last_event_id = event.id
+                if event.event in (SHIPMENTS, EXPORTS):
+                    self.on_change(event.event)
+                if self.stop_event.is_set():
+                    return
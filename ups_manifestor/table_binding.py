@@ -0,0 +1,84 @@
+"""Incremental updates of table elements."""
+
+
+def row_hash(row):
+    """Return a hash of the contents of a table row."""
+    return hash(repr(row))
+
+
+class TableBinding:
+    """Keep a table element in step with a list of records.
+
+    Only rows whose contents have changed are repainted and the selection is
+    kept on the same records, by ID, when rows move. The table's rows are
+    identified by position, so selected row indexes reported by the element
+    remain valid.
+    """
+
+    def __init__(self, element):
+        """Bind to a table element."""
+        self.element = element
+        self.ids = []
+        self.hashes = None
+        self.version = None
+
+    def diff(self, hashes):
+        """Compare row hashes with the displayed rows.
+
+        Returns (changed, added, removed) where changed is a list of row
+        positions whose contents differ and added and removed are ranges of
+        positions to insert or delete at the end of the table.
+        """
+        common = min(len(self.hashes), len(hashes))
+        changed = [i for i in range(common) if self.hashes[i] != hashes[i]]
+        added = range(common, len(hashes))
+        removed = range(common, len(self.hashes))
+        return changed, added, removed
+
+    def update(self, ids, rows, version=None):
+        """Display rows, where ids holds the record ID of each row.
+
+        version is the version of the snapshot the rows were taken from.
+        Returns the positions of the selected rows after the update.
+        """
+        hashes = [row_hash(row) for row in rows]
+        selected_ids = [
+            self.ids[i] for i in self.element.SelectedRows if i < len(self.ids)
+        ]
+        if self.hashes is None:
+            self.element.update(values=rows)
+        else:
+            changed, added, removed = self.diff(hashes)
+            if changed or added or removed:
+                self.apply(rows, changed, added, removed)
+        self.ids = list(ids)
+        self.hashes = hashes
+        self.version = version
+        return self.restore_selection(selected_ids)
+
+    def record_id(self, position):
+        """Return the ID of the record displayed at row position."""
+        return self.ids[position]
+
+    def apply(self, rows, changed, added, removed):
+        """Repaint changed rows, insert added rows and delete removed rows."""
+        treeview = self.element.Widget
+        for i in changed:
+            treeview.item(i + 1, values=rows[i])
+        for i in added:
+            self.element.tree_ids.append(
+                treeview.insert("", "end", iid=i + 1, values=rows[i], tag=i)
+            )
+        for i in reversed(removed):
+            treeview.delete(i + 1)
+            self.element.tree_ids.pop()
+        self.element.Values = rows
+
+    def restore_selection(self, selected_ids):
+        """Select the rows of selected_ids and return their positions."""
+        positions = {record_id: i for i, record_id in enumerate(self.ids)}
+        selection = [positions[i] for i in selected_ids if i in positions]
+        if selection != self.element.SelectedRows:
+            self.element.update(select_rows=selection)
+            self.element.SelectedRows = selection
+        return selection
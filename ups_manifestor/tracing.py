@@ -0,0 +1,209 @@
+"""Tracing of the time taken to get shipments manifested in WorldShip."""
+
+import datetime as dt
+import io
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+EXPORT_REQUESTED = "export requested"
+CLOSE_SHIPMENT = "close shipment"
+DOWNLOAD_FILE = "download file"
+COMMIT_FILES = "commit files"
+WORLDSHIP_PICKUP = "worldship pickup"
+TIME_TO_MANIFEST = "time to manifest"
+
+
+class Tracer:
+    """Record timed spans of work to a local JSON lines file.
+
+    Spans are correlated by the export_id and idempotency key attributes.
+    Nothing is recorded until the tracer is enabled.
+    """
+
+    path = None
+    lock = threading.Lock()
+
+    @classmethod
+    def enable(cls, path):
+        """Start appending spans to the file at path."""
+        cls.path = Path(path)
+
+    @classmethod
+    def disable(cls):
+        """Stop recording spans."""
+        cls.path = None
+
+    @classmethod
+    @contextmanager
+    def span(cls, name, **attributes):
+        """Time the enclosed block as a span named name.
+
+        Yields the span's attributes, which may be added to within the block.
+        """
+        start = time.time()
+        start_counter = time.perf_counter()
+        status = "ok"
+        try:
+            yield attributes
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            cls.record(
+                name, start, time.perf_counter() - start_counter, status, attributes
+            )
+
+    @classmethod
+    def event(cls, name, **attributes):
+        """Record an instant as a span with no duration."""
+        cls.record(name, time.time(), 0.0, "ok", attributes)
+
+    @classmethod
+    def record(cls, name, start, duration, status="ok", attributes=None):
+        """Append a span to the trace file."""
+        if cls.path is None:
+            return
+        line = json.dumps(
+            {
+                "name": name,
+                "start": start,
+                "duration": duration,
+                "status": status,
+                "attributes": attributes or {},
+            }
+        )
+        with cls.lock:
+            cls.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(cls.path, "a") as f:
+                f.write(line + "\n")
+
+
+def file_signature(path):
+    """Return the modification time and size of a file, or None if it is missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class PickupWatcher:
+    """Detect WorldShip picking up committed shipping files.
+
+    Files are picked up when they are removed or changed in the shipment
+    directory, other than by another commit.
+    """
+
+    def __init__(self, paths):
+        """Watch the files at paths."""
+        self.paths = paths
+        self.lock = threading.Lock()
+        self.watch = None
+
+    def start(self, export_ids, generation, committed_at):
+        """Watch the files committed for export_ids as generation."""
+        with self.lock:
+            self.watch = {
+                "export_ids": list(export_ids),
+                "generation": generation,
+                "committed_at": committed_at,
+                "signatures": [file_signature(path) for path in self.paths],
+            }
+
+    def check(self, generation):
+        """Record a pickup span if the watched files have been picked up."""
+        with self.lock:
+            watch = self.watch
+            if watch is None:
+                return
+            if generation != watch["generation"]:
+                status = "superseded"
+            elif [file_signature(path) for path in self.paths] != watch["signatures"]:
+                status = "ok"
+            else:
+                return
+            self.watch = None
+        Tracer.record(
+            WORLDSHIP_PICKUP,
+            watch["committed_at"],
+            time.time() - watch["committed_at"],
+            status,
+            {"export_ids": watch["export_ids"]},
+        )
+
+
+def read_spans(path):
+    """Return the spans recorded in the trace file at path."""
+    spans = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+    return spans
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def time_to_manifest(spans):
+    """Return (start, duration) of each export from request to WorldShip pickup."""
+    requested = {}
+    for span in spans:
+        attributes = span["attributes"]
+        if span["name"] == EXPORT_REQUESTED:
+            for export_id in attributes.get("export_ids", ()):
+                requested.setdefault(export_id, []).append(span["start"])
+            if "key" in attributes:
+                requested.setdefault(attributes["key"], []).append(span["start"])
+    for span in spans:
+        # Closes are requested before their export exists, by idempotency key.
+        attributes = span["attributes"]
+        if span["name"] == CLOSE_SHIPMENT and span["status"] == "ok":
+            starts = requested.get(attributes.get("key"), [])
+            requested.setdefault(attributes.get("export_id"), []).extend(starts)
+    results = []
+    for span in spans:
+        if span["name"] != WORLDSHIP_PICKUP or span["status"] != "ok":
+            continue
+        starts = [
+            start
+            for export_id in span["attributes"]["export_ids"]
+            for start in requested.get(export_id, ())
+            if start <= span["start"]
+        ]
+        if starts:
+            start = max(starts)
+            results.append((start, span["start"] + span["duration"] - start))
+    return results
+
+
+def summarise(path):
+    """Return the p50 and p95 durations of each kind of span per day."""
+    spans = read_spans(path)
+    timings = {}
+    for span in spans:
+        if span["name"] != EXPORT_REQUESTED and span["status"] == "ok":
+            timings.setdefault(span["name"], []).append(
+                (span["start"], span["duration"])
+            )
+    timings[TIME_TO_MANIFEST] = time_to_manifest(spans)
+    stream = io.StringIO()
+    stream.write(f"{'day':<12}{'span':<20}{'count':>7}{'p50 (s)':>10}{'p95 (s)':>10}\n")
+    by_day = {}
+    for name, values in timings.items():
+        for start, duration in values:
+            day = dt.date.fromtimestamp(start).isoformat()
+            by_day.setdefault((day, name), []).append(duration)
+    for (day, name), durations in sorted(by_day.items()):
+        stream.write(
+            f"{day:<12}{name:<20}{len(durations):>7}"
+            f"{percentile(durations, 0.5):>10.2f}{percentile(durations, 0.95):>10.2f}\n"
+        )
+    return stream.getvalue()